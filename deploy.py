@@ -1,5 +1,5 @@
 from gevent.wsgi import WSGIServer
-import ghdata
+import ghdata.server
 
-http_server = WSGIServer(('', 5001), ghdata.server.app)
+http_server = WSGIServer(('', 5001), ghdata.server.create_app())
 http_server.serve_forever()
\ No newline at end of file
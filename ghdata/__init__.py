@@ -1,3 +1,38 @@
-from .ghtorrent import GHTorrent
-from .publicwww import PublicWWW
-from .githubapi import GitHubAPI
\ No newline at end of file
+#SPDX-License-Identifier: MIT
+import sys
+
+# Public classes and the modules they are defined in. They are imported on first use, so that
+# importing ghdata.server or the command line doesn't load pandas and SQLAlchemy up front.
+_EXPORTS = {
+    'GHTorrent': 'ghtorrent',
+    'OfflineGHTorrent': 'offline',
+    'PublicWWW': 'publicwww',
+    'GitHubAPI': 'githubapi',
+    'MetricCache': 'cache',
+    'MetricExecutor': 'executor',
+    'CacheWarmer': 'warmer'
+}
+
+__all__ = sorted(_EXPORTS)
+
+if (sys.version_info >= (3, 7)):
+    def __getattr__(name):
+        if (name not in _EXPORTS):
+            raise AttributeError("module 'ghdata' has no attribute '{}'".format(name))
+        import importlib
+        value = getattr(importlib.import_module('.' + _EXPORTS[name], __name__), name)
+        # Later lookups find it without calling __getattr__
+        globals()[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(_EXPORTS))
+else:
+    # Modules can't define __getattr__ before Python 3.7
+    from .ghtorrent import GHTorrent
+    from .offline import OfflineGHTorrent
+    from .publicwww import PublicWWW
+    from .githubapi import GitHubAPI
+    from .cache import MetricCache
+    from .executor import MetricExecutor
+    from .warmer import CacheWarmer
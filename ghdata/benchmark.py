@@ -0,0 +1,334 @@
+#SPDX-License-Identifier: MIT
+import sys
+import time
+import json
+import datetime
+import subprocess
+import numpy as np
+import pandas as pd
+import sqlalchemy as s
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from . import schema
+
+
+# GHTorrent methods the runner times, all take a repoid
+BENCHMARK_METRICS = ['stargazers', 'commits', 'forks', 'issues', 'issues_with_close', 'pulls',
+                     'contributors', 'contributions', 'committer_locations', 'issue_response_time',
+                     'pull_acceptance_rate', 'dist_work', 'reopened_issues', 'community_activity',
+                     'contr_bre', 'contributor_diversity', 'transparency', 'bus_factor']
+
+# Endpoints the runner times, relative to /<version>/<owner>/<repo>/
+BENCHMARK_ENDPOINTS = ['timeseries/commits', 'timeseries/forks', 'timeseries/issues',
+                       'timeseries/issues/response_time', 'timeseries/issues/closed', 'timeseries/pulls',
+                       'timeseries/stargazers', 'pulls/acceptance_rate', 'contributors', 'contributions',
+                       'commits/locations', 'timeseries/bus_factor', 'timeseries/community_activity',
+                       'timeseries/contr_bre', 'timeseries/contributor_diversity', 'timeseries/reopened_issues',
+                       'timeseries/dist_work', 'timeseries/transparency']
+
+LOCATIONS = ['Omaha, NE', 'Columbia, MO', 'Berlin, Germany', 'Bangalore, India', 'San Francisco, CA', 'Sao Paulo, Brazil', None]
+
+EPOCH = pd.Timestamp('2010-01-01')
+# Seconds of history the generated activity spreads over
+HISTORY = 7 * 365 * 86400
+
+
+def _dates(rng, n, after=None, scale=None):
+    """
+    Random timestamps, uniform over the history or, when after is given,
+    exponentially distributed after those timestamps with a mean of scale seconds
+    """
+    if after is None:
+        return EPOCH + pd.to_timedelta(rng.randint(0, HISTORY, n), unit='s')
+    return pd.DatetimeIndex(after) + pd.to_timedelta(rng.exponential(scale, n).astype(np.int64) + 1, unit='s')
+
+
+def _pick_users(rng, projects, n_users, zipf=1.6):
+    """
+    Picks a user for each project id. Every project has its own pool of
+    users with a few very active ones, like real contributor counts.
+    """
+    offsets = (np.asarray(projects, dtype=np.int64) * 7919) % n_users
+    return (offsets + rng.zipf(zipf, len(offsets)) - 1) % n_users + 1
+
+
+def generate(dbstr, commits=10000, repos=None, skew=1.1, seed=0, indexes=False, chunksize=50000):
+    """
+    Builds a database with the GHTorrent schema filled with synthetic activity
+    :param dbstr: Database string of the database to fill, its GHTorrent tables are replaced
+    :param commits: Number of commits to generate, the other tables scale with it
+    :param repos: Number of repositories, commits / 1000 by default
+    :param skew: Zipf exponent of the repository sizes, higher makes the largest repositories larger
+    :param seed: Seed for the random number generator
+    :param indexes: Also create the indexes listed in ghdata.indexes.METRIC_INDEXES
+    :param chunksize: Rows inserted at a time
+    :return: Dict of table name to the number of rows generated
+    """
+    rng = np.random.RandomState(seed)
+    repos = repos or max(10, commits // 1000)
+    n_users = max(50, commits // 10)
+    engine = s.create_engine(dbstr)
+    schema.metadata.drop_all(engine)
+    schema.metadata.create_all(engine)
+    tables = {}
+
+    tables['users'] = pd.DataFrame({
+        'id': np.arange(1, n_users + 1),
+        'login': ['user{}'.format(i) for i in range(1, n_users + 1)],
+        'location': [LOCATIONS[i] for i in rng.randint(0, len(LOCATIONS), n_users)],
+        'created_at': _dates(rng, n_users),
+        'type': 'USR', 'fake': False, 'deleted': False})
+
+    # Repository sizes follow a power law, a few repositories have most of the activity
+    weights = 1.0 / np.arange(1, repos + 1) ** skew
+    sizes = rng.multinomial(commits, weights / weights.sum())
+    repo_ids = np.arange(1, repos + 1)
+    n_forks = repos // 2
+    tables['projects'] = pd.DataFrame({
+        'id': np.arange(1, repos + n_forks + 1),
+        'owner_id': np.concatenate([repo_ids, rng.randint(1, n_users + 1, n_forks)]),
+        'name': ['repo{}'.format(i) for i in repo_ids] + ['fork{}'.format(i) for i in range(1, n_forks + 1)],
+        'created_at': _dates(rng, repos + n_forks),
+        'forked_from': np.concatenate([np.full(repos, np.nan), rng.choice(repo_ids, n_forks, p=weights / weights.sum())]),
+        'deleted': False})
+
+    project_id = np.repeat(repo_ids, sizes)
+    authors = _pick_users(rng, project_id, n_users)
+    tables['commits'] = pd.DataFrame({
+        'id': np.arange(1, commits + 1),
+        'sha': ['{:040x}'.format(i) for i in range(1, commits + 1)],
+        'author_id': authors,
+        'committer_id': np.where(rng.rand(commits) < 0.8, authors, _pick_users(rng, project_id, n_users)),
+        'project_id': project_id,
+        'created_at': _dates(rng, commits)})
+    tables['project_commits'] = pd.DataFrame({'project_id': project_id, 'commit_id': tables['commits']['id']})
+
+    commented = rng.choice(commits, commits // 20, replace=False)
+    tables['commit_comments'] = pd.DataFrame({
+        'id': np.arange(1, len(commented) + 1),
+        'commit_id': commented + 1,
+        'user_id': _pick_users(rng, project_id[commented], n_users),
+        'comment_id': np.arange(1, len(commented) + 1),
+        'created_at': _dates(rng, len(commented), tables['commits']['created_at'].values[commented], 86400)})
+
+    stars = np.minimum(np.maximum(sizes // 2, 1), n_users)
+    star_repo = np.repeat(repo_ids, stars)
+    star_rank = np.arange(len(star_repo)) - np.repeat(np.cumsum(stars) - stars, stars)
+    tables['watchers'] = pd.DataFrame({
+        'repo_id': star_repo,
+        'user_id': (star_repo * 7919 + star_rank) % n_users + 1,
+        'created_at': _dates(rng, len(star_repo))})
+
+    issue_repo = np.repeat(repo_ids, sizes // 5)
+    n_issues = len(issue_repo)
+    issue_created = _dates(rng, n_issues)
+    tables['issues'] = pd.DataFrame({
+        'id': np.arange(1, n_issues + 1),
+        'repo_id': issue_repo,
+        'reporter_id': rng.randint(1, n_users + 1, n_issues),
+        'pull_request': False,
+        'created_at': issue_created,
+        'issue_id': np.arange(1, n_issues + 1) - np.repeat(np.cumsum(sizes // 5) - sizes // 5, sizes // 5)})
+
+    closed = np.flatnonzero(rng.rand(n_issues) < 0.7)
+    reopened = closed[rng.rand(len(closed)) < 0.07]
+    events_issue = np.concatenate([closed, reopened])
+    tables['issue_events'] = pd.DataFrame({
+        'event_id': np.arange(1, len(events_issue) + 1),
+        'issue_id': events_issue + 1,
+        'actor_id': _pick_users(rng, issue_repo[events_issue], n_users),
+        'action': ['closed'] * len(closed) + ['reopened'] * len(reopened),
+        'created_at': _dates(rng, len(events_issue), issue_created[events_issue], 14 * 86400)})
+
+    comment_issue = np.repeat(np.arange(n_issues), rng.poisson(2, n_issues))
+    tables['issue_comments'] = pd.DataFrame({
+        'issue_id': comment_issue + 1,
+        'user_id': _pick_users(rng, issue_repo[comment_issue], n_users),
+        'comment_id': np.arange(1, len(comment_issue) + 1),
+        'created_at': _dates(rng, len(comment_issue), issue_created[comment_issue], 2 * 86400)})
+
+    pull_repo = np.repeat(repo_ids, sizes // 10)
+    n_pulls = len(pull_repo)
+    tables['pull_requests'] = pd.DataFrame({
+        'id': np.arange(1, n_pulls + 1),
+        'head_repo_id': pull_repo,
+        'base_repo_id': pull_repo,
+        'pullreq_id': np.arange(1, n_pulls + 1),
+        'intra_branch': False})
+    opened_at = _dates(rng, n_pulls)
+    merged = np.flatnonzero(rng.rand(n_pulls) < 0.6)
+    history_pull = np.concatenate([np.arange(n_pulls), merged])
+    tables['pull_request_history'] = pd.DataFrame({
+        'id': np.arange(1, len(history_pull) + 1),
+        'pull_request_id': history_pull + 1,
+        'created_at': np.concatenate([opened_at.values, _dates(rng, len(merged), opened_at[merged], 3 * 86400).values]),
+        'action': ['opened'] * n_pulls + ['merged'] * len(merged),
+        'actor_id': _pick_users(rng, pull_repo[history_pull], n_users)})
+
+    comment_pull = np.repeat(np.arange(n_pulls), rng.poisson(1, n_pulls))
+    tables['pull_request_comments'] = pd.DataFrame({
+        'pull_request_id': comment_pull + 1,
+        'user_id': _pick_users(rng, pull_repo[comment_pull], n_users),
+        'comment_id': np.arange(1, len(comment_pull) + 1),
+        'commit_id': rng.randint(1, commits + 1, len(comment_pull)),
+        'created_at': _dates(rng, len(comment_pull), opened_at[comment_pull], 86400)})
+
+    member_repo = np.repeat(repo_ids, 3)
+    tables['project_members'] = pd.DataFrame({
+        'repo_id': member_repo,
+        'user_id': (member_repo * 7919 + np.tile(np.arange(3), repos)) % n_users + 1,
+        'created_at': _dates(rng, len(member_repo))})
+    org_users = np.arange(1, n_users + 1, 3)
+    tables['organization_members'] = pd.DataFrame({
+        'org_id': n_users + 1 + org_users % 20,
+        'user_id': org_users,
+        'created_at': _dates(rng, len(org_users))})
+
+    counts = {}
+    for name, frame in tables.items():
+        frame.to_sql(name, engine, if_exists='append', index=False, chunksize=chunksize)
+        counts[name] = len(frame)
+
+    if indexes:
+        from .indexes import METRIC_INDEXES
+        # Plain DDL so the indexes don't become part of schema.metadata
+        quote = engine.dialect.identifier_preparer.quote
+        needed = set(index for metric_indexes in METRIC_INDEXES.values() for index in metric_indexes)
+        with engine.begin() as conn:
+            for index in sorted(needed):
+                conn.exec_driver_sql('CREATE INDEX {} ON {} ({})'.format(
+                    quote(index.name), quote(index.table), ', '.join(quote(column) for column in index.columns)))
+    engine.dispose()
+    return counts
+
+
+def sample_repos(ghtorrent):
+    """
+    Picks the largest, median and smallest repository by number of commits
+    :return: Dict of label to (owner/repo, repoid)
+    """
+    reposSQL = s.sql.text("""
+        SELECT users.login AS owner, projects.name AS repo, projects.id AS repoid, COUNT(*) AS commits
+        FROM commits
+        JOIN projects ON projects.id = commits.project_id
+        JOIN users ON users.id = projects.owner_id
+        GROUP BY users.login, projects.name, projects.id
+        ORDER BY COUNT(*) DESC, projects.id
+    """)
+    repos = pd.read_sql(reposSQL, ghtorrent.db)
+    picks = {}
+    for label, position in (('largest', 0), ('median', len(repos) // 2), ('smallest', len(repos) - 1)):
+        row = repos.iloc[position]
+        picks[label] = ('{}/{}'.format(row['owner'], row['repo']), int(row['repoid']))
+    return picks
+
+
+def measure(func, repeat=5):
+    """
+    Calls a function several times and records how it performed. The timed calls run without
+    tracemalloc, which slows allocations down, the peak memory is measured by one more call.
+    :return: Dict with p50_ms, p95_ms, mean_ms, rows, peak_memory_bytes and error
+    """
+    timings = []
+    rows = None
+    for i in range(repeat):
+        began = time.time()
+        try:
+            result = func()
+        except Exception as e:
+            return {'error': '{}: {}'.format(type(e).__name__, str(e).split('\n')[0])}
+        timings.append((time.time() - began) * 1000)
+        rows = len(result) if hasattr(result, '__len__') else None
+        # Not held on to, so the next call's peak doesn't include it
+        result = None
+    peak = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        except Exception:
+            pass
+        finally:
+            tracemalloc.stop()
+    return {
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p95_ms': float(np.percentile(timings, 95)),
+        'mean_ms': float(np.mean(timings)),
+        'rows': rows,
+        'peak_memory_bytes': peak,
+        'error': None
+    }
+
+
+def run(ghtorrent, url=None, metrics=None, repeat=5, version='unstable'):
+    """
+    Times every metric method, and every endpoint of a running server when a url is given,
+    on the largest, median and smallest repository
+    :param ghtorrent: GHTorrent instance connected to the benchmark database, without a cache
+    :param url: Base url of a GHData server using the same database, e.g. http://localhost:5000
+    :param metrics: Names of the metrics to time, BENCHMARK_METRICS by default
+    :param repeat: Times every metric and endpoint is run
+    :return: Results as a dict ready for JSON
+    """
+    repos = sample_repos(ghtorrent)
+    results = {
+        'meta': {
+            'timestamp': datetime.datetime.utcnow().isoformat(),
+            'revision': _revision(),
+            'database': ghtorrent.db.dialect.name,
+            'repeat': repeat,
+            'repos': dict((label, name) for label, (name, repoid) in repos.items())
+        },
+        'metrics': {},
+        'endpoints': {}
+    }
+    for metric in (metrics or BENCHMARK_METRICS):
+        method = getattr(ghtorrent, metric)
+        results['metrics'][metric] = dict(
+            (label, measure(lambda: method(repoid), repeat)) for label, (name, repoid) in repos.items())
+    if url:
+        import requests
+        for endpoint in BENCHMARK_ENDPOINTS:
+            results['endpoints'][endpoint] = {}
+            for label, (name, repoid) in repos.items():
+                address = '{}/{}/{}/{}'.format(url.rstrip('/'), version, name, endpoint)
+                results['endpoints'][endpoint][label] = measure(lambda: _fetch(requests, address), repeat)
+    return results
+
+
+def _fetch(requests, address):
+    response = requests.get(address)
+    response.raise_for_status()
+    return json.loads(response.text)
+
+
+def _revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD']).decode('utf-8').strip()
+    except Exception:
+        return None
+
+
+def compare(baseline, current):
+    """
+    Compares the median latencies of two result files
+    :return: DataFrame with one row per metric or endpoint and repository, sorted by ratio
+    """
+    rows = []
+    for kind in ('metrics', 'endpoints'):
+        for name, labels in current.get(kind, {}).items():
+            for label, result in labels.items():
+                before = baseline.get(kind, {}).get(name, {}).get(label, {})
+                rows.append({
+                    'kind': kind,
+                    'name': name,
+                    'repo': label,
+                    'before_p50_ms': before.get('p50_ms'),
+                    'after_p50_ms': result.get('p50_ms'),
+                    'ratio': (result['p50_ms'] / before['p50_ms']) if result.get('p50_ms') and before.get('p50_ms') else None
+                })
+    return pd.DataFrame(rows, columns=['kind', 'name', 'repo', 'before_p50_ms', 'after_p50_ms', 'ratio']).sort_values('ratio')
@@ -0,0 +1,426 @@
+#SPDX-License-Identifier: MIT
+import sys
+import time
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+
+
+class NullCache(object):
+    """
+    A cache that never stores anything. Any object with the same methods can be
+    handed to GHTorrent as its cache, this one documents the interface.
+    """
+
+    def get(self, key):
+        """
+        Looks up a key
+        :param key: Key built by make_key()
+        :return: The cached value, or MISSING
+        """
+        return MISSING
+
+    def contains(self, key):
+        """
+        Checks for an unexpired entry without counting a hit or a miss
+        :param key: Key built by make_key()
+        :return: True if get() would return a value
+        """
+        return False
+
+    def set(self, key, value, ttl=None):
+        """
+        Stores a value
+        :param key: Key built by make_key()
+        :param value: Value to store
+        :param ttl: Seconds until the entry expires, None for the cache's default
+        """
+        pass
+
+    def invalidate(self, metric=None, repoid=None):
+        """
+        Drops entries, optionally only those for a metric and/or repoid
+        """
+        pass
+
+    def ttl_for(self, metric, default=None):
+        """
+        Returns the TTL to use for a metric
+        """
+        return default
+
+    def stats(self):
+        """
+        Returns a dict of counters describing the cache
+        """
+        return {}
+
+
+class _Missing(object):
+    def __repr__(self):
+        return 'MISSING'
+
+MISSING = _Missing()
+
+
+def sizeof(value):
+    """
+    Estimates how many bytes a cached value holds
+    :param value: DataFrame, Series or any other Python object
+    :return: Approximate size in bytes
+    """
+    if hasattr(value, 'memory_usage'):
+        usage = value.memory_usage(index=True, deep=True)
+        return int(usage.sum()) if hasattr(usage, 'sum') else int(usage)
+    return sys.getsizeof(value)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def make_key(metric, repoid=None, args=None):
+    """
+    Builds a cache key for a metric call
+    :param metric: Name of the metric method
+    :param repoid: The id of the project the metric was computed for
+    :param args: Dict of the remaining arguments
+    :return: Hashable key
+    """
+    return (metric, repoid, _freeze(args or {}))
+
+
+class MetricCache(NullCache):
+    """
+    Thread-safe in-process cache for metric results with per-metric TTLs
+    and least-recently-used eviction once a memory budget is exceeded
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, default_ttl=300, ttls=None):
+        """
+        Creates a new cache
+        :param max_bytes: Memory budget, least recently used entries are evicted past it
+        :param default_ttl: Seconds an entry lives unless its metric has its own TTL
+        :param ttls: Dict of metric name to TTL in seconds
+        """
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.__bytes = 0
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def ttl_for(self, metric, default=None):
+        if metric in self.ttls:
+            return self.ttls[metric]
+        if default is not None:
+            return default
+        return self.default_ttl
+
+    def get(self, key):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            value, expires, size = entry
+            if expires is not None and expires <= time.time():
+                self.__remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            # Mark as most recently used
+            del self.__entries[key]
+            self.__entries[key] = entry
+            self.hits += 1
+        # Callers are free to modify what they get back
+        if hasattr(value, 'copy'):
+            return value.copy()
+        return value
+
+    def contains(self, key):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            return entry is not None and (entry[1] is None or entry[1] > time.time())
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl_for(key[0])
+        if ttl is not None and ttl <= 0:
+            return
+        size = sizeof(value)
+        if size > self.max_bytes:
+            return
+        expires = time.time() + ttl if ttl is not None else None
+        with self.__lock:
+            if key in self.__entries:
+                self.__remove(key)
+            self.__entries[key] = (value, expires, size)
+            self.__bytes += size
+            while self.__bytes > self.max_bytes and self.__entries:
+                oldest = next(iter(self.__entries))
+                self.__remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, metric=None, repoid=None):
+        with self.__lock:
+            for key in list(self.__entries.keys()):
+                if metric is not None and key[0] != metric:
+                    continue
+                if repoid is not None and key[1] != repoid:
+                    continue
+                self.__remove(key)
+
+    def stats(self):
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.__entries),
+                'bytes': self.__bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+    def __remove(self, key):
+        value, expires, size = self.__entries.pop(key)
+        self.__bytes -= size
+
+
+class LookupCache(object):
+    """
+    Thread-safe cache for name to id lookups. Lookups that found nothing are
+    remembered too, but for a shorter time so new projects show up quickly.
+    """
+
+    def __init__(self, ttl=86400, negative_ttl=300, max_entries=100000):
+        """
+        Creates a new lookup cache
+        :param ttl: Seconds a found id is remembered
+        :param negative_ttl: Seconds a failed lookup is remembered
+        :param max_entries: Entries kept before the least recently used are dropped
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :return: The cached id, 0 for a remembered miss, or MISSING
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires = entry
+            if expires <= time.time():
+                del self.__entries[key]
+                return MISSING
+            del self.__entries[key]
+            self.__entries[key] = entry
+            return value
+
+    def set(self, key, value):
+        ttl = self.ttl if value else self.negative_ttl
+        with self.__lock:
+            self.__entries.pop(key, None)
+            self.__entries[key] = (value, time.time() + ttl)
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+
+class _Call(object):
+    """
+    A call in flight and, once it returns, its result or error
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Coalesces identical calls. While a call for a key is running, other calls
+    with the same key wait for it and share its result instead of running too.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self.__calls = {}
+        self.__lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Runs func unless a call with the same key is already running, then waits for that one
+        :param key: Hashable key identifying the call, e.g. built by make_key()
+        :return: The result of func, shared by every coalesced call
+        :raises: The error of func, in every coalesced call
+        """
+        call, leader = self.join(key)
+        if not leader:
+            return self.wait(call)
+        return self.run(key, call, func, *args, **kwargs)
+
+    def join(self, key):
+        """
+        Joins the call for a key without waiting, for callers that run it somewhere else, e.g. on an executor
+        :return: (call, leader). The leader runs the call with run(), or ends it with finish() if it can't,
+                 the others get its result with wait().
+        """
+        with self.__lock:
+            call = self.__calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.__calls[key] = _Call()
+            else:
+                self.coalesced += 1
+        return call, leader
+
+    def run(self, key, call, func, *args, **kwargs):
+        """
+        Runs the call the leader joined and shares its result or error
+        """
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result=result)
+        return result
+
+    def finish(self, key, call, result=None, error=None):
+        """
+        Ends a joined call, the callers waiting for it get the result or error. Only the first finish counts.
+        """
+        with self.__lock:
+            if self.__calls.get(key) is not call:
+                return
+            del self.__calls[key]
+            call.result, call.error = result, error
+        call.done.set()
+
+    def wait(self, call, timeout=None):
+        """
+        Waits for a joined call
+        :return: Its result, MISSING if it didn't finish within timeout seconds
+        :raises: Its error
+        """
+        if not call.done.wait(timeout):
+            return MISSING
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self):
+        """
+        Number of distinct calls running right now
+        """
+        with self.__lock:
+            return len(self.__calls)
+
+
+def _call_key(metric, callargs):
+    """
+    Cache key of a metric call from its arguments as returned by inspect.getcallargs
+    """
+    callargs = dict(callargs)
+    callargs.pop('self', None)
+    repoid = callargs.pop('repoid', None)
+    return make_key(metric, repoid, callargs)
+
+
+def method_key(instance, method, *args, **kwargs):
+    """
+    Cache key under which a cached method stores its result for the arguments
+    :param instance: Object with the method
+    :param method: Name of the method
+    :param args: The arguments of the call, the interval of methods that resample is ignored
+    """
+    wrapper = getattr(type(instance), method)
+    callargs = inspect.getcallargs(wrapper.__wrapped__, instance, *args, **kwargs)
+    if wrapper.resample is not None:
+        callargs['interval'] = 'day'
+    return _call_key(method, callargs)
+
+
+def prime(instance, method, result, *args, **kwargs):
+    """
+    Stores a result of a cached method that was computed another way, e.g. by a query
+    shared with other metrics, so the method's next identical call is a cache hit
+    :param instance: Object with the method, its cache is used
+    :param method: Name of the method
+    :param result: The method's result for the arguments, for methods that resample the daily series
+    :param args: The arguments of the call, the interval of methods that resample is ignored
+    """
+    cache = getattr(instance, 'cache', None)
+    if cache is None:
+        return
+    wrapper = getattr(type(instance), method)
+    cache.set(method_key(instance, method, *args, **kwargs), result, ttl=cache.ttl_for(method, wrapper.ttl))
+
+
+def cached(ttl=None, resample=None):
+    """
+    Decorator for metric methods. Results are stored in the instance's `cache`
+    attribute, keyed by method name, repoid and the remaining arguments.
+    Streaming calls (a chunksize is given) always bypass the cache.
+    :param ttl: Default TTL in seconds for this metric, overridable per metric in the cache
+    :param resample: For timeseries metrics with an interval argument, a function(frame, interval)
+                     like ghdata.timeseries.resample. The metric is always run for interval='day',
+                     and that daily series is cached, so every interval is served from one cached result.
+    """
+    def decorator(func):
+        metric = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            cache = getattr(self, 'cache', None)
+            if cache is None and resample is None:
+                return func(self, *args, **kwargs)
+            callargs = inspect.getcallargs(func, self, *args, **kwargs)
+            if resample is not None:
+                interval = callargs['interval']
+                callargs['interval'] = 'day'
+                kwargs = dict(callargs)
+                del kwargs['self']
+                args = ()
+            if cache is None or callargs.get('chunksize') is not None:
+                result = func(self, *args, **kwargs)
+            else:
+                key = _call_key(metric, callargs)
+                result = cache.get(key)
+                if result is MISSING:
+                    result = func(self, *args, **kwargs)
+                    cache.set(key, result, ttl=cache.ttl_for(metric, ttl))
+                    # Like a hit, the caller gets its own copy, changing it mustn't change the cached result
+                    if hasattr(result, 'copy'):
+                        result = result.copy()
+            if resample is not None:
+                return resample(result, interval)
+            return result
+        wrapper.cached = True
+        wrapper.ttl = ttl
+        wrapper.resample = resample
+        # functools.wraps only sets this on Python 3
+        wrapper.__wrapped__ = func
+        return wrapper
+    return decorator
@@ -0,0 +1,167 @@
+#SPDX-License-Identifier: MIT
+import sys
+import argparse
+
+
+def serve(args):
+    """
+    Runs the GHData server, on a pool of forked worker processes with --workers
+    """
+    from . import server
+    if args.command is None:
+        server.run()
+        return
+    server.run(args.config, host=args.host, port=args.port, workers=args.workers, threads=args.threads,
+               max_requests=args.max_requests, graceful_timeout=args.graceful_timeout, timeout=args.timeout)
+
+
+def connect(args):
+    """
+    Creates a GHTorrent instance from --db or the config file
+    """
+    import ghdata
+    from . import config
+    if args.db:
+        return ghdata.GHTorrent(args.db)
+    parser = config.read_config(args.config)
+    if not parser.has_section('Database'):
+        sys.exit('No database configured, pass --db or create {}'.format(args.config))
+    return ghdata.GHTorrent(config.database_string(parser), **config.database_options(parser))
+
+
+def index(args):
+    """
+    Reports the indexes the metrics need that the database lacks, and creates them with --create
+    """
+    from .indexes import IndexAdvisor
+    advisor = IndexAdvisor(connect(args))
+    missing = advisor.missing(args.metric)
+    if not missing:
+        print('All indexes the metrics need are present.')
+        return
+    repoid = None
+    if args.repo:
+        owner, repo = args.repo.split('/', 1)
+        repoid = advisor.ghtorrent.repoid(owner, repo)
+    needed = []
+    for metric in sorted(missing):
+        print('{}:'.format(metric))
+        for idx in missing[metric]:
+            print('    missing {}'.format(idx))
+            if idx not in needed:
+                needed.append(idx)
+        if repoid:
+            print('    EXPLAIN for {}:'.format(args.repo))
+            for number, plan in enumerate(advisor.explain(metric, repoid), 1):
+                print('        query {}:'.format(number))
+                for row in plan:
+                    print('            ' + ', '.join('{}={}'.format(key, value) for key, value in row.items()))
+    if args.create:
+        for idx in needed:
+            print('Creating {} ...'.format(idx))
+            advisor.create([idx])
+        print('Created {} indexes.'.format(len(needed)))
+    else:
+        print('\nRun again with --create to create them:')
+        for idx in needed:
+            print('    {};'.format(advisor.ddl(idx)))
+
+
+def snapshot(args):
+    """
+    Extracts the GHTorrent rows of repositories to Parquet files for OfflineGHTorrent
+    """
+    from .snapshot import snapshot
+    ghtorrent = connect(args)
+    for name in args.repos:
+        owner, repo = name.split('/', 1)
+        manifest = snapshot(ghtorrent, owner, repo, args.output, compression=args.compression)
+        print('{}: {} rows'.format(name, sum(manifest['rows'].values())))
+
+
+def benchmark(args):
+    """
+    Generates a synthetic GHTorrent database, times the metrics against it, or compares two runs
+    """
+    import json
+    from . import benchmark
+    if args.action == 'generate':
+        counts = benchmark.generate(args.db, commits=args.commits, repos=args.repos, skew=args.skew, seed=args.seed, indexes=args.indexes)
+        for table in sorted(counts):
+            print('{:<24}{:>12}'.format(table, counts[table]))
+    elif args.action == 'run':
+        import ghdata
+        results = benchmark.run(ghdata.GHTorrent(args.db), url=args.url, metrics=args.metric, repeat=args.repeat)
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+        print('Results written to {}'.format(args.output))
+    else:
+        with open(args.baseline) as baseline, open(args.current) as current:
+            print(benchmark.compare(json.load(baseline), json.load(current)).to_string(index=False))
+
+
+def main(argv=None):
+    """
+    Entry point of the ghdata command. Without a subcommand it runs the server.
+    """
+    from .indexes import METRIC_INDEXES
+    parser = argparse.ArgumentParser(prog='ghdata', description='Library/Server for data related to the health and sustainability of GitHub projects')
+    subparsers = parser.add_subparsers(dest='command')
+
+    serve_parser = subparsers.add_parser('serve', help='run the GHData server (default)')
+    serve_parser.add_argument('--config', default='ghdata.cfg', help='config file (default: ghdata.cfg)')
+    serve_parser.add_argument('--host', help='address to listen on, overrides the config')
+    serve_parser.add_argument('--port', type=int, help='port to listen on, overrides the config')
+    serve_parser.add_argument('--workers', type=int, help='number of worker processes; without it, or with 0, the development server runs')
+    serve_parser.add_argument('--threads', type=int, help='number of requests each worker serves at the same time (default: 4)')
+    serve_parser.add_argument('--max-requests', type=int, help='replace a worker after it served this many requests (default: never)')
+    serve_parser.add_argument('--graceful-timeout', type=float, help='seconds stopping workers have to finish their requests (default: 30)')
+    serve_parser.add_argument('--timeout', type=float, help='kill a worker that sent no heartbeat for this many seconds (default: 60)')
+
+    index_parser = subparsers.add_parser('index', help='check the GHTorrent database for the indexes the metrics need')
+    index_parser.add_argument('--config', default='ghdata.cfg', help='config file with the database settings (default: ghdata.cfg)')
+    index_parser.add_argument('--db', help='database string, overrides the config file')
+    index_parser.add_argument('--metric', action='append', choices=sorted(METRIC_INDEXES), help='only check this metric, can be repeated')
+    index_parser.add_argument('--repo', metavar='OWNER/REPO', help='show the query plans of the affected metrics for this repository')
+    index_parser.add_argument('--create', action='store_true', help='create the missing indexes online')
+
+    snapshot_parser = subparsers.add_parser('snapshot', help='extract repositories to Parquet files for offline metrics')
+    snapshot_parser.add_argument('repos', nargs='+', metavar='OWNER/REPO')
+    snapshot_parser.add_argument('--config', default='ghdata.cfg', help='config file with the database settings (default: ghdata.cfg)')
+    snapshot_parser.add_argument('--db', help='database string, overrides the config file')
+    snapshot_parser.add_argument('--output', default='snapshots', help='directory the snapshots are written to (default: snapshots)')
+    snapshot_parser.add_argument('--compression', default='zstd', help='Parquet compression codec (default: zstd)')
+
+    benchmark_parser = subparsers.add_parser('benchmark', help='measure the performance of the metrics on synthetic data')
+    benchmark_subparsers = benchmark_parser.add_subparsers(dest='action')
+    benchmark_subparsers.required = True
+    generate_parser = benchmark_subparsers.add_parser('generate', help='build a GHTorrent database filled with synthetic activity')
+    generate_parser.add_argument('--db', required=True, help='database string to fill, e.g. sqlite:///benchmark.db')
+    generate_parser.add_argument('--commits', type=int, default=10000, help='number of commits, the other tables scale with it (default: 10000)')
+    generate_parser.add_argument('--repos', type=int, help='number of repositories (default: commits / 1000)')
+    generate_parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent of the repository sizes (default: 1.1)')
+    generate_parser.add_argument('--seed', type=int, default=0)
+    generate_parser.add_argument('--indexes', action='store_true', help='also create the indexes the metrics need')
+    run_parser = benchmark_subparsers.add_parser('run', help='time every metric on the largest, median and smallest repository')
+    run_parser.add_argument('--db', required=True, help='database string of the benchmark database')
+    run_parser.add_argument('--url', help='also time the endpoints of a GHData server using the same database')
+    run_parser.add_argument('--metric', action='append', help='only time this metric, can be repeated')
+    run_parser.add_argument('--repeat', type=int, default=5, help='times every metric is run (default: 5)')
+    run_parser.add_argument('--output', default='benchmark.json', help='results file (default: benchmark.json)')
+    compare_parser = benchmark_subparsers.add_parser('compare', help='compare the latencies of two results files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+
+    args = parser.parse_args(argv)
+    commands = {
+        None: serve,
+        'serve': serve,
+        'index': index,
+        'snapshot': snapshot,
+        'benchmark': benchmark
+    }
+    commands[args.command](args)
+
+
+if __name__ == '__main__':
+    main()
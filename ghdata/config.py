@@ -0,0 +1,151 @@
+#SPDX-License-Identifier: MIT
+import sys
+if (sys.version_info > (3, 0)):
+    import configparser as configparser
+else:
+    import ConfigParser as configparser
+
+
+def read_config(path='ghdata.cfg'):
+    """
+    Reads a GHData config file
+    :param path: Path to the config file
+    :return: RawConfigParser, empty if the file doesn't exist
+    """
+    parser = configparser.RawConfigParser()
+    parser.read(path)
+    return parser
+
+
+def database_string(parser):
+    """
+    Builds the database string for GHTorrent from the Database section of the config.
+    Its url option, e.g. sqlite:///ghtorrent.db, replaces the MySQL settings.
+    """
+    if (parser.has_option('Database', 'url')):
+        return parser.get('Database', 'url')
+    return 'mysql+pymysql://{}:{}@{}:{}/{}'.format(parser.get('Database', 'user'), parser.get('Database', 'pass'), parser.get('Database', 'host'), parser.get('Database', 'port'), parser.get('Database', 'name'))
+
+
+def database_options(parser):
+    """
+    Reads the optional pool and replica settings from the Database section of the config
+    :return: Dict of keyword arguments for GHTorrent
+    """
+    options = {'pool': {}}
+    for option in ('pool_size', 'max_overflow', 'pool_recycle'):
+        if (parser.has_option('Database', option)):
+            options['pool'][option] = int(parser.get('Database', option))
+    if (parser.has_option('Database', 'pool_pre_ping')):
+        options['pool']['pool_pre_ping'] = parser.get('Database', 'pool_pre_ping') == '1'
+    if (parser.has_option('Database', 'replicas')):
+        # One database string per line
+        options['replicas'] = parser.get('Database', 'replicas').split()
+    if (parser.has_option('Database', 'analytics')):
+        options['analytics'] = parser.get('Database', 'analytics')
+    if (parser.has_option('Database', 'analytics_metrics')):
+        options['analytics_metrics'] = [metric.strip() for metric in parser.get('Database', 'analytics_metrics').split(',')]
+    return options
+
+
+def executor_options(parser):
+    """
+    Reads the optional worker and timeout settings from the Executor and Timeouts sections of the config
+    :return: Dict of keyword arguments for MetricExecutor
+    """
+    options = {}
+    for option in ('workers', 'queue'):
+        if (parser.has_option('Executor', option)):
+            options[option] = int(parser.get('Executor', option))
+    if (parser.has_option('Executor', 'timeout')):
+        options['timeout'] = float(parser.get('Executor', 'timeout'))
+    if (parser.has_section('Timeouts')):
+        options['timeouts'] = {metric: float(timeout) for metric, timeout in parser.items('Timeouts')}
+    return options
+
+
+def server_options(parser):
+    """
+    Reads the optional settings of the preforking server from the Server section of the config
+    :return: Dict of keyword arguments for PreforkServer, without workers the development server is run
+    """
+    options = {}
+    for option in ('workers', 'threads', 'max_requests'):
+        if (parser.has_option('Server', option)):
+            options[option] = int(parser.get('Server', option))
+    for option in ('graceful_timeout', 'timeout'):
+        if (parser.has_option('Server', option)):
+            options[option] = float(parser.get('Server', option))
+    return options
+
+
+def warmer_options(parser):
+    """
+    Reads the watchlist and schedule of the cache warmer from the Warmer section of the config.
+    Repositories come from its repos option, one owner/repo per line, and from its watchlist file.
+    :return: Dict of keyword arguments for CacheWarmer, without the GHTorrent instance
+    """
+    from .warmer import parse_repo, read_watchlist
+    options = {'repos': []}
+    if (parser.has_option('Warmer', 'repos')):
+        options['repos'] += [parse_repo(name) for name in parser.get('Warmer', 'repos').split()]
+    if (parser.has_option('Warmer', 'watchlist')):
+        options['repos'] += read_watchlist(parser.get('Warmer', 'watchlist'))
+    if (parser.has_option('Warmer', 'metrics')):
+        options['metrics'] = [metric.strip() for metric in parser.get('Warmer', 'metrics').split(',')]
+    for option in ('workers', 'interval'):
+        if (parser.has_option('Warmer', option)):
+            options[option] = int(parser.get('Warmer', option))
+    for option in ('refresh', 'timeout'):
+        if (parser.has_option('Warmer', option)):
+            options[option] = float(parser.get('Warmer', option))
+    return options
+
+
+def write_default(path='ghdata.cfg'):
+    """
+    Writes a config file with the default settings
+    :param path: Path of the config file
+    """
+    config = configparser.RawConfigParser()
+    config.add_section('Server')
+    config.set('Server', 'host', '0.0.0.0')
+    config.set('Server', 'port', '5000')
+    config.add_section('Database')
+    config.set('Database', 'host', '127.0.0.1')
+    config.set('Database', 'port', '3306')
+    config.set('Database', 'user', 'root')
+    config.set('Database', 'pass', 'root')
+    config.set('Database', 'name', 'ghtorrent')
+    config.set('Database', 'pool_size', '5')
+    config.set('Database', 'max_overflow', '10')
+    config.set('Database', 'pool_pre_ping', '1')
+    config.set('Database', 'pool_recycle', '3600')
+    config.add_section('PublicWWW')
+    config.set('PublicWWW', 'APIKey', '0')
+    config.add_section('Cache')
+    config.set('Cache', 'enabled', '1')
+    config.set('Cache', 'memory_mb', '256')
+    config.set('Cache', 'ttl', '300')
+    config.add_section('CacheTTL')
+    config.set('CacheTTL', 'contributors', '3600')
+    config.add_section('Rollups')
+    config.set('Rollups', 'max_age', '172800')
+    config.add_section('Executor')
+    config.set('Executor', 'workers', '8')
+    config.set('Executor', 'queue', '16')
+    config.set('Executor', 'timeout', '30')
+    config.add_section('Timeouts')
+    config.set('Timeouts', 'contributors', '120')
+    config.add_section('Warmer')
+    config.set('Warmer', 'enabled', '0')
+    config.set('Warmer', 'watchlist', 'watchlist.txt')
+    config.set('Warmer', 'workers', '2')
+    config.set('Warmer', 'refresh', '0.8')
+    config.set('Warmer', 'interval', '30')
+    config.add_section('HTTP')
+    config.set('HTTP', 'cache_control', 'public, max-age=300')
+    config.add_section('Development')
+    config.set('Development', 'developer', '0')
+    with open(path, 'w') as configfile:
+        config.write(configfile)
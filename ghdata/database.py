@@ -0,0 +1,113 @@
+#SPDX-License-Identifier: MIT
+import itertools
+import sqlalchemy as s
+from sqlalchemy.pool import NullPool
+
+
+def create_engine(dbstr, pool=None):
+    """
+    Creates an engine with the given pool settings
+    :param dbstr: The database string to connect to
+    :param pool: Dict of pool options for create_engine: pool_size, max_overflow, pool_pre_ping, pool_recycle
+    :return: SQLAlchemy engine
+    """
+    pool = dict(pool or {})
+    try:
+        return s.create_engine(dbstr, **pool)
+    except TypeError:
+        # Some dialects (SQLite) default to pools without a size, keep what they support
+        pool.pop('pool_size', None)
+        pool.pop('max_overflow', None)
+        return s.create_engine(dbstr, **pool)
+
+
+def load(engine):
+    """
+    Number of connections the engine's pool has checked out right now
+    """
+    checkedout = getattr(engine.pool, 'checkedout', None)
+    return checkedout() if checkedout is not None else 0
+
+
+def canceller(engine, connection):
+    """
+    Builds a function that stops the query running on a connection, to be called from another thread
+    :param engine: The engine the connection was checked out from
+    :param connection: SQLAlchemy Connection
+    :return: Function without arguments
+    """
+    proxied = connection.connection
+    dbapi = getattr(proxied, 'dbapi_connection', None) or proxied.connection
+    if engine.dialect.name == 'sqlite':
+        return dbapi.interrupt
+    if engine.dialect.name == 'mysql' and hasattr(dbapi, 'thread_id'):
+        thread_id = int(dbapi.thread_id())
+
+        def kill():
+            # The connection is busy running the query, so KILL QUERY has to come from another one. It is
+            # opened outside of the pool, which the stuck queries may have emptied.
+            killer = s.create_engine(engine.url, poolclass=NullPool)
+            try:
+                with killer.connect() as conn:
+                    conn.execute(s.text('KILL QUERY {}'.format(thread_id)))
+            finally:
+                killer.dispose()
+        return kill
+    if hasattr(dbapi, 'cancel'):
+        # psycopg2 and other drivers that can cancel by themselves
+        return dbapi.cancel
+    # Nothing to stop, the query runs to the end on a worker nobody waits for anymore
+    return lambda: None
+
+
+class EngineRouter(object):
+    """
+    Routes queries between a primary GHTorrent database, its read replicas
+    and an optional analytics replica reserved for the heaviest metrics
+    """
+
+    def __init__(self, dbstr, replicas=None, analytics=None, analytics_metrics=(), pool=None):
+        """
+        :param dbstr: Database string of the primary, used for writes and when there are no replicas
+        :param replicas: List of database strings of read replicas
+        :param analytics: Database string of the replica that runs analytics_metrics
+        :param analytics_metrics: Names of the metrics pinned to the analytics replica
+        :param pool: Dict of pool options used for every engine, see create_engine()
+        """
+        self.primary = create_engine(dbstr, pool)
+        self.replicas = [create_engine(replica, pool) for replica in (replicas or [])] or [self.primary]
+        self.analytics = create_engine(analytics, pool) if analytics else None
+        self.analytics_metrics = set(analytics_metrics or ())
+        self.__turn = itertools.count()
+
+    def engine(self, metric=None):
+        """
+        Picks the engine a metric's query should run on. Pinned metrics go to the analytics
+        replica, everything else to the replica with the fewest connections in use.
+        :param metric: Name of the metric about to run, if any
+        :return: SQLAlchemy engine
+        """
+        if self.analytics is not None and metric in self.analytics_metrics:
+            return self.analytics
+        if len(self.replicas) == 1:
+            return self.replicas[0]
+        # Take turns between replicas that are equally busy
+        first = next(self.__turn) % len(self.replicas)
+        return min(self.replicas[first:] + self.replicas[:first], key=load)
+
+    def engines(self):
+        """
+        All distinct engines, primary first
+        """
+        engines = [self.primary]
+        for engine in self.replicas + [self.analytics]:
+            if engine is not None and engine not in engines:
+                engines.append(engine)
+        return engines
+
+    def dispose(self):
+        """
+        Closes the connections of every engine's pool
+        """
+        for engine in self.engines():
+            engine.dispose()
@@ -0,0 +1,239 @@
+#SPDX-License-Identifier: MIT
+import time
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+_local = threading.local()
+
+
+class ExecutorBusy(Exception):
+    """
+    Raised when every worker is busy and the queue of waiting metrics is full
+    """
+
+
+class QueryTimeout(Exception):
+    """
+    Raised when a metric doesn't finish before its deadline
+    """
+    def __init__(self, metric, timeout):
+        Exception.__init__(self, '{} took longer than {} seconds'.format(metric, timeout))
+        self.metric = metric
+        self.timeout = timeout
+
+
+class Cancelled(Exception):
+    """
+    Raised instead of running a query for a metric that already timed out
+    """
+
+
+class Cancellation(object):
+    """
+    Lets a timed out metric stop the queries its worker is running
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self.__cancels = []
+        self.__lock = threading.Lock()
+
+    def register(self, cancel):
+        """
+        Adds a function that stops a running query
+        :return: The function, to pass to unregister() once the query is done
+        :raises Cancelled: if the metric was already cancelled, the query shouldn't be started
+        """
+        with self.__lock:
+            if self.cancelled:
+                raise Cancelled()
+            self.__cancels.append(cancel)
+        return cancel
+
+    def unregister(self, cancel):
+        with self.__lock:
+            if cancel in self.__cancels:
+                self.__cancels.remove(cancel)
+
+    def cancel(self):
+        """
+        Stops every registered query, the metric's later queries won't start
+        """
+        with self.__lock:
+            self.cancelled = True
+            cancels, self.__cancels = self.__cancels, []
+        for cancel in cancels:
+            try:
+                cancel()
+            except Exception:
+                # The query may have finished or its connection closed in the meantime
+                pass
+
+
+def current():
+    """
+    The Cancellation of the metric running on this thread, None outside of a MetricExecutor
+    """
+    return getattr(_local, 'cancellation', None)
+
+
+class Pending(object):
+    """
+    A metric submitted to a MetricExecutor
+    """
+
+    def __init__(self, metric, future, cancellation, timeout):
+        self.metric = metric
+        self.timeout = timeout
+        self.__future = future
+        self.__cancellation = cancellation
+        self.__deadline = time.time() + timeout if timeout is not None else None
+
+    def remaining(self):
+        """
+        Seconds left until the deadline, None if there is none
+        """
+        return None if self.__deadline is None else max(self.__deadline - time.time(), 0)
+
+    def cancel(self):
+        """
+        Stops the metric: if it is still waiting for a worker it never starts, if it is running its queries are stopped
+        """
+        self.__future.cancel()
+        self.__cancellation.cancel()
+
+    def result(self):
+        """
+        Waits for the metric until its deadline, counted from when it was submitted
+        :raises QueryTimeout: if it didn't finish in time, its queries are cancelled
+        """
+        try:
+            return self.__future.result(timeout=self.remaining())
+        except TimeoutError:
+            self.cancel()
+            raise QueryTimeout(self.metric, self.timeout)
+
+
+class MetricExecutor(object):
+    """
+    Runs metrics on a bounded pool of threads with a deadline for each, so a slow
+    query can't hold on to a request thread and a database connection indefinitely
+    """
+
+    # Items a streaming metric produces ahead of the caller
+    STREAM_AHEAD = 2
+
+    def __init__(self, workers=8, queue=16, timeout=30, timeouts=None):
+        """
+        :param workers: Number of metrics run at the same time
+        :param queue: Number of metrics that can wait for a worker, more are turned away with ExecutorBusy
+        :param timeout: Default deadline in seconds, from when the metric is submitted
+        :param timeouts: Dict of metric name to its own deadline in seconds
+        """
+        self.workers = workers
+        self.timeout = timeout
+        self.timeouts = dict(timeouts or {})
+        self.__pool = ThreadPoolExecutor(max_workers=workers)
+        self.__slots = threading.BoundedSemaphore(workers + queue)
+
+    def timeout_for(self, metric):
+        """
+        Returns the deadline in seconds to use for a metric
+        """
+        return self.timeouts.get(metric, self.timeout)
+
+    def submit(self, metric, func, *args, **kwargs):
+        """
+        Starts func on a worker without waiting for it
+        :param metric: Name of the metric, used for its deadline
+        :return: Pending call, its result() waits until the metric's deadline
+        :raises ExecutorBusy: if there is no room in the queue
+        """
+        if not self.__slots.acquire(False):
+            raise ExecutorBusy('Too many metrics are running, try again later')
+        cancellation = Cancellation()
+
+        def task():
+            _local.cancellation = cancellation
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _local.cancellation = None
+
+        try:
+            future = self.__pool.submit(task)
+        except Exception:
+            self.__slots.release()
+            raise
+        future.add_done_callback(lambda future: self.__slots.release())
+        return Pending(metric, future, cancellation, self.timeout_for(metric))
+
+    def run(self, metric, func, *args, **kwargs):
+        """
+        Runs func on a worker and waits for its result until the metric's deadline.
+        Queries sent through GHTorrent while it runs are cancelled on the database
+        server when the deadline passes.
+        :param metric: Name of the metric, used for its deadline
+        :raises ExecutorBusy: if there is no room in the queue
+        :raises QueryTimeout: if func didn't finish in time
+        """
+        return self.submit(metric, func, *args, **kwargs).result()
+
+    def stream(self, metric, func, *args, **kwargs):
+        """
+        Runs func, which returns an iterator, on a worker and yields its items as they are produced.
+        The worker keeps at most STREAM_AHEAD items ahead of the caller. The metric's deadline covers the whole
+        iteration. When it passes, or the caller stops iterating early, the queries are cancelled.
+        :param metric: Name of the metric, used for its deadline
+        :return: Iterator of the items, raises QueryTimeout if they aren't all produced in time
+        :raises ExecutorBusy: if there is no room in the queue
+        """
+        items = queue.Queue(maxsize=self.STREAM_AHEAD)
+        stopped = threading.Event()
+
+        def offer(item):
+            # Waits for room in the queue, unless the caller is gone
+            while not stopped.is_set():
+                try:
+                    items.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for item in func(*args, **kwargs):
+                    if not offer((True, item)):
+                        return
+            except Exception as e:
+                offer((False, e))
+            else:
+                offer((False, None))
+
+        return self.__consume(self.submit(metric, produce), items, stopped)
+
+    def __consume(self, pending, items, stopped):
+        try:
+            while True:
+                try:
+                    more, item = items.get(timeout=pending.remaining())
+                except queue.Empty:
+                    raise QueryTimeout(pending.metric, pending.timeout)
+                if not more:
+                    if item is not None:
+                        raise item
+                    return
+                yield item
+        finally:
+            stopped.set()
+            # Nothing to stop if func is done, otherwise its queries are cancelled
+            pending.cancel()
+
+    def shutdown(self, wait=True):
+        self.__pool.shutdown(wait=wait)
@@ -3,33 +3,316 @@ import pandas as pd
 import sqlalchemy as s
 import sys
 import json
-import re
+import time
+import datetime
+import functools
+import threading
+from collections import OrderedDict
+from .cache import cached, prime, LookupCache, MISSING
+from . import schema
+from . import sql
+from . import timeseries
+from . import database
+from . import executor
+from .rollup import Rollups
+from .database import EngineRouter
+
+
+def _chunks(items, size):
+    """
+    Splits a list into lists of at most size items
+    """
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _in_range(column, start=None, end=None):
+    """
+    Conditions limiting a column to the range [start, end)
+    :param column: The column to limit, usually a created_at
+    :param start: Earliest date to include, or None
+    :param end: Date to stop before, or None
+    :return: List of conditions, empty when neither is set
+    """
+    conditions = []
+    if start is not None:
+        conditions.append(column >= pd.Timestamp(start).to_pydatetime())
+    if end is not None:
+        conditions.append(column < pd.Timestamp(end).to_pydatetime())
+    return conditions
+
+
+def _counts(name, key, source, *conditions):
+    """
+    Subquery counting the rows of source that match the conditions for every value of key
+    :return: Subquery with key and count columns
+    """
+    return s.select(key.label('key'), s.func.count().label('count')) \
+            .select_from(source).where(*conditions).group_by(key).subquery(name)
 
 
 class GHTorrent(object):
     """Uses GHTorrent and other GitHub data sources and returns dataframes with interesting GitHub indicators"""
 
-    def __init__(self, dbstr):
+    # Number of names sent to the database in a single lookup query
+    RESOLVE_CHUNK_SIZE = 500
+    # Number of projects counted by a single *_many() query
+    MANY_CHUNK_SIZE = 1000
+    # Metrics sent to the analytics replica when there is one
+    ANALYTICS_METRICS = ('contributors', 'contributions')
+    # Timeseries that count the rows of a single table: metric: (table, column with the project ids)
+    SINGLE_TABLE_COUNTS = OrderedDict([
+        ('stargazers', ('watchers', 'repo_id')),
+        ('commits', ('commits', 'project_id')),
+        ('forks', ('projects', 'forked_from')),
+        ('issues', ('issues', 'repo_id'))
+    ])
+
+    # Tables every metric reads, when one of them gets new rows the metric's results may change
+    METRIC_TABLES = {
+        'stargazers': ('watchers',),
+        'commits': ('commits',),
+        'forks': ('projects',),
+        'issues': ('issues',),
+        'stargazers_many': ('watchers',),
+        'commits_many': ('commits',),
+        'forks_many': ('projects',),
+        'issues_many': ('issues',),
+        'single_table_counts': ('watchers', 'commits', 'projects', 'issues'),
+        'issues_with_close': ('issues', 'issue_events'),
+        'pulls': ('pull_requests', 'pull_request_history', 'pull_request_comments'),
+        'contributors': ('users', 'commits', 'project_commits', 'pull_requests', 'pull_request_history', 'issues',
+                         'commit_comments', 'pull_request_comments', 'issue_comments'),
+        'contributions': ('commits', 'project_commits', 'pull_requests', 'pull_request_history', 'issues',
+                          'commit_comments', 'pull_request_comments', 'issue_comments'),
+        'committer_locations': ('users', 'commits', 'project_commits'),
+        'issue_response_time': ('issues', 'issue_comments', 'commits'),
+        'pull_acceptance_rate': ('pull_requests', 'pull_request_history'),
+        'dist_work': ('commits', 'project_commits', 'projects'),
+        'reopened_issues': ('issues', 'issue_events'),
+        'community_activity': ('commits', 'project_commits'),
+        'contr_bre': ('commits', 'projects', 'users', 'project_members'),
+        'contributor_diversity': ('organization_members', 'users', 'projects', 'pull_requests', 'pull_request_history'),
+        'transparency': ('issue_comments', 'issues', 'projects'),
+        'bus_factor': ('commits',),
+    }
+    # Seconds the table watermarks read from the database are trusted
+    WATERMARK_TTL = 60
+
+    def __init__(self, dbstr, cache=None, replicas=None, analytics=None, analytics_metrics=None, pool=None):
         """
         Connect to GHTorrent
         :param dbstr: The [database string](http://docs.sqlalchemy.org/en/latest/core/engines.html) to connect to the GHTorrent database
+        :param cache: Optional result cache (see ghdata.cache.MetricCache) shared by the metric methods
+        :param replicas: Optional list of database strings of read replicas the metric queries are spread across
+        :param analytics: Optional database string of a replica dedicated to the heaviest metrics
+        :param analytics_metrics: Metrics that run on the analytics replica, ANALYTICS_METRICS by default
+        :param pool: Optional dict of pool settings: pool_size, max_overflow, pool_pre_ping, pool_recycle
         """
         self.DB_STR = dbstr
-        self.db = s.create_engine(dbstr)
-
-    def __single_table_count_by_date(self, table, repo_col='project_id'):
-        """
-        Generates query string to count occurances of rows per date for a given table.
+        if analytics_metrics is None:
+            analytics_metrics = self.ANALYTICS_METRICS
+        self.router = EngineRouter(dbstr, replicas=replicas, analytics=analytics,
+                                   analytics_metrics=analytics_metrics, pool=pool)
+        self.db = self.router.primary
+        self.cache = cache
+        self.rollups = Rollups(self.db)
+        self.__repoids = LookupCache()
+        self.__userids = LookupCache()
+        # table: (mark, when it was read, created_at of its newest row or refresh of its rollup)
+        self.__watermarks = {}
+        self.__watermarks_lock = threading.Lock()
+
+    def __single_table_count_by_date(self, table, repo_col='project_id', start=None, end=None):
+        """
+        Generates the query counting occurances of rows per day for a given table.
         External input must never be sent to this function, it is for internal use only.
-        :param table: The table in GHTorrent to generate the string for
+        :param table: The table in GHTorrent to generate the query for
         :param repo_col: The column in that table with the project ids
-        :return: Query string
-        """
-        return """
-            SELECT date(created_at) AS "date", COUNT(*) AS "{0}"
-            FROM {0}
-            WHERE {1} = :repoid
-            GROUP BY WEEK(created_at)""".format(table, repo_col)
+        :param start: Only count rows created on or after this date
+        :param end: Only count rows created before this date
+        :return: Select with date and count columns, uses the :repoid parameter
+        """
+        table = schema.metadata.tables[table]
+        day = sql.date_of(table.c.created_at)
+        return s.select(day.label('date'), s.func.count().label(table.name)) \
+                .where(table.c[repo_col] == s.bindparam('repoid'), *_in_range(table.c.created_at, start, end)) \
+                .group_by(day).order_by(day)
+
+    def __read_sql(self, metric, query, params=None, chunksize=None, **kwargs):
+        """
+        Runs a metric's query like pd.read_sql, on the database the router picks for it.
+        With a chunksize, rows are streamed from the server and the result is an
+        iterator of DataFrames of at most chunksize rows. When the metric runs on a
+        MetricExecutor the query is cancelled on the server if the metric times out.
+        """
+        engine = self.router.engine(metric)
+        if chunksize is not None:
+            return self.__read_sql_chunks(engine, query, params, chunksize, **kwargs)
+        cancellation = executor.current()
+        if cancellation is None:
+            return pd.read_sql(query, engine, params=params, **kwargs)
+        # Running on a MetricExecutor, let it stop the query when the metric times out
+        with engine.connect() as conn:
+            cancel = cancellation.register(database.canceller(engine, conn))
+            try:
+                return pd.read_sql(query, conn, params=params, **kwargs)
+            finally:
+                cancellation.unregister(cancel)
+
+    def __read_sql_chunks(self, engine, query, params, chunksize, **kwargs):
+        with engine.connect() as conn:
+            # Checked once the chunks are read, on the thread reading them
+            cancellation = executor.current()
+            cancel = None
+            if cancellation is not None:
+                cancel = cancellation.register(database.canceller(engine, conn))
+            try:
+                # Use a server-side cursor so the driver doesn't buffer the whole result
+                conn = conn.execution_options(stream_results=True)
+                for chunk in pd.read_sql(query, conn, params=params, chunksize=chunksize, **kwargs):
+                    yield chunk
+            finally:
+                if cancel is not None:
+                    cancellation.unregister(cancel)
+
+    def __count_by_date(self, metric, table, repo_col, repoid, start=None, end=None):
+        """
+        Counts rows per day for a project, reading from the rollup for the table when it is fresh
+        :param metric: Name of the metric the counts are for
+        :param table: The table in GHTorrent to count
+        :param repo_col: The column in that table with the project ids
+        :param repoid: The id of the project in the projects table
+        :param start: Only count rows created on or after this date
+        :param end: Only count rows created before this date
+        :return: DataFrame with date and the count
+        """
+        counts = self.rollups.counts(table, repoid, start, end)
+        if counts is None:
+            countSQL = self.__single_table_count_by_date(table, repo_col, start, end)
+            counts = self.__read_sql(metric, countSQL, {"repoid": int(repoid)})
+            counts['date'] = pd.to_datetime(counts['date'])
+        return counts
+
+    def __first_dates(self, metric, table, repo_col, repoids):
+        """
+        Finds when every project's rows in a table start, whatever dates a metric was asked for
+        :param metric: Name of the metric the dates are for
+        :param table: The table in GHTorrent to search
+        :param repo_col: The column in that table with the project ids
+        :param repoids: List of ids of projects in the projects table
+        :return: Dict of repoid to the created_at of its first row, projects without rows are left out
+        """
+        table = schema.metadata.tables[table]
+        firstSQL = s.select(table.c[repo_col].label('repoid'), s.func.min(table.c.created_at).label('first')) \
+                    .where(table.c[repo_col].in_(s.bindparam('repoids', expanding=True))) \
+                    .group_by(table.c[repo_col])
+        firsts = {}
+        for chunk in _chunks(sorted(set(int(repoid) for repoid in repoids)), self.MANY_CHUNK_SIZE):
+            rows = self.__read_sql(metric, firstSQL, {"repoids": chunk}, parse_dates=['first'])
+            firsts.update(zip(rows['repoid'].astype(int), rows['first']))
+        return firsts
+
+    def __single_table_count_by_date_many(self, table, repo_col='project_id', start=None, end=None):
+        """
+        Generates the query counting occurances of rows per day and project for a given table.
+        External input must never be sent to this function, it is for internal use only.
+        :param table: The table in GHTorrent to generate the query for
+        :param repo_col: The column in that table with the project ids
+        :param start: Only count rows created on or after this date
+        :param end: Only count rows created before this date
+        :return: Select with repoid, date and count columns, uses the expanding :repoids parameter
+        """
+        table = schema.metadata.tables[table]
+        day = sql.date_of(table.c.created_at)
+        return s.select(table.c[repo_col].label('repoid'), day.label('date'), s.func.count().label(table.name)) \
+                .where(table.c[repo_col].in_(s.bindparam('repoids', expanding=True)), *_in_range(table.c.created_at, start, end)) \
+                .group_by(table.c[repo_col], day)
+
+    def __count_by_date_many(self, metric, table, repo_col, repoids, start=None, end=None):
+        """
+        Runs the many-project count query in chunks of MANY_CHUNK_SIZE projects
+        :return: DataFrame with repoid, date and the count, sorted by repoid and date
+        """
+        countSQL = self.__single_table_count_by_date_many(table, repo_col, start, end)
+        repoids = sorted(set(int(repoid) for repoid in repoids))
+        frames = [self.__read_sql(metric, countSQL, {"repoids": chunk})
+                  for chunk in _chunks(repoids, self.MANY_CHUNK_SIZE)]
+        if not frames:
+            return pd.DataFrame(columns=['repoid', 'date', table])
+        counts = pd.concat(frames, ignore_index=True)
+        counts['date'] = pd.to_datetime(counts['date'])
+        return counts.sort_values(['repoid', 'date']).reset_index(drop=True)
+
+    def watermark(self, metrics):
+        """
+        Marks how far the tables some metrics read have been loaded: the highest id of every table,
+        or the newest created_at of tables without one, with the time its rollup was last refreshed.
+        When a mark moves, the cached results of the metrics reading that table are dropped.
+        :param metrics: Names of metric methods
+        :return: (sorted list of (table, mark) pairs, datetime in UTC of the newest row or rollup refresh
+                  among the tables, None if none of them has dates), None if the tables of a metric aren't known
+        """
+        tables = set()
+        for metric in metrics:
+            if metric not in self.METRIC_TABLES:
+                return None
+            tables.update(self.METRIC_TABLES[metric])
+        now = time.time()
+        with self.__watermarks_lock:
+            stale = [table for table in tables
+                     if table not in self.__watermarks or self.__watermarks[table][1] + self.WATERMARK_TTL < now]
+        if stale:
+            self.__read_watermarks(sorted(stale), now)
+        with self.__watermarks_lock:
+            marks = [(table, self.__watermarks[table][0]) for table in sorted(tables)]
+            dates = [self.__watermarks[table][2] for table in tables if self.__watermarks[table][2] is not None]
+        # Taken from the data, every process and restart gives the same date
+        modified = max(dates).replace(microsecond=0, tzinfo=datetime.timezone.utc) if dates else None
+        return marks, modified
+
+    def __read_watermarks(self, tables, now):
+        """
+        Reads the marks of many tables, and the created_at of their newest row, with a single query
+        """
+        marks = []
+        for table in tables:
+            table = schema.metadata.tables[table]
+            key = list(table.primary_key.columns)
+            if len(key) == 1:
+                column = key[0]
+            elif 'created_at' in table.c:
+                column = table.c.created_at
+            else:
+                # Link tables like project_commits, the last part of their key grows with the rows added
+                column = key[-1]
+            marks.append(s.select(s.func.max(column)).scalar_subquery().label(table.name))
+            if 'created_at' not in table.c:
+                newest = s.null()
+            elif column is table.c.created_at:
+                newest = s.select(s.func.max(column)).scalar_subquery()
+            else:
+                # The row with the highest id, found through the primary key instead of scanning created_at
+                newest = s.select(table.c.created_at).where(column == s.select(s.func.max(column)).scalar_subquery()) \
+                          .limit(1).scalar_subquery()
+            marks.append(newest.label(table.name + '_created_at'))
+        with self.router.engine('watermark').connect() as conn:
+            row = conn.execute(s.select(*marks)).fetchone()
+        refreshed = self.rollups.state()
+        moved = set()
+        with self.__watermarks_lock:
+            for i, table in enumerate(tables):
+                mark = (str(row[2 * i]), str(refreshed.get(table)))
+                dates = [pd.Timestamp(date).to_pydatetime() for date in (row[2 * i + 1], refreshed.get(table))
+                         if date is not None]
+                previous = self.__watermarks.get(table)
+                if previous is not None and previous[0] != mark:
+                    moved.add(table)
+                self.__watermarks[table] = (mark, now, max(dates) if dates else None)
+        if moved and self.cache is not None:
+            for metric, metric_tables in self.METRIC_TABLES.items():
+                if moved.intersection(metric_tables):
+                    self.cache.invalidate(metric=metric)
 
     def repoid(self, owner, repo):
         """
@@ -39,362 +322,585 @@ class GHTorrent(object):
         :param repo: The name of the repository
         :return: The repository's ID as it appears in the GHTorrent projects table
         """
-        reposql = s.sql.text(
-            'SELECT projects.id FROM projects INNER JOIN users ON projects.owner_id = users.id WHERE projects.name = :repo AND users.login = :owner')
-        repoid = 0
-        result = self.db.execute(reposql, repo=repo, owner=owner)
-        for row in result:
-            repoid = row[0]
+        repoid = self.__repoids.get((owner.lower(), repo.lower()))
+        if repoid is MISSING:
+            repoid = self.repoids([(owner, repo)])[(owner, repo)]
         return repoid
 
+    def repoids(self, repos):
+        """
+        Resolves many repositories at once, using as few queries as possible
+        :param repos: List of (owner, repo) pairs
+        :return: Dict of (owner, repo) to the repository's ID, 0 for repositories that don't exist
+        """
+        users, projects = schema.users, schema.projects
+        # Matched as (login, name) pairs, separate lists of owners and names would also match every
+        # owner's repositories that share a name with another requested repository
+        reposql = s.select(users.c.login, projects.c.name, projects.c.id) \
+                   .select_from(projects.join(users, projects.c.owner_id == users.c.id)) \
+                   .where(s.tuple_(users.c.login, projects.c.name).in_(s.bindparam('repos', expanding=True)))
+        result = {}
+        unresolved = []
+        for owner, repo in repos:
+            repoid = self.__repoids.get((owner.lower(), repo.lower()))
+            if repoid is MISSING:
+                unresolved.append((owner, repo))
+            else:
+                result[(owner, repo)] = repoid
+        for chunk in _chunks(unresolved, self.RESOLVE_CHUNK_SIZE):
+            found = {}
+            with self.router.engine().connect() as conn:
+                rows = conn.execute(reposql, {'repos': sorted(set(chunk))})
+                for login, name, repoid in rows:
+                    found[(login.lower(), name.lower())] = repoid
+            for owner, repo in chunk:
+                key = (owner.lower(), repo.lower())
+                result[(owner, repo)] = found.get(key, 0)
+                self.__repoids.set(key, result[(owner, repo)])
+        return result
+
     def userid(self, username):
         """
         Returns the userid given a username
         :param username: GitHub username to be matched against the login table in GHTorrent
         :return: The id from the users table in GHTorrent
         """
-        reposql = s.sql.text('SELECT users.id FROM users WHERE users.login = :username')
-        userid = 0
-        result = self.db.execute(reposql, username=username)
-        for row in result:
-            userid = row[0]
+        userid = self.__userids.get(username.lower())
+        if userid is MISSING:
+            userid = self.userids([username])[username]
         return userid
 
+    def userids(self, usernames):
+        """
+        Resolves many usernames at once, using as few queries as possible
+        :param usernames: List of GitHub usernames
+        :return: Dict of username to the id from the users table, 0 for users that don't exist
+        """
+        usersql = s.sql.text("""
+            SELECT users.login, users.id FROM users WHERE users.login IN :usernames
+        """).bindparams(s.bindparam('usernames', expanding=True))
+        result = {}
+        unresolved = []
+        for username in usernames:
+            userid = self.__userids.get(username.lower())
+            if userid is MISSING:
+                unresolved.append(username)
+            else:
+                result[username] = userid
+        for chunk in _chunks(unresolved, self.RESOLVE_CHUNK_SIZE):
+            found = {}
+            with self.router.engine().connect() as conn:
+                for login, userid in conn.execute(usersql, {'usernames': list(set(chunk))}):
+                    found[login.lower()] = userid
+            for username in chunk:
+                result[username] = found.get(username.lower(), 0)
+                self.__userids.set(username.lower(), result[username])
+        return result
+
     # Basic timeseries queries
-    def stargazers(self, repoid, start=None, end=None):
+    @cached(resample=timeseries.resample)
+    def stargazers(self, repoid, start=None, end=None, interval='week'):
         """
         Timeseries of when people starred a repo
         :param repoid: The id of the project in the projects table. Use repoid() to get this.
-        :return: DataFrame with stargazers/day
+        :param start: Only include activity on or after this date
+        :param end: Only include activity before this date
+        :param interval: Length of the periods counted: day, week, month, quarter or year
+        :return: DataFrame with date and stargazers per interval
         """
-        stargazersSQL = s.sql.text(self.__single_table_count_by_date('watchers', 'repo_id'))
-        return pd.read_sql(stargazersSQL, self.db, params={"repoid": str(repoid)})
+        return self.__count_by_date('stargazers', 'watchers', 'repo_id', repoid, start, end)
 
-    def commits(self, repoid):
+    @cached(resample=timeseries.resample)
+    def commits(self, repoid, start=None, end=None, interval='week'):
         """
         Timeseries of all the commits on a repo
         :param repoid: The id of the project in the projects table. Use repoid() to get this.
-        :return: DataFrame with commits/day
+        :param start: Only include activity on or after this date
+        :param end: Only include activity before this date
+        :param interval: Length of the periods counted: day, week, month, quarter or year
+        :return: DataFrame with date and commits per interval
         """
-        commitsSQL = s.sql.text(self.__single_table_count_by_date('commits'))
-        return pd.read_sql(commitsSQL, self.db, params={"repoid": str(repoid)})
+        return self.__count_by_date('commits', 'commits', 'project_id', repoid, start, end)
 
-    def forks(self, repoid):
+    @cached(resample=timeseries.resample)
+    def forks(self, repoid, start=None, end=None, interval='week'):
         """
         Timeseries of when a repo's forks were created
         :param repoid: The id of the project in the projects table. Use repoid() to get this.
-        :return: DataFrame with forks/day
-        """
-        forksSQL = s.sql.text(self.__single_table_count_by_date('projects', 'forked_from'))
-        return pd.read_sql(forksSQL, self.db, params={"repoid": str(repoid)}).drop(0)
-
-    def issues(self, repoid):
-        """
-        Timeseries of when people starred a repo
+        :param start: Only include activity on or after this date
+        :param end: Only include activity before this date
+        :param interval: Length of the periods counted: day, week, month, quarter or year
+        :return: DataFrame with date and forks per interval
+        """
+        forks = self.__count_by_date('forks', 'projects', 'forked_from', repoid, start, end)
+        # The weekly series this metric started from left out the project's first week of forks, the daily one
+        # does the same. After a start date that week may not be in the series, it is found without one.
+        first = None
+        if start is not None:
+            first = self.__first_dates('forks', 'projects', 'forked_from', [repoid]).get(int(repoid))
+        return timeseries.drop_first_interval(forks, firsts=first)
+
+    @cached(resample=timeseries.resample)
+    def issues(self, repoid, start=None, end=None, interval='week'):
+        """
+        Timeseries of when issues were opened on a repo
         :param repoid: The id of the project in the projects table. Use repoid() to get this.
-        :return: DataFrame with issues/day
-        """
-        issuesSQL = s.sql.text(self.__single_table_count_by_date('issues', 'repo_id'))
-        return pd.read_sql(issuesSQL, self.db, params={"repoid": str(repoid)})
-
-    def issues_with_close(self, repoid):
-        """
-        How long on average each week it takes to close an issue
+        :param start: Only include activity on or after this date
+        :param end: Only include activity before this date
+        :param interval: Length of the periods counted: day, week, month, quarter or year
+        :return: DataFrame with date and issues per interval
+        """
+        return self.__count_by_date('issues', 'issues', 'repo_id', repoid, start, end)
+
+    # Timeseries for many projects at once
+    @cached(resample=functools.partial(timeseries.resample, by=['repoid']))
+    def stargazers_many(self, repoids, start=None, end=None, interval='week'):
+        """
+        Timeseries of when people starred each of many repos
+        :param repoids: List of ids of projects in the projects table. Use repoids() to get these.
+        :param start: Only include activity on or after this date
+        :param end: Only include activity before this date
+        :param interval: Length of the periods counted: day, week, month, quarter or year
+        :return: DataFrame with repoid, date and stargazers per interval for every project
+        """
+        return self.__count_by_date_many('stargazers_many', 'watchers', 'repo_id', repoids, start, end)
+
+    @cached(resample=functools.partial(timeseries.resample, by=['repoid']))
+    def commits_many(self, repoids, start=None, end=None, interval='week'):
+        """
+        Timeseries of all the commits on each of many repos
+        :param repoids: List of ids of projects in the projects table. Use repoids() to get these.
+        :param start: Only include activity on or after this date
+        :param end: Only include activity before this date
+        :param interval: Length of the periods counted: day, week, month, quarter or year
+        :return: DataFrame with repoid, date and commits per interval for every project
+        """
+        return self.__count_by_date_many('commits_many', 'commits', 'project_id', repoids, start, end)
+
+    @cached(resample=functools.partial(timeseries.resample, by=['repoid']))
+    def forks_many(self, repoids, start=None, end=None, interval='week'):
+        """
+        Timeseries of when each of many repos' forks were created
+        :param repoids: List of ids of projects in the projects table. Use repoids() to get these.
+        :param start: Only include activity on or after this date
+        :param end: Only include activity before this date
+        :param interval: Length of the periods counted: day, week, month, quarter or year
+        :return: DataFrame with repoid, date and forks per interval for every project
+        """
+        forks = self.__count_by_date_many('forks_many', 'projects', 'forked_from', repoids, start, end)
+        # Like forks(), leave out the first week of forks of every project
+        firsts = None
+        if start is not None:
+            firsts = self.__first_dates('forks_many', 'projects', 'forked_from', repoids)
+        return timeseries.drop_first_interval(forks, by=['repoid'], firsts=firsts)
+
+    @cached(resample=functools.partial(timeseries.resample, by=['repoid']))
+    def issues_many(self, repoids, start=None, end=None, interval='week'):
+        """
+        Timeseries of when issues were opened on each of many repos
+        :param repoids: List of ids of projects in the projects table. Use repoids() to get these.
+        :param start: Only include activity on or after this date
+        :param end: Only include activity before this date
+        :param interval: Length of the periods counted: day, week, month, quarter or year
+        :return: DataFrame with repoid, date and issues per interval for every project
+        """
+        return self.__count_by_date_many('issues_many', 'issues', 'repo_id', repoids, start, end)
+
+    def single_table_counts(self, repoids, start=None, end=None, interval='week', metrics=None):
+        """
+        Runs several of the single-table timeseries for many projects with one UNION ALL query,
+        tagged by metric, instead of one query per metric. The daily series of every project are
+        stored in the cache, so the metrics' own calls with the same dates are cache hits afterwards.
+        :param repoids: List of ids of projects in the projects table. Use repoids() to get these.
+        :param start: Only include activity on or after this date
+        :param end: Only include activity before this date
+        :param interval: Length of the periods counted: day, week, month, quarter or year
+        :param metrics: Names of metrics in SINGLE_TABLE_COUNTS, all of them by default
+        :return: Dict of metric to a DataFrame with repoid, date and the count, like the *_many metrics
+        """
+        metrics = list(metrics or self.SINGLE_TABLE_COUNTS)
+        repoids = sorted(set(int(repoid) for repoid in repoids))
+        parts = []
+        metric = 'single_table_counts'
+        for name in metrics:
+            table, repo_col = self.SINGLE_TABLE_COUNTS[name]
+            countSQL = self.rollups.select(table, start, end)
+            if countSQL is None:
+                countSQL = self.__single_table_count_by_date_many(table, repo_col, start, end)
+            else:
+                # The rollups live on the primary
+                metric = None
+            parts.append(countSQL.add_columns(s.literal(name).label('metric')))
+        countSQL = s.union_all(*parts)
+        if metric is None:
+            frames = [pd.read_sql(countSQL, self.db, params={"repoids": chunk})
+                      for chunk in _chunks(repoids, self.MANY_CHUNK_SIZE)]
+        else:
+            frames = [self.__read_sql(metric, countSQL, {"repoids": chunk})
+                      for chunk in _chunks(repoids, self.MANY_CHUNK_SIZE)]
+        if frames:
+            counts = pd.concat(frames, ignore_index=True)
+            # Columns of a union are named after its first query, whichever that was
+            counts.columns = ['repoid', 'date', 'count', 'metric']
+        else:
+            counts = pd.DataFrame(columns=['repoid', 'date', 'count', 'metric'])
+        counts['date'] = pd.to_datetime(counts['date'])
+
+        result = {}
+        for name in metrics:
+            table = self.SINGLE_TABLE_COUNTS[name][0]
+            daily = counts[counts['metric'] == name].drop(columns='metric').rename(columns={'count': table})
+            daily = daily.sort_values(['repoid', 'date']).reset_index(drop=True)
+            if name == 'forks':
+                # Like forks(), leave out the first week of forks of every project
+                firsts = None
+                if start is not None:
+                    firsts = self.__first_dates('forks', 'projects', 'forked_from', repoids)
+                daily = timeseries.drop_first_interval(daily, by=['repoid'], firsts=firsts)
+            for repoid in repoids:
+                series = daily[daily['repoid'] == repoid].drop(columns='repoid').reset_index(drop=True)
+                prime(self, name, series, repoid, start, end)
+            result[name] = timeseries.resample(daily, interval, by=['repoid'])
+        return result
+
+    @cached()
+    def issues_with_close(self, repoid, start=None, end=None, chunksize=None, summary=None):
+        """
+        How long it took to close each of a repo's closed issues
         :param repoid: The id of the project in the projects table. Use repoid() to get this.
-        :return: DataFrame with issues/day
-        """
-        issuesSQL = s.sql.text("""
-            SELECT issues.id as "id",
-                   issues.created_at as "date",
-                   DATEDIFF(closed.created_at, issues.created_at)  AS "days_to_close"
-            FROM issues
-           JOIN
-                (SELECT * FROM issue_events
-                 WHERE issue_events.action = "closed") closed
-            ON issues.id = closed.issue_id
-            WHERE issues.repo_id = :repoid""")
-        return pd.read_sql(issuesSQL, self.db, params={"repoid": str(repoid)})
-
-    def pulls(self, repoid):
+        :param start: Only include activity on or after this date
+        :param end: Only include activity before this date
+        :param chunksize: Stream the result as an iterator of DataFrames with this many rows
+        :param summary: 'weekly' to return the distribution of the days to close per week instead
+        :return: DataFrame with id, date and days_to_close for every closed issue
+        """
+        issues, issue_events = schema.issues, schema.issue_events
+        closed = s.select(issue_events.c.issue_id, issue_events.c.created_at) \
+                  .where(issue_events.c.action == 'closed').subquery('closed')
+        issuesSQL = s.select(issues.c.id.label('id'),
+                             issues.c.created_at.label('date'),
+                             sql.days_between(closed.c.created_at, issues.c.created_at).label('days_to_close')) \
+                     .select_from(issues.join(closed, issues.c.id == closed.c.issue_id)) \
+                     .where(issues.c.repo_id == s.bindparam('repoid'), *_in_range(issues.c.created_at, start, end))
+        if summary is not None:
+            closed = self.__read_sql('issues_with_close', issuesSQL, {"repoid": int(repoid)})
+            return timeseries.summarize(closed['date'], closed['days_to_close'], summary)
+        return self.__read_sql('issues_with_close', issuesSQL, {"repoid": int(repoid)}, chunksize)
+
+    @cached(resample=timeseries.resample)
+    def pulls(self, repoid, start=None, end=None, interval='week'):
         """
         Timeseries of pull requests creation, also gives their associated activity
         :param repoid: The id of the project in the projects table. Use repoid() to get this.
-        :return: DataFrame with pull requests by day
-        """
-        pullsSQL = s.sql.text("""
-            SELECT date(pull_request_history.created_at) AS "date",
-            (COUNT(pull_requests.id)) AS "pull_requests",
-            (SELECT COUNT(*) FROM pull_request_comments
-            WHERE pull_request_comments.pull_request_id = pull_request_history.pull_request_id) AS "comments"
-            FROM pull_request_history
-            INNER JOIN pull_requests
-            ON pull_request_history.pull_request_id = pull_requests.id
-            WHERE pull_requests.head_repo_id = :repoid
-            AND pull_request_history.action = "merged"
-            GROUP BY WEEK(pull_request_history.created_at)
-        """)
-        return pd.read_sql(pullsSQL, self.db, params={"repoid": str(repoid)})
-
-    def contributors(self, repoid):
+        :param start: Only include activity on or after this date
+        :param end: Only include activity before this date
+        :param interval: Length of the periods counted: day, week, month, quarter or year
+        :return: DataFrame with pull requests per interval
+        """
+        pull_requests, history, comments = schema.pull_requests, schema.pull_request_history, schema.pull_request_comments
+        repoid_param = s.bindparam('repoid')
+        pull_comments = _counts('pull_comments', comments.c.pull_request_id,
+                                comments.join(pull_requests, comments.c.pull_request_id == pull_requests.c.id),
+                                pull_requests.c.head_repo_id == repoid_param)
+        day = sql.date_of(history.c.created_at)
+        pullsSQL = s.select(day.label('date'),
+                            s.func.count(pull_requests.c.id).label('pull_requests'),
+                            s.func.coalesce(s.func.sum(pull_comments.c.count), 0).label('comments')) \
+                    .select_from(history.join(pull_requests, history.c.pull_request_id == pull_requests.c.id)
+                                        .outerjoin(pull_comments, pull_comments.c.key == history.c.pull_request_id)) \
+                    .where(pull_requests.c.head_repo_id == repoid_param, history.c.action == 'merged',
+                           *_in_range(history.c.created_at, start, end)) \
+                    .group_by(day).order_by(day)
+        return self.__read_sql('pulls', pullsSQL, {"repoid": int(repoid)})
+
+    @cached(ttl=3600)
+    def contributors(self, repoid, chunksize=None):
         """
         All the contributors to a project and the counts of their contributions
         :param repoid: The id of the project in the projects table. Use repoid() to get this.
+        :param chunksize: Stream the result as an iterator of DataFrames with this many rows
         :return: DataFrame with users id, users login, and their contributions by type
         """
-        contributorsSQL = s.sql.text("""
-            SELECT * FROM
-               (
-               SELECT   users.id        as "user_id",
-                        users.login     as "login",
-                        users.location  as "location",
-                        com.count       as "commits",
-                        pulls.count     as "pull_requests",
-                        iss.count       as "issues",
-                        comcoms.count   as "commit_comments",
-                        pullscoms.count as "pull_request_comments",
-                        isscoms.count   as "issue_comments",
-                        com.count + pulls.count + iss.count + comcoms.count + pullscoms.count + isscoms.count as "total"
-               FROM users
-               LEFT JOIN (SELECT committer_id AS id, COUNT(*) AS count FROM commits INNER JOIN project_commits ON project_commits.commit_id = commits.id WHERE project_commits.project_id = :repoid GROUP BY commits.committer_id) AS com
-               ON com.id = users.id
-               LEFT JOIN (SELECT pull_request_history.actor_id AS id, COUNT(*) AS count FROM pull_request_history JOIN pull_requests ON pull_requests.id = pull_request_history.pull_request_id WHERE pull_requests.base_repo_id = :repoid AND pull_request_history.action = 'merged' GROUP BY pull_request_history.actor_id) AS pulls
-               ON pulls.id = users.id
-               LEFT JOIN (SELECT reporter_id AS id, COUNT(*) AS count FROM issues WHERE issues.repo_id = :repoid GROUP BY issues.reporter_id) AS iss
-               ON iss.id = users.id
-               LEFT JOIN (SELECT commit_comments.user_id AS id, COUNT(*) AS count FROM commit_comments JOIN project_commits ON project_commits.commit_id = commit_comments.commit_id WHERE project_commits.project_id = :repoid GROUP BY commit_comments.user_id) AS comcoms
-               ON comcoms.id = users.id
-               LEFT JOIN (SELECT pull_request_comments.user_id AS id, COUNT(*) AS count FROM pull_request_comments JOIN pull_requests ON pull_request_comments.pull_request_id = pull_requests.id WHERE pull_requests.base_repo_id = :repoid GROUP BY pull_request_comments.user_id) AS pullscoms
-               ON pullscoms.id = users.id
-               LEFT JOIN (SELECT issue_comments.user_id AS id, COUNT(*) AS count FROM issue_comments JOIN issues ON issue_comments.issue_id = issues.id WHERE issues.repo_id = :repoid GROUP BY issue_comments.user_id) AS isscoms
-               ON isscoms.id = users.id
-               GROUP BY users.id
-               ORDER BY com.count DESC
-               ) user_activity
-            WHERE commits IS NOT NULL
-            OR    pull_requests IS NOT NULL
-            OR    issues IS NOT NULL
-            OR    commit_comments IS NOT NULL
-            OR    pull_request_comments IS NOT NULL
-            OR    issue_comments IS NOT NULL;
-        """)
-        return pd.read_sql(contributorsSQL, self.db, index_col=['user_id'], params={"repoid": str(repoid)})
-
-    def contributions(self, repoid, userid=None):
+        users, commits, project_commits = schema.users, schema.commits, schema.project_commits
+        pull_requests, history, issues = schema.pull_requests, schema.pull_request_history, schema.issues
+        repoid_param = s.bindparam('repoid')
+        kinds = [
+            ('commits', _counts('com', commits.c.committer_id,
+                                commits.join(project_commits, project_commits.c.commit_id == commits.c.id),
+                                project_commits.c.project_id == repoid_param)),
+            ('pull_requests', _counts('pulls', history.c.actor_id,
+                                      history.join(pull_requests, pull_requests.c.id == history.c.pull_request_id),
+                                      pull_requests.c.base_repo_id == repoid_param, history.c.action == 'merged')),
+            ('issues', _counts('iss', issues.c.reporter_id, issues, issues.c.repo_id == repoid_param)),
+            ('commit_comments', _counts('comcoms', schema.commit_comments.c.user_id,
+                                        schema.commit_comments.join(project_commits, project_commits.c.commit_id == schema.commit_comments.c.commit_id),
+                                        project_commits.c.project_id == repoid_param)),
+            ('pull_request_comments', _counts('pullscoms', schema.pull_request_comments.c.user_id,
+                                              schema.pull_request_comments.join(pull_requests, schema.pull_request_comments.c.pull_request_id == pull_requests.c.id),
+                                              pull_requests.c.base_repo_id == repoid_param)),
+            ('issue_comments', _counts('isscoms', schema.issue_comments.c.user_id,
+                                       schema.issue_comments.join(issues, schema.issue_comments.c.issue_id == issues.c.id),
+                                       issues.c.repo_id == repoid_param))
+        ]
+        source = users
+        for kind, counts in kinds:
+            source = source.outerjoin(counts, counts.c.key == users.c.id)
+        counts = [counts.c.count for kind, counts in kinds]
+        contributorsSQL = s.select(users.c.id.label('user_id'), users.c.login.label('login'), users.c.location.label('location'),
+                                   *[count.label(kind) for count, (kind, subquery) in zip(counts, kinds)] +
+                                   [functools.reduce(lambda total, count: total + count, counts).label('total')]) \
+                           .select_from(source) \
+                           .where(s.or_(*[count.isnot(None) for count in counts])) \
+                           .order_by(counts[0].is_(None), counts[0].desc())
+        return self.__read_sql('contributors', contributorsSQL, {"repoid": int(repoid)}, chunksize, index_col=['user_id'])
+
+    @cached(ttl=3600, resample=functools.partial(timeseries.resample, total='total'))
+    def contributions(self, repoid, userid=None, start=None, end=None, interval='day'):
         """
         Timeseries of all the contributions to a project, optionally limited to a specific user
         :param repoid: The id of the project in the projects table.
         :param userid: The id of user if you want to limit the contributions to a specific user.
-        :return: DataFrame with all of the contributions seperated by day.
-        """
-        rawContributionsSQL = """
-            SELECT  DATE(coms.created_at) as "date",
-                    coms.count            as "commits",
-                    pulls.count           as "pull_requests",
-                    iss.count             as "issues",
-                    comcoms.count         as "commit_comments",
-                    pullscoms.count       as "pull_request_comments",
-                    isscoms.count         as "issue_comments",
-                    coms.count + pulls.count + iss.count + comcoms.count + pullscoms.count + isscoms.count as "total"
-            FROM (SELECT created_at AS created_at, COUNT(*) AS count FROM commits INNER JOIN project_commits ON project_commits.commit_id = commits.id WHERE project_commits.project_id = :repoid[[ AND commits.author_id = :userid]] GROUP BY DATE(created_at)) coms
-            LEFT JOIN (SELECT pull_request_history.created_at AS created_at, COUNT(*) AS count FROM pull_request_history JOIN pull_requests ON pull_requests.id = pull_request_history.pull_request_id WHERE pull_requests.base_repo_id = :repoid AND pull_request_history.action = 'merged'[[ AND pull_request_history.actor_id = :userid]] GROUP BY DATE(created_at)) AS pulls
-            ON DATE(pulls.created_at) = DATE(coms.created_at)
-            LEFT JOIN (SELECT issues.created_at AS created_at, COUNT(*) AS count FROM issues WHERE issues.repo_id = :repoid[[ AND issues.reporter_id = :userid]] GROUP BY DATE(created_at)) AS iss
-            ON DATE(iss.created_at) = DATE(coms.created_at)
-            LEFT JOIN (SELECT commit_comments.created_at AS created_at, COUNT(*) AS count FROM commit_comments JOIN project_commits ON project_commits.commit_id = commit_comments.commit_id WHERE project_commits.project_id = :repoid[[ AND commit_comments.user_id = :userid]] GROUP BY DATE(commit_comments.created_at)) AS comcoms
-            ON DATE(comcoms.created_at) = DATE(coms.created_at)
-            LEFT JOIN (SELECT pull_request_comments.created_at AS created_at, COUNT(*) AS count FROM pull_request_comments JOIN pull_requests ON pull_request_comments.pull_request_id = pull_requests.id WHERE pull_requests.base_repo_id = :repoid[[ AND pull_request_comments.user_id = :userid]] GROUP BY DATE(pull_request_comments.created_at)) AS pullscoms
-            ON DATE(pullscoms.created_at) = DATE(coms.created_at)
-            LEFT JOIN (SELECT issue_comments.created_at AS created_at, COUNT(*) AS count FROM issue_comments JOIN issues ON issue_comments.issue_id = issues.id WHERE issues.repo_id = :repoid[[ AND issue_comments.user_id = :userid]] GROUP BY DATE(issue_comments.created_at)) AS isscoms
-            ON DATE(isscoms.created_at) = DATE(coms.created_at)
-            ORDER BY DATE(coms.created_at)
-        """
-
-        if (userid is not None and len(userid) > 0):
-            rawContributionsSQL = rawContributionsSQL.replace('[[', '')
-            rawContributionsSQL = rawContributionsSQL.replace(']]', '')
-            parameterized = s.sql.text(rawContributionsSQL)
-            return pd.read_sql(parameterized, self.db, params={"repoid": str(repoid), "userid": str(userid)})
-        else:
-            rawContributionsSQL = re.sub(r'\[\[.+?\]\]', '', rawContributionsSQL)
-            parameterized = s.sql.text(rawContributionsSQL)
-            return pd.read_sql(parameterized, self.db, params={"repoid": str(repoid)})
-
-    def committer_locations(self, repoid):
+        :param start: Only include activity on or after this date
+        :param end: Only include activity before this date
+        :param interval: Length of the periods counted: day, week, month, quarter or year
+        :return: DataFrame with all of the contributions per interval
+        """
+        commits, project_commits = schema.commits, schema.project_commits
+        pull_requests, history, issues = schema.pull_requests, schema.pull_request_history, schema.issues
+        repoid_param = s.bindparam('repoid')
+        params = {"repoid": int(repoid)}
+        by_user = userid is not None
+        if by_user:
+            params["userid"] = int(userid)
+
+        def daily(name, created_at, user_col, source, *conditions):
+            conditions = list(conditions) + _in_range(created_at, start, end)
+            if by_user:
+                conditions.append(user_col == s.bindparam('userid'))
+            return _counts(name, sql.date_of(created_at), source, *conditions)
+
+        kinds = [
+            ('commits', daily('coms', commits.c.created_at, commits.c.author_id,
+                              commits.join(project_commits, project_commits.c.commit_id == commits.c.id),
+                              project_commits.c.project_id == repoid_param)),
+            ('pull_requests', daily('pulls', history.c.created_at, history.c.actor_id,
+                                    history.join(pull_requests, pull_requests.c.id == history.c.pull_request_id),
+                                    pull_requests.c.base_repo_id == repoid_param, history.c.action == 'merged')),
+            ('issues', daily('iss', issues.c.created_at, issues.c.reporter_id, issues, issues.c.repo_id == repoid_param)),
+            ('commit_comments', daily('comcoms', schema.commit_comments.c.created_at, schema.commit_comments.c.user_id,
+                                      schema.commit_comments.join(project_commits, project_commits.c.commit_id == schema.commit_comments.c.commit_id),
+                                      project_commits.c.project_id == repoid_param)),
+            ('pull_request_comments', daily('pullscoms', schema.pull_request_comments.c.created_at, schema.pull_request_comments.c.user_id,
+                                            schema.pull_request_comments.join(pull_requests, schema.pull_request_comments.c.pull_request_id == pull_requests.c.id),
+                                            pull_requests.c.base_repo_id == repoid_param)),
+            ('issue_comments', daily('isscoms', schema.issue_comments.c.created_at, schema.issue_comments.c.user_id,
+                                     schema.issue_comments.join(issues, schema.issue_comments.c.issue_id == issues.c.id),
+                                     issues.c.repo_id == repoid_param))
+        ]
+        # Days are those with commits, the other kinds are joined onto them
+        coms = kinds[0][1]
+        source = coms
+        for kind, counts in kinds[1:]:
+            source = source.outerjoin(counts, counts.c.key == coms.c.key)
+        counts = [counts.c.count for kind, counts in kinds]
+        contributionsSQL = s.select(coms.c.key.label('date'),
+                                    *[count.label(kind) for count, (kind, subquery) in zip(counts, kinds)] +
+                                    [functools.reduce(lambda total, count: total + count, counts).label('total')]) \
+                            .select_from(source) \
+                            .order_by(coms.c.key)
+        return self.__read_sql('contributions', contributionsSQL, params)
+
+    @cached(ttl=3600)
+    def committer_locations(self, repoid, chunksize=None):
         """
         Return committers and their locations
         @todo: Group by country code instead of users, needs the new schema
         :param repoid: The id of the project in the projects table.
+        :param chunksize: Stream the result as an iterator of DataFrames with this many rows
         :return: DataFrame with users and locations sorted by commtis
         """
-        rawContributionsSQL = s.sql.text("""
-            SELECT users.login, users.location, COUNT(*) AS "commits"
-            FROM commits
-            JOIN project_commits
-            ON commits.id = project_commits.commit_id
-            JOIN users
-            ON users.id = commits.author_id
-            WHERE project_commits.project_id = :repoid
-            AND LENGTH(users.location) > 1
-            GROUP BY users.id
-            ORDER BY commits DESC
-        """)
-        return pd.read_sql(rawContributionsSQL, self.db, params={"repoid": str(repoid)})
-
-    def issue_response_time(self, repoid):
+        users, commits, project_commits = schema.users, schema.commits, schema.project_commits
+        locationsSQL = s.select(users.c.login, users.c.location, s.func.count().label('commits')) \
+                        .select_from(commits.join(project_commits, commits.c.id == project_commits.c.commit_id)
+                                            .join(users, users.c.id == commits.c.author_id)) \
+                        .where(project_commits.c.project_id == s.bindparam('repoid'), s.func.length(users.c.location) > 1) \
+                        .group_by(users.c.id, users.c.login, users.c.location) \
+                        .order_by(s.desc('commits'))
+        return self.__read_sql('committer_locations', locationsSQL, {"repoid": int(repoid)}, chunksize)
+
+    @cached()
+    def issue_response_time(self, repoid, start=None, end=None, chunksize=None, summary=None):
         """
         How long it takes for issues to be responded to by people who have commits associate with the project
         :param repoid: The id of the project in the projects table.
+        :param start: Only include activity on or after this date
+        :param end: Only include activity before this date
+        :param chunksize: Stream the comments this many rows at a time, the result is an iterator of
+                          DataFrames with the responses found in each chunk
+        :param summary: 'weekly' to return the distribution of the days to the first response per week instead
         :return: DataFrame with the issues' id the date it was
                  opened, and the date it was first responded to
         """
-        issuesSQL = s.sql.text("""
-            SELECT issues.created_at               AS "created_at",
-                   MIN(issue_comments.created_at)  AS "responded_at"
-            FROM issues
-            JOIN issue_comments
-            ON issue_comments.issue_id = issues.id
-            WHERE issue_comments.user_id IN
-                (SELECT users.id
-                FROM users
-                JOIN commits
-                WHERE commits.author_id = users.id
-                AND commits.project_id = :repoid)
-            AND issues.repo_id = :repoid
-            GROUP BY issues.id
-        """)
-        return pd.read_sql(issuesSQL, self.db, params={"repoid": str(repoid)})
-
-    def pull_acceptance_rate(self, repoid):
+        issues, issue_comments, commits = schema.issues, schema.issue_comments, schema.commits
+        repoid_param = s.bindparam('repoid')
+        params = {"repoid": int(repoid)}
+        # Three narrow reads instead of filtering every comment through a subquery on commits
+        committersSQL = s.select(commits.c.author_id).distinct().where(commits.c.project_id == repoid_param)
+        issuesSQL = s.select(issues.c.id, issues.c.created_at) \
+                     .where(issues.c.repo_id == repoid_param, *_in_range(issues.c.created_at, start, end))
+        commentsSQL = s.select(issue_comments.c.issue_id, issue_comments.c.user_id, issue_comments.c.created_at) \
+                       .select_from(issue_comments.join(issues, issue_comments.c.issue_id == issues.c.id)) \
+                       .where(issues.c.repo_id == repoid_param, *_in_range(issues.c.created_at, start, end))
+        committers = self.__read_sql('issue_response_time', committersSQL, params)['author_id']
+        if chunksize is not None and summary is None:
+            # Each comment carries the date of its issue, the comments of an issue arrive together
+            streamSQL = commentsSQL.add_columns(issues.c.created_at.label('issue_created_at')) \
+                                   .order_by(issue_comments.c.issue_id)
+            return timeseries.stream_first_responses(
+                self.__read_sql('issue_response_time', streamSQL, params, chunksize), committers)
+        responses = timeseries.first_responses(self.__read_sql('issue_response_time', issuesSQL, params),
+                                               self.__read_sql('issue_response_time', commentsSQL, params),
+                                               committers)
+        if summary is not None:
+            return timeseries.summarize(responses['created_at'],
+                                        timeseries.days_between(responses['responded_at'], responses['created_at']), summary)
+        return responses
+
+    @cached(resample=functools.partial(timeseries.resample, ratios={'rate': ('num_approved', 'num_open')}))
+    def pull_acceptance_rate(self, repoid, start=None, end=None, interval='day'):
         """
         Timeseries of pull request acceptance rate (Number of pull requests merged on a date over Number of pull requests opened on a date)
         :param repoid: The id of the project in the projects table.
+        :param start: Only include activity on or after this date
+        :param end: Only include activity before this date
+        :param interval: Length of the periods counted: day, week, month, quarter or year
         :return: DataFrame with the pull acceptance rate and the dates
         """
-
-        pullAcceptanceSQL = s.sql.text("""
-        SELECT DATE(date_created) AS "date", CAST(num_approved AS DECIMAL)/CAST(num_open AS DECIMAL) AS "rate"
-        FROM
-            (SELECT COUNT(DISTINCT pull_request_id) AS num_approved, DATE(pull_request_history.created_at) AS accepted_on
-            FROM pull_request_history
-            JOIN pull_requests ON pull_request_history.pull_request_id = pull_requests.id
-            WHERE action = 'merged' AND pull_requests.base_repo_id = :repoid
-            GROUP BY accepted_on) accepted
-        JOIN
-            (SELECT count(distinct pull_request_id) AS num_open, DATE(pull_request_history.created_at) AS date_created
-            FROM pull_request_history
-            JOIN pull_requests ON pull_request_history.pull_request_id = pull_requests.id
-            WHERE action = 'opened'
-            AND pull_requests.base_repo_id = :repoid
-            GROUP BY date_created) opened
-        ON opened.date_created = accepted.accepted_on
-        """)
-
-        return pd.read_sql(pullAcceptanceSQL, self.db, params={"repoid": str(repoid)})
+        pull_requests, history = schema.pull_requests, schema.pull_request_history
+        day = sql.date_of(history.c.created_at)
+
+        def daily(name, action, label):
+            return s.select(s.func.count(history.c.pull_request_id.distinct()).label(label), day.label('day')) \
+                    .select_from(history.join(pull_requests, history.c.pull_request_id == pull_requests.c.id)) \
+                    .where(history.c.action == action, pull_requests.c.base_repo_id == s.bindparam('repoid'),
+                           *_in_range(history.c.created_at, start, end)) \
+                    .group_by(day).subquery(name)
+
+        accepted = daily('accepted', 'merged', 'num_approved')
+        opened = daily('opened', 'opened', 'num_open')
+        # Multiplying by 1.0 keeps SQLite from doing integer division
+        pullAcceptanceSQL = s.select(opened.c.day.label('date'),
+                                     (accepted.c.num_approved * s.literal_column('1.0') / opened.c.num_open).label('rate'),
+                                     accepted.c.num_approved, opened.c.num_open) \
+                             .select_from(accepted.join(opened, opened.c.day == accepted.c.day)) \
+                             .order_by(opened.c.day)
+        return self.__read_sql('pull_acceptance_rate', pullAcceptanceSQL, {"repoid": int(repoid)})
 
     # Zandria's metrics dist_work and reopened_issues
-    def dist_work(self, repoid):
-        distWorkSQL = s.sql.text("""
-     	SELECT projects.name AS "project_name", count(commits.id) AS "numcommits", date(commits.created_at) AS "date"
-        FROM commits
-        JOIN project_commits on commits.id = project_commits.project_id
-        JOIN projects on projects.id = project_commits.project_id
-    	JOIN users on commits.author_id = users.id
-    	GROUP BY MONTH(commits.created_at)
-        """)
-
-        return pd.read_sql(distWorkSQL, self.db, params={"repoid": str(repoid)})
-
-    def reopened_issues(self, repoid):
-        reOpenedIssuesSQL = s.sql.text("""
-        SELECT date(issue_events.created_at) AS "date", issue_events.issue_id AS "reopenedissues", action AS "action"
-        FROM issue_events
-        WHERE issue_events.action= "reopened"
-	GROUP BY MONTH(issue_events.created_at)
-        """)
-
-        return pd.read_sql(reOpenedIssuesSQL, self.db, params={"repoid": str(repoid)})
-
-    def community_activity(self, repoid):
+    @cached(resample=functools.partial(timeseries.resample, aggregations={'project_name': 'first'}))
+    def dist_work(self, repoid, start=None, end=None, interval='month'):
+        commits, project_commits, projects = schema.commits, schema.project_commits, schema.projects
+        day = sql.date_of(commits.c.created_at)
+        distWorkSQL = s.select(projects.c.name.label('project_name'), s.func.count(commits.c.id).label('numcommits'), day.label('date')) \
+                       .select_from(commits.join(project_commits, commits.c.id == project_commits.c.commit_id)
+                                           .join(projects, projects.c.id == project_commits.c.project_id)) \
+                       .where(project_commits.c.project_id == s.bindparam('repoid'), *_in_range(commits.c.created_at, start, end)) \
+                       .group_by(projects.c.name, day).order_by(day)
+
+        return self.__read_sql('dist_work', distWorkSQL, {"repoid": int(repoid)})
+
+    @cached(resample=functools.partial(timeseries.resample, aggregations={'action': 'first'}))
+    def reopened_issues(self, repoid, start=None, end=None, interval='month'):
+        issues, issue_events = schema.issues, schema.issue_events
+        day = sql.date_of(issue_events.c.created_at)
+        reOpenedIssuesSQL = s.select(day.label('date'), s.func.count(issue_events.c.issue_id).label('reopenedissues'), issue_events.c.action.label('action')) \
+                             .select_from(issue_events.join(issues, issues.c.id == issue_events.c.issue_id)) \
+                             .where(issue_events.c.action == 'reopened', issues.c.repo_id == s.bindparam('repoid'),
+                                    *_in_range(issue_events.c.created_at, start, end)) \
+                             .group_by(day, issue_events.c.action).order_by(day)
+
+        return self.__read_sql('reopened_issues', reOpenedIssuesSQL, {"repoid": int(repoid)})
+
+    @cached(resample=functools.partial(timeseries.resample, aggregations={'project_id': 'first', 'authors': 'nunique'}))
+    def community_activity(self, repoid, start=None, end=None, interval='month'):
         """
             Tallies up different forms of participation or engagement
         """
+        commits, project_commits = schema.commits, schema.project_commits
+        day = sql.date_of(commits.c.created_at)
+        # One row per author and day, resampling counts the distinct authors of every period
+        communityActivitySQL = s.select(project_commits.c.project_id.label('project_id'),
+                                        commits.c.author_id.label('authors'),
+                                        s.func.count(project_commits.c.commit_id).label('activity'),
+                                        day.label('date')) \
+                                .select_from(commits.join(project_commits, commits.c.id == project_commits.c.commit_id)) \
+                                .where(project_commits.c.project_id == s.bindparam('repoid'), *_in_range(commits.c.created_at, start, end)) \
+                                .group_by(project_commits.c.project_id, commits.c.author_id, day).order_by(day)
 
-        communityActivitySQL = s.sql.text("""
-        SELECT project_commits.project_id AS project_id, commits.author_id
-        AS author_id, count(project_commits.commit_id) AS "activity", date(commits.created_at) AS "date"
-	    from commits
-        join project_commits on commits.id = project_commits.commit_id
-        join projects on projects.id = project_commits.project_id
-	WHERE projects.id = :repoid
-        group by MONTH(commits.created_at)
-        """)
-
-        return pd.read_sql(communityActivitySQL, self.db, params={"repoid": str(repoid)})
+        return self.__read_sql('community_activity', communityActivitySQL, {"repoid": int(repoid)})
 
+    @cached()
     def contr_bre(self, repoid):
         """
         Determines Number of Non-Project Member commits
         """
-        contributorBreadthSQL = s.sql.text("""
-        SELECT count(commits.id) AS "num_commits", projects.name AS "project_name"
-        from
-        commits
-        join projects on commits.project_id = projects.id
-        join users on users.id = commits.author_id
-        where (projects.id, users.id) not in
-        (select repo_id, user_id from project_members)
-        group by projects.id
-	LIMIT 9
-        """)
-        return pd.read_sql(contributorBreadthSQL, self.db, params={"repoid": str(repoid)})
+        commits, projects, users, project_members = schema.commits, schema.projects, schema.users, schema.project_members
+        members = s.select(project_members.c.repo_id) \
+                   .where(project_members.c.repo_id == projects.c.id, project_members.c.user_id == users.c.id)
+        contributorBreadthSQL = s.select(s.func.count(commits.c.id).label('num_commits'), projects.c.name.label('project_name')) \
+                                 .select_from(commits.join(projects, commits.c.project_id == projects.c.id)
+                                                     .join(users, users.c.id == commits.c.author_id)) \
+                                 .where(~members.exists()) \
+                                 .group_by(projects.c.id, projects.c.name) \
+                                 .limit(9)
+        return self.__read_sql('contr_bre', contributorBreadthSQL)
 
     # Adam's Metric for SPRINT 2
+    @cached()
     def contributor_diversity(self, repoid):
-        contributorDiversitySQL = s.sql.text("""
-        SELECT count(distinct org_id) AS "num_organizations", projects.name AS "project_name", url
-        From
-	    organization_members
-        join users on organization_members.user_id = users.id
-        join pull_request_history on pull_request_history.actor_id = users.id
-        join pull_requests on pull_request_history.pull_request_id = pull_requests.id
-        join projects on pull_requests.base_repo_id = projects.id
-        where pull_request_history.action = 'opened'
-        GROUP BY projects.id
-	LIMIT 9
-        """)
-        return pd.read_sql(contributorDiversitySQL, self.db, params={"repoid": str(repoid)})
+        organization_members, users, projects = schema.organization_members, schema.users, schema.projects
+        pull_requests, history = schema.pull_requests, schema.pull_request_history
+        contributorDiversitySQL = s.select(s.func.count(organization_members.c.org_id.distinct()).label('num_organizations'),
+                                           projects.c.name.label('project_name'), projects.c.url) \
+                                   .select_from(organization_members.join(users, organization_members.c.user_id == users.c.id)
+                                                                    .join(history, history.c.actor_id == users.c.id)
+                                                                    .join(pull_requests, history.c.pull_request_id == pull_requests.c.id)
+                                                                    .join(projects, pull_requests.c.base_repo_id == projects.c.id)) \
+                                   .where(history.c.action == 'opened') \
+                                   .group_by(projects.c.id, projects.c.name, projects.c.url) \
+                                   .limit(9)
+        return self.__read_sql('contributor_diversity', contributorDiversitySQL)
 
     # Jack's Metric for Sprint 2
-    def transparency(self, repoid):
-        transparencySQL = s.sql.text("""
-        SELECT count(comment_id) as "avg_comments", projects.name as project_name, projects.id as project_id,  date(issue_comments.created_at) as "date"
-        FROM issue_comments
-        JOIN issues on issue_comments.issue_id = issues.id
-        JOIN projects on issues.repo_id = projects.id
-	WHERE issues.repo_id = :repoid
-        GROUP BY MONTH(issue_comments.created_at ), projects.id, issues.id
-        """)
-        return pd.read_sql(transparencySQL, self.db, params={"repoid": str(repoid)})
+    @cached(resample=functools.partial(timeseries.resample, by=['issue_id'], aggregations={'project_name': 'first', 'project_id': 'first'}))
+    def transparency(self, repoid, start=None, end=None, interval='month'):
+        issue_comments, issues, projects = schema.issue_comments, schema.issues, schema.projects
+        day = sql.date_of(issue_comments.c.created_at)
+        transparencySQL = s.select(s.func.count(issue_comments.c.comment_id).label('avg_comments'),
+                                   projects.c.name.label('project_name'), projects.c.id.label('project_id'),
+                                   issues.c.id.label('issue_id'), day.label('date')) \
+                           .select_from(issue_comments.join(issues, issue_comments.c.issue_id == issues.c.id)
+                                                      .join(projects, issues.c.repo_id == projects.c.id)) \
+                           .where(issues.c.repo_id == s.bindparam('repoid'), *_in_range(issue_comments.c.created_at, start, end)) \
+                           .group_by(day, projects.c.id, projects.c.name, issues.c.id)
+        return self.__read_sql('transparency', transparencySQL, {"repoid": int(repoid)})
 
     # Alex' metric for sprint 3
-    def bus_factor(self, repoid):
-        busFactorSQL = s.sql.text("""
-	    SELECT COUNT(*) AS "bus_factor"
-	    FROM (
-		    SELECT
-		    project_id,
-		    committer_id,
-		    COUNT(committer_id)
-		    FROM commits
-		    WHERE project_id = :repoid
-		    GROUP BY committer_id
-		    HAVING COUNT(committer_id) > (
-		    SELECT .2 * COUNT(id)
-		    FROM commits
-		    WHERE project_id = :repoid
-		    )
-	      ORDER BY COUNT(committer_id) DESC
-	    ) as foo
-
-        """)
-        return pd.read_sql(busFactorSQL, self.db, params={"repoid": str(repoid)})
+    @cached()
+    def bus_factor(self, repoid, start=None, end=None, window=timeseries.BUS_FACTOR_WINDOW, thresholds=timeseries.BUS_FACTOR_THRESHOLDS):
+        """
+        Timeseries of the bus factor, the number of committers who made more than a threshold share
+        of a project's commits in the trailing window of months ending with every month
+        :param repoid: The id of the project in the projects table.
+        :param start: Only include months on or after the one this date falls in
+        :param end: Only include commits before this date
+        :param window: Number of months in the window
+        :param thresholds: Shares of the window's commits a committer needs to count, e.g. (0.2, 0.5)
+        :return: DataFrame with date, threshold and bus_factor, one row per month and threshold
+        """
+        commits = schema.commits
+        busFactorSQL = s.select(commits.c.committer_id, commits.c.created_at) \
+                        .where(commits.c.project_id == s.bindparam('repoid'),
+                               *_in_range(commits.c.created_at, timeseries.window_start(start, window), end))
+        history = self.__read_sql('bus_factor', busFactorSQL, {"repoid": int(repoid)}, parse_dates=['created_at'])
+        return timeseries.bus_factor(history, window, thresholds, start)
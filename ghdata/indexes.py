@@ -0,0 +1,179 @@
+#SPDX-License-Identifier: MIT
+from collections import namedtuple
+import sqlalchemy as s
+
+from .rollup import Rollups
+
+
+class Index(namedtuple('Index', ['table', 'columns'])):
+    """
+    An index a metric needs: the table and the columns it should start with, in order
+    """
+
+    @property
+    def name(self):
+        # MySQL limits index names to 64 characters
+        return 'ghdata_{}_{}'.format(self.table, '_'.join(self.columns))[:64]
+
+    def __str__(self):
+        return '{}({})'.format(self.table, ', '.join(self.columns))
+
+
+# The indexes every GHTorrent metric's joins and filters need to avoid full table scans.
+# Filter columns come first, then join columns, then the columns the query reads,
+# so most of them are covering indexes for their part of the query.
+METRIC_INDEXES = {
+    'stargazers': [Index('watchers', ('repo_id', 'created_at'))],
+    'commits': [Index('commits', ('project_id', 'created_at'))],
+    'forks': [Index('projects', ('forked_from', 'created_at'))],
+    'issues': [Index('issues', ('repo_id', 'created_at'))],
+    'issues_with_close': [Index('issues', ('repo_id', 'created_at')),
+                          Index('issue_events', ('issue_id', 'action', 'created_at'))],
+    'pulls': [Index('pull_requests', ('head_repo_id',)),
+              Index('pull_request_history', ('pull_request_id', 'action', 'created_at')),
+              Index('pull_request_comments', ('pull_request_id',))],
+    'contributors': [Index('project_commits', ('project_id', 'commit_id')),
+                     Index('pull_requests', ('base_repo_id',)),
+                     Index('pull_request_history', ('pull_request_id', 'action', 'actor_id')),
+                     Index('issues', ('repo_id', 'reporter_id')),
+                     Index('commit_comments', ('commit_id', 'user_id')),
+                     Index('pull_request_comments', ('pull_request_id', 'user_id')),
+                     Index('issue_comments', ('issue_id', 'user_id'))],
+    'contributions': [Index('project_commits', ('project_id', 'commit_id')),
+                      Index('pull_requests', ('base_repo_id',)),
+                      Index('pull_request_history', ('pull_request_id', 'action', 'created_at')),
+                      Index('issues', ('repo_id', 'created_at')),
+                      Index('commit_comments', ('commit_id', 'created_at')),
+                      Index('pull_request_comments', ('pull_request_id', 'created_at')),
+                      Index('issue_comments', ('issue_id', 'created_at'))],
+    'committer_locations': [Index('project_commits', ('project_id', 'commit_id')),
+                            Index('commits', ('author_id',))],
+    'issue_response_time': [Index('issues', ('repo_id', 'created_at')),
+                            Index('issue_comments', ('issue_id', 'user_id', 'created_at')),
+                            Index('commits', ('project_id', 'author_id'))],
+    'pull_acceptance_rate': [Index('pull_requests', ('base_repo_id',)),
+                             Index('pull_request_history', ('pull_request_id', 'action', 'created_at'))],
+    'reopened_issues': [Index('issue_events', ('action', 'created_at'))],
+    'community_activity': [Index('project_commits', ('project_id', 'commit_id'))],
+    'transparency': [Index('issues', ('repo_id',)),
+                     Index('issue_comments', ('issue_id', 'created_at'))],
+    'bus_factor': [Index('commits', ('project_id', 'created_at', 'committer_id'))],
+    'dist_work': [Index('project_commits', ('project_id', 'commit_id'))],
+    # contr_bre and contributor_diversity rank every project, they read whole tables whatever the indexes.
+    # These keep their joins and the members check from scanning the other tables for every row.
+    'contr_bre': [Index('commits', ('project_id', 'author_id')),
+                  Index('project_members', ('repo_id', 'user_id'))],
+    'contributor_diversity': [Index('organization_members', ('user_id', 'org_id')),
+                              Index('pull_request_history', ('actor_id', 'action', 'pull_request_id'))],
+}
+
+
+class IndexAdvisor(object):
+    """
+    Checks a GHTorrent database for the indexes the metrics need, shows the
+    query plans of the metrics that lack them, and optionally creates them
+    """
+
+    def __init__(self, ghtorrent):
+        """
+        :param ghtorrent: GHTorrent instance connected to the database to check
+        """
+        self.ghtorrent = ghtorrent
+        self.db = ghtorrent.db
+
+    def existing(self, table):
+        """
+        Lists the columns of every index on a table, including its primary key
+        :return: List of tuples of column names, empty if the table doesn't exist
+        """
+        inspector = s.inspect(self.db)
+        try:
+            indexes = [tuple(index['column_names']) for index in inspector.get_indexes(table)]
+            primary_key = tuple(inspector.get_pk_constraint(table).get('constrained_columns') or ())
+        except s.exc.NoSuchTableError:
+            return []
+        if primary_key:
+            indexes.append(primary_key)
+        return indexes
+
+    def missing(self, metrics=None):
+        """
+        Finds the indexes the metrics need that the database doesn't have. An index
+        counts as present when an existing index starts with the same columns.
+        :param metrics: Names of metrics to check, all of METRIC_INDEXES by default
+        :return: Dict of metric to list of missing Index
+        """
+        existing = {}
+        missing = {}
+        for metric in (metrics or sorted(METRIC_INDEXES)):
+            for index in METRIC_INDEXES[metric]:
+                if index.table not in existing:
+                    existing[index.table] = self.existing(index.table)
+                if not any(columns[:len(index.columns)] == index.columns for columns in existing[index.table]):
+                    missing.setdefault(metric, []).append(index)
+        return missing
+
+    def capture(self, metric, repoid):
+        """
+        Records every query a metric sends to the database. The metric runs, its later
+        queries may depend on what the earlier ones return.
+        :return: List of (statement, parameters) as sent to the DBAPI, in the order they ran
+        """
+        queries = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            # The rollup freshness checks aren't the metric's queries
+            if Rollups.PREFIX not in statement:
+                queries.append((statement, parameters))
+        engines = self.ghtorrent.router.engines()
+        cache, self.ghtorrent.cache = self.ghtorrent.cache, None
+        for engine in engines:
+            s.event.listen(engine, 'before_cursor_execute', record)
+        try:
+            getattr(self.ghtorrent, metric)(repoid)
+        finally:
+            for engine in engines:
+                s.event.remove(engine, 'before_cursor_execute', record)
+            self.ghtorrent.cache = cache
+        return queries
+
+    def explain(self, metric, repoid):
+        """
+        Shows the database's plan for every query of a metric
+        :param metric: Name of the metric method
+        :param repoid: The id of the project to plan the queries for
+        :return: List with the plan of each query, in the order they ran. A plan is a list of dicts,
+                 one per row of EXPLAIN output.
+        """
+        prefix = 'EXPLAIN QUERY PLAN ' if self.db.dialect.name == 'sqlite' else 'EXPLAIN '
+        queries = self.capture(metric, repoid)
+        plans = []
+        with self.db.connect() as conn:
+            for statement, parameters in queries:
+                result = conn.exec_driver_sql(prefix + statement, parameters)
+                plans.append([dict(zip(result.keys(), row)) for row in result])
+        return plans
+
+    def ddl(self, index):
+        """
+        Generates the statement that creates an index with as little locking as the database allows
+        """
+        quote = self.db.dialect.identifier_preparer.quote
+        columns = ', '.join(quote(column) for column in index.columns)
+        dialect = self.db.dialect.name
+        if dialect == 'mysql':
+            return 'CREATE INDEX {} ON {} ({}) ALGORITHM=INPLACE LOCK=NONE'.format(quote(index.name), quote(index.table), columns)
+        if dialect == 'postgresql':
+            return 'CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON {} ({})'.format(quote(index.name), quote(index.table), columns)
+        return 'CREATE INDEX {} ON {} ({})'.format(quote(index.name), quote(index.table), columns)
+
+    def create(self, indexes):
+        """
+        Creates indexes online, one at a time
+        :param indexes: List of Index
+        """
+        for index in indexes:
+            # CREATE INDEX CONCURRENTLY can't run inside a transaction
+            with self.db.connect() as conn:
+                conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+                conn.exec_driver_sql(self.ddl(index))
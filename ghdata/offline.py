@@ -0,0 +1,460 @@
+#SPDX-License-Identifier: MIT
+import os
+import json
+import threading
+import functools
+import pandas as pd
+
+from . import timeseries
+from .cache import cached
+from .snapshot import snapshot_path
+
+
+def _in_range(frame, column, start=None, end=None):
+    """
+    Rows of a DataFrame with column in the range [start, end)
+    """
+    if start is not None:
+        frame = frame[frame[column] >= pd.Timestamp(start)]
+    if end is not None:
+        frame = frame[frame[column] < pd.Timestamp(end)]
+    return frame
+
+
+def _counts(frame, key, name):
+    """
+    Number of rows of frame for every value of key, as a DataFrame with key and name columns
+    """
+    return frame.groupby(key).size().rename(name).reset_index()
+
+
+class OfflineGHTorrent(object):
+    """
+    Computes the GHTorrent metrics from snapshots written by `ghdata snapshot`,
+    with the same methods and results as GHTorrent
+    """
+
+    def __init__(self, directory, cache=None):
+        """
+        :param directory: Directory holding the snapshots, one subdirectory per repository
+        :param cache: Optional result cache (see ghdata.cache.MetricCache) shared by the metric methods
+        """
+        self.directory = directory
+        self.cache = cache
+        self.__lock = threading.Lock()
+        self.__paths = {}
+        self.__snapshots = {}
+
+    def __manifest(self, path):
+        with open(os.path.join(path, 'snapshot.json')) as f:
+            return json.load(f)
+
+    def __path(self, repoid):
+        """
+        Directory of a project's snapshot, scanning the snapshot directory when it isn't known yet
+        """
+        repoid = int(repoid)
+        if repoid not in self.__paths:
+            for owner in os.listdir(self.directory):
+                for repo in os.listdir(os.path.join(self.directory, owner)):
+                    path = os.path.join(self.directory, owner, repo)
+                    if os.path.exists(os.path.join(path, 'snapshot.json')):
+                        self.__paths[self.__manifest(path)['repoid']] = path
+        if repoid not in self.__paths:
+            raise KeyError('No snapshot of project {} in {}'.format(repoid, self.directory))
+        return self.__paths[repoid]
+
+    def tables(self, repoid):
+        """
+        A project's snapshot, read once and re-read when the snapshot is replaced
+        :param repoid: The id of the project in the projects table
+        :return: Dict of table name to DataFrame
+        """
+        path = self.__path(repoid)
+        modified = os.path.getmtime(os.path.join(path, 'snapshot.json'))
+        with self.__lock:
+            loaded = self.__snapshots.get(int(repoid))
+            if loaded is None or loaded[0] != modified:
+                manifest = self.__manifest(path)
+                tables = dict((name, pd.read_parquet(os.path.join(path, name + '.parquet'))) for name in manifest['rows'])
+                for frame in tables.values():
+                    # Tables without rows are written without types
+                    if 'created_at' in frame.columns:
+                        frame['created_at'] = pd.to_datetime(frame['created_at'])
+                loaded = self.__snapshots[int(repoid)] = (modified, tables)
+        return loaded[1]
+
+    def repoid(self, owner, repo):
+        """
+        Returns a repository's ID as it appears in the GHTorrent projects table
+        :param owner: The username of a project's owner
+        :param repo: The name of the repository
+        :return: The repository's ID, 0 when there is no snapshot of it
+        """
+        path = snapshot_path(self.directory, owner, repo)
+        if not os.path.exists(os.path.join(path, 'snapshot.json')):
+            return 0
+        repoid = self.__manifest(path)['repoid']
+        self.__paths[repoid] = path
+        return repoid
+
+    def repoids(self, repos):
+        """
+        Resolves many repositories at once
+        :param repos: List of (owner, repo) pairs
+        :return: Dict of (owner, repo) to the repository's ID, 0 for repositories without a snapshot
+        """
+        return dict(((owner, repo), self.repoid(owner, repo)) for owner, repo in repos)
+
+    def userid(self, username):
+        """
+        Returns the userid given a username
+        :param username: GitHub username to be matched against the users in the snapshots
+        :return: The id from the users table in GHTorrent, 0 when no snapshot has the user
+        """
+        return self.userids([username])[username]
+
+    def userids(self, usernames):
+        """
+        Resolves many usernames at once
+        :param usernames: List of GitHub usernames
+        :return: Dict of username to the id from the users table, 0 for users that aren't in any snapshot
+        """
+        found = {}
+        for owner in os.listdir(self.directory):
+            for repo in os.listdir(os.path.join(self.directory, owner)):
+                repoid = self.repoid(owner, repo)
+                if repoid:
+                    users = self.tables(repoid)['users']
+                    found.update(zip(users['login'].str.lower(), users['id'].astype(int)))
+        return dict((username, found.get(username.lower(), 0)) for username in usernames)
+
+    def __count_by_date(self, table, repo_col, repoid, start=None, end=None):
+        """
+        Counts a snapshot table's rows per day, like GHTorrent's daily counts
+        :return: DataFrame with date and the count, named after the GHTorrent table
+        """
+        frame = self.tables(repoid)['forks' if table == 'projects' else table]
+        frame = _in_range(frame[frame[repo_col] == int(repoid)], 'created_at', start, end)
+        counts = frame.groupby(frame['created_at'].dt.normalize()).size()
+        return pd.DataFrame({'date': counts.index, table: counts.values})
+
+    def __first_dates(self, table, repo_col, repoids):
+        """
+        Finds when every project's rows in a snapshot table start, whatever dates a metric was asked for
+        :return: Dict of repoid to the created_at of its first row, projects without rows are left out
+        """
+        firsts = {}
+        for repoid in set(int(repoid) for repoid in repoids):
+            frame = self.tables(repoid)['forks' if table == 'projects' else table]
+            dates = frame[frame[repo_col] == repoid]['created_at']
+            if len(dates):
+                firsts[repoid] = dates.min()
+        return firsts
+
+    def __count_by_date_many(self, table, repo_col, repoids, start=None, end=None):
+        frames = []
+        for repoid in sorted(set(int(repoid) for repoid in repoids)):
+            counts = self.__count_by_date(table, repo_col, repoid, start, end)
+            counts.insert(0, 'repoid', repoid)
+            frames.append(counts)
+        if not frames:
+            return pd.DataFrame(columns=['repoid', 'date', table])
+        return pd.concat(frames, ignore_index=True)
+
+    # Basic timeseries queries
+    @cached(resample=timeseries.resample)
+    def stargazers(self, repoid, start=None, end=None, interval='week'):
+        """
+        Timeseries of when people starred a repo
+        :return: DataFrame with date and stargazers per interval
+        """
+        return self.__count_by_date('watchers', 'repo_id', repoid, start, end)
+
+    @cached(resample=timeseries.resample)
+    def commits(self, repoid, start=None, end=None, interval='week'):
+        """
+        Timeseries of all the commits on a repo
+        :return: DataFrame with date and commits per interval
+        """
+        return self.__count_by_date('commits', 'project_id', repoid, start, end)
+
+    @cached(resample=timeseries.resample)
+    def forks(self, repoid, start=None, end=None, interval='week'):
+        """
+        Timeseries of when a repo's forks were created
+        :return: DataFrame with date and forks per interval
+        """
+        forks = self.__count_by_date('projects', 'forked_from', repoid, start, end)
+        # Like GHTorrent.forks(), leave out the project's first week of forks, even after a start date
+        first = self.__first_dates('projects', 'forked_from', [repoid]).get(int(repoid)) if start is not None else None
+        return timeseries.drop_first_interval(forks, firsts=first)
+
+    @cached(resample=timeseries.resample)
+    def issues(self, repoid, start=None, end=None, interval='week'):
+        """
+        Timeseries of when issues were opened on a repo
+        :return: DataFrame with date and issues per interval
+        """
+        return self.__count_by_date('issues', 'repo_id', repoid, start, end)
+
+    # Timeseries for many projects at once
+    @cached(resample=functools.partial(timeseries.resample, by=['repoid']))
+    def stargazers_many(self, repoids, start=None, end=None, interval='week'):
+        return self.__count_by_date_many('watchers', 'repo_id', repoids, start, end)
+
+    @cached(resample=functools.partial(timeseries.resample, by=['repoid']))
+    def commits_many(self, repoids, start=None, end=None, interval='week'):
+        return self.__count_by_date_many('commits', 'project_id', repoids, start, end)
+
+    @cached(resample=functools.partial(timeseries.resample, by=['repoid']))
+    def forks_many(self, repoids, start=None, end=None, interval='week'):
+        forks = self.__count_by_date_many('projects', 'forked_from', repoids, start, end)
+        # Like forks(), leave out the first week of forks of every project
+        firsts = self.__first_dates('projects', 'forked_from', repoids) if start is not None else None
+        return timeseries.drop_first_interval(forks, by=['repoid'], firsts=firsts)
+
+    @cached(resample=functools.partial(timeseries.resample, by=['repoid']))
+    def issues_many(self, repoids, start=None, end=None, interval='week'):
+        return self.__count_by_date_many('issues', 'repo_id', repoids, start, end)
+
+    @cached()
+    def issues_with_close(self, repoid, start=None, end=None, chunksize=None, summary=None):
+        """
+        How long it took to close each issue
+        :return: DataFrame with the issues' id, creation date and days to close,
+                 or the weekly distribution of the days to close with a summary
+        """
+        tables = self.tables(repoid)
+        issues = _in_range(tables['issues'], 'created_at', start, end)
+        issues = issues[issues['repo_id'] == int(repoid)]
+        events = tables['issue_events']
+        closed = events[events['action'] == 'closed'][['issue_id', 'created_at']]
+        merged = issues.merge(closed, left_on='id', right_on='issue_id', suffixes=('', '_closed'))
+        result = pd.DataFrame({
+            'id': merged['id'],
+            'date': merged['created_at'],
+            'days_to_close': (merged['created_at_closed'].dt.normalize() - merged['created_at'].dt.normalize()).dt.days
+        })
+        if summary is not None:
+            return timeseries.summarize(result['date'], result['days_to_close'], summary)
+        return result if chunksize is None else timeseries.chunked(result, chunksize)
+
+    @cached(resample=timeseries.resample)
+    def pulls(self, repoid, start=None, end=None, interval='week'):
+        """
+        Timeseries of merged pull requests and the comments on them
+        :return: DataFrame with pull requests and comments per interval
+        """
+        tables = self.tables(repoid)
+        pull_requests = tables['pull_requests']
+        pull_requests = pull_requests[pull_requests['head_repo_id'] == int(repoid)]
+        history = _in_range(tables['pull_request_history'], 'created_at', start, end)
+        merged = history[history['action'] == 'merged'].merge(pull_requests[['id']], left_on='pull_request_id', right_on='id', suffixes=('', '_pull'))
+        comments = tables['pull_request_comments'].groupby('pull_request_id').size().rename('comments')
+        merged = merged.join(comments, on='pull_request_id')
+        days = merged.groupby(merged['created_at'].dt.normalize())
+        result = pd.DataFrame({'pull_requests': days.size(), 'comments': days['comments'].sum()})
+        return result.rename_axis('date').reset_index()
+
+    def __contribution_kinds(self, repoid):
+        """
+        Every kind of contribution to a project, as (name, rows, user column)
+        """
+        repoid = int(repoid)
+        tables = self.tables(repoid)
+        project_commits = tables['project_commits']
+        commit_ids = project_commits[project_commits['project_id'] == repoid]['commit_id']
+        commits = tables['commits'][tables['commits']['id'].isin(commit_ids)]
+        pull_requests = tables['pull_requests']
+        pull_ids = pull_requests[pull_requests['base_repo_id'] == repoid]['id']
+        history = tables['pull_request_history']
+        merged = history[(history['action'] == 'merged') & history['pull_request_id'].isin(pull_ids)]
+        issues = tables['issues'][tables['issues']['repo_id'] == repoid]
+        commit_comments = tables['commit_comments'][tables['commit_comments']['commit_id'].isin(commit_ids)]
+        pull_comments = tables['pull_request_comments'][tables['pull_request_comments']['pull_request_id'].isin(pull_ids)]
+        issue_comments = tables['issue_comments'][tables['issue_comments']['issue_id'].isin(issues['id'])]
+        return [
+            ('commits', commits, 'committer_id', 'author_id'),
+            ('pull_requests', merged, 'actor_id', 'actor_id'),
+            ('issues', issues, 'reporter_id', 'reporter_id'),
+            ('commit_comments', commit_comments, 'user_id', 'user_id'),
+            ('pull_request_comments', pull_comments, 'user_id', 'user_id'),
+            ('issue_comments', issue_comments, 'user_id', 'user_id')
+        ]
+
+    @cached(ttl=3600)
+    def contributors(self, repoid, chunksize=None):
+        """
+        All the contributors to a project and the counts of their contributions
+        :return: DataFrame with users id, users login, and their contributions by type
+        """
+        kinds = self.__contribution_kinds(repoid)
+        users = self.tables(repoid)['users'][['id', 'login', 'location']].rename(columns={'id': 'user_id'})
+        for kind, rows, user_col, author_col in kinds:
+            users = users.merge(_counts(rows, user_col, kind).rename(columns={user_col: 'user_id'}), on='user_id', how='left')
+        names = [kind for kind, rows, user_col, author_col in kinds]
+        users = users[users[names].notnull().any(axis=1)]
+        # Like SQL, the total is missing when any kind is
+        users['total'] = users[names].sum(axis=1, min_count=len(names))
+        result = users.sort_values('commits', ascending=False, na_position='last', kind='mergesort').set_index('user_id')
+        return result if chunksize is None else timeseries.chunked(result, chunksize)
+
+    @cached(ttl=3600, resample=functools.partial(timeseries.resample, total='total'))
+    def contributions(self, repoid, userid=None, start=None, end=None, interval='day'):
+        """
+        Timeseries of all the contributions to a project, optionally limited to a specific user
+        :return: DataFrame with all of the contributions per interval
+        """
+        daily = []
+        for kind, rows, user_col, author_col in self.__contribution_kinds(repoid):
+            rows = _in_range(rows, 'created_at', start, end)
+            if userid is not None:
+                rows = rows[rows[author_col] == int(userid)]
+            daily.append(_counts(rows.assign(date=rows['created_at'].dt.normalize()), 'date', kind))
+        # Days are those with commits, the other kinds are joined onto them
+        result = daily[0]
+        for counts in daily[1:]:
+            result = result.merge(counts, on='date', how='left')
+        names = [column for column in result.columns if column != 'date']
+        result['total'] = result[names].sum(axis=1, min_count=len(names))
+        return result.sort_values('date').reset_index(drop=True)
+
+    @cached(ttl=3600)
+    def committer_locations(self, repoid, chunksize=None):
+        """
+        Return committers and their locations
+        :return: DataFrame with users and locations sorted by commits
+        """
+        commits = self.__contribution_kinds(repoid)[0][1]
+        users = self.tables(repoid)['users']
+        users = users[users['location'].str.len() > 1]
+        merged = commits.merge(users, left_on='author_id', right_on='id', suffixes=('_commit', ''))
+        result = merged.groupby(['id', 'login', 'location']).size().rename('commits').reset_index() \
+                       .sort_values('commits', ascending=False, kind='mergesort')[['login', 'location', 'commits']] \
+                       .reset_index(drop=True)
+        return result if chunksize is None else timeseries.chunked(result, chunksize)
+
+    @cached()
+    def issue_response_time(self, repoid, start=None, end=None, chunksize=None, summary=None):
+        """
+        How long it takes for issues to be responded to by people who have commits associate with the project
+        :return: DataFrame with the date each issue was opened and first responded to,
+                 or the weekly distribution of the days to respond with a summary
+        """
+        tables = self.tables(repoid)
+        commits = tables['commits']
+        committers = commits[commits['project_id'] == int(repoid)]['author_id']
+        issues = _in_range(tables['issues'], 'created_at', start, end)
+        issues = issues[issues['repo_id'] == int(repoid)]
+        responses = timeseries.first_responses(issues, tables['issue_comments'], committers)
+        if summary is not None:
+            return timeseries.summarize(responses['created_at'],
+                                        timeseries.days_between(responses['responded_at'], responses['created_at']), summary)
+        return responses if chunksize is None else timeseries.chunked(responses, chunksize)
+
+    @cached(resample=functools.partial(timeseries.resample, ratios={'rate': ('num_approved', 'num_open')}))
+    def pull_acceptance_rate(self, repoid, start=None, end=None, interval='day'):
+        """
+        Timeseries of pull request acceptance rate (Number of pull requests merged on a date over Number of pull requests opened on a date)
+        :return: DataFrame with the pull acceptance rate and the dates
+        """
+        tables = self.tables(repoid)
+        pull_requests = tables['pull_requests']
+        pull_ids = pull_requests[pull_requests['base_repo_id'] == int(repoid)]['id']
+        history = _in_range(tables['pull_request_history'], 'created_at', start, end)
+        history = history[history['pull_request_id'].isin(pull_ids)]
+        history = history.assign(date=history['created_at'].dt.normalize())
+
+        def daily(action):
+            return history[history['action'] == action].groupby('date')['pull_request_id'].nunique()
+
+        rates = pd.concat([daily('merged').rename('num_approved'), daily('opened').rename('num_open')], axis=1, join='inner')
+        return pd.DataFrame({'date': rates.index, 'rate': (rates['num_approved'] / rates['num_open']).values,
+                             'num_approved': rates['num_approved'].values, 'num_open': rates['num_open'].values})
+
+    def __project_commits(self, repoid, start=None, end=None):
+        commits = _in_range(self.__contribution_kinds(repoid)[0][1], 'created_at', start, end)
+        return commits.assign(day=commits['created_at'].dt.normalize())
+
+    def __project(self, repoid):
+        return self.tables(repoid)['projects'].iloc[0]
+
+    @cached(resample=functools.partial(timeseries.resample, aggregations={'project_name': 'first'}))
+    def dist_work(self, repoid, start=None, end=None, interval='month'):
+        commits = self.__project_commits(repoid, start, end)
+        counts = commits.groupby('day').size()
+        return pd.DataFrame({'project_name': self.__project(repoid)['name'], 'numcommits': counts.values, 'date': counts.index})
+
+    @cached(resample=functools.partial(timeseries.resample, aggregations={'action': 'first'}))
+    def reopened_issues(self, repoid, start=None, end=None, interval='month'):
+        tables = self.tables(repoid)
+        events = _in_range(tables['issue_events'], 'created_at', start, end)
+        issue_ids = tables['issues'][tables['issues']['repo_id'] == int(repoid)]['id']
+        events = events[(events['action'] == 'reopened') & events['issue_id'].isin(issue_ids)]
+        counts = events.groupby(events['created_at'].dt.normalize()).size()
+        return pd.DataFrame({'date': counts.index, 'reopenedissues': counts.values, 'action': 'reopened'})
+
+    @cached(resample=functools.partial(timeseries.resample, aggregations={'project_id': 'first', 'authors': 'nunique'}))
+    def community_activity(self, repoid, start=None, end=None, interval='month'):
+        """
+            Tallies up different forms of participation or engagement
+        """
+        counts = self.__project_commits(repoid, start, end).groupby(['author_id', 'day']).size().rename('activity').reset_index()
+        counts = counts.sort_values('day', kind='mergesort')
+        return pd.DataFrame({'project_id': int(repoid), 'authors': counts['author_id'].values,
+                             'activity': counts['activity'].values, 'date': counts['day'].values})
+
+    @cached()
+    def contr_bre(self, repoid):
+        """
+        Determines Number of Non-Project Member commits. A snapshot only has its own project,
+        so unlike GHTorrent.contr_bre this only counts the commits to this project.
+        """
+        tables = self.tables(repoid)
+        commits = tables['commits']
+        commits = commits[(commits['project_id'] == int(repoid)) & commits['author_id'].isin(tables['users']['id'])]
+        members = tables['project_members']
+        commits = commits[~commits['author_id'].isin(members[members['repo_id'] == int(repoid)]['user_id'])]
+        if commits.empty:
+            return pd.DataFrame(columns=['num_commits', 'project_name'])
+        return pd.DataFrame({'num_commits': [len(commits)], 'project_name': [self.__project(repoid)['name']]})
+
+    @cached()
+    def contributor_diversity(self, repoid):
+        """
+        Number of organizations whose members opened pull requests. A snapshot only has its
+        own project, so unlike GHTorrent.contributor_diversity this only covers this project.
+        """
+        tables = self.tables(repoid)
+        pull_requests = tables['pull_requests']
+        pull_ids = pull_requests[pull_requests['base_repo_id'] == int(repoid)]['id']
+        history = tables['pull_request_history']
+        actors = history[(history['action'] == 'opened') & history['pull_request_id'].isin(pull_ids)]['actor_id']
+        members = tables['organization_members']
+        members = members[members['user_id'].isin(actors) & members['user_id'].isin(tables['users']['id'])]
+        if members.empty:
+            return pd.DataFrame(columns=['num_organizations', 'project_name', 'url'])
+        project = self.__project(repoid)
+        return pd.DataFrame({'num_organizations': [members['org_id'].nunique()], 'project_name': [project['name']], 'url': [project['url']]})
+
+    @cached(resample=functools.partial(timeseries.resample, by=['issue_id'], aggregations={'project_name': 'first', 'project_id': 'first'}))
+    def transparency(self, repoid, start=None, end=None, interval='month'):
+        tables = self.tables(repoid)
+        issues = tables['issues'][tables['issues']['repo_id'] == int(repoid)][['id']]
+        comments = _in_range(tables['issue_comments'], 'created_at', start, end).merge(issues, left_on='issue_id', right_on='id')
+        counts = comments.groupby([comments['created_at'].dt.normalize().rename('date'), 'issue_id']).size().rename('avg_comments').reset_index()
+        project = self.__project(repoid)
+        return pd.DataFrame({'avg_comments': counts['avg_comments'], 'project_name': project['name'],
+                             'project_id': int(repoid), 'issue_id': counts['issue_id'], 'date': counts['date']})
+
+    # Alex' metric for sprint 3
+    @cached()
+    def bus_factor(self, repoid, start=None, end=None, window=timeseries.BUS_FACTOR_WINDOW, thresholds=timeseries.BUS_FACTOR_THRESHOLDS):
+        """
+        Timeseries of the bus factor over a trailing window of months, for every threshold
+        :return: DataFrame with date, threshold and bus_factor
+        """
+        commits = self.tables(repoid)['commits']
+        commits = _in_range(commits[commits['project_id'] == int(repoid)], 'created_at', timeseries.window_start(start, window), end)
+        return timeseries.bus_factor(commits[['committer_id', 'created_at']], window, thresholds, start)
@@ -0,0 +1,394 @@
+#SPDX-License-Identifier: MIT
+"""
+Preforking server: a master process binds the port and forks worker processes that each
+serve requests on a pool of threads, so the API can use every core of the host
+"""
+import os
+import sys
+import time
+import mmap
+import errno
+import random
+import signal
+import socket
+import struct
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+
+# Seconds an idle keep-alive connection may hold one of a worker's threads
+KEEPALIVE = 5
+# Seconds between the heartbeats of a worker
+HEARTBEAT = 1
+# Seconds between the master's checks on its workers
+TICK = 0.5
+
+
+class WorkerBoard(object):
+    """
+    Shared memory in which every worker publishes its pid, heartbeat and request counts,
+    so whichever worker answers can report on all of them
+    """
+
+    SLOT = struct.Struct('=qddqqqq')
+    STATES = ('stopped', 'serving', 'stopping')
+
+    def __init__(self, slots):
+        """
+        :param slots: Most workers alive at the same time
+        """
+        self.slots = slots
+        # Anonymous maps are shared with the processes forked after they are made
+        self.__memory = mmap.mmap(-1, self.SLOT.size * slots)
+
+    def read(self, slot):
+        """
+        :return: (pid, started_at, heartbeat_at, requests, active, state, designated) of the worker in a slot
+        """
+        return self.SLOT.unpack_from(self.__memory, slot * self.SLOT.size)
+
+    def write(self, slot, pid=0, started_at=0.0, heartbeat_at=0.0, requests=0, active=0, state=0, designated=0):
+        self.SLOT.pack_into(self.__memory, slot * self.SLOT.size, pid, started_at, heartbeat_at, requests, active,
+                            state, designated)
+
+    def free(self):
+        """
+        :return: Index of a slot without a worker, None if they are all taken
+        """
+        for slot in range(self.slots):
+            if (self.read(slot)[0] == 0):
+                return slot
+        return None
+
+    def stats(self):
+        """
+        Returns the health of every worker
+        :return: List of dicts with pid, started_at, heartbeat_at, requests, active, state, designated,
+                 True for the worker running the background work, and current, True for the worker
+                 the caller runs in
+        """
+        stats = []
+        for slot in range(self.slots):
+            pid, started_at, heartbeat_at, requests, active, state, designated = self.read(slot)
+            if (pid):
+                stats.append({'pid': pid, 'started_at': started_at, 'heartbeat_at': heartbeat_at,
+                              'requests': requests, 'active': active, 'state': self.STATES[state],
+                              'designated': bool(designated), 'current': pid == os.getpid()})
+        return stats
+
+
+class _RequestHandler(WSGIRequestHandler):
+
+    timeout = KEEPALIVE
+
+    def run_wsgi(self):
+        self.server.request_started()
+        try:
+            WSGIRequestHandler.run_wsgi(self)
+        finally:
+            if (self.server.request_finished()):
+                # The worker is stopping, don't wait for another request on this connection
+                self.close_connection = True
+
+
+class _WorkerServer(BaseWSGIServer):
+    """
+    Serves the connections a worker accepts on a pool of threads, and publishes its health
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, app, fd, board, slot, threads, max_requests, designated=False):
+        BaseWSGIServer.__init__(self, host, port, app, handler=_RequestHandler, fd=fd)
+        # Every worker polls the socket, those that lose the race for a connection mustn't block in accept
+        self.socket.setblocking(False)
+        self.board = board
+        self.slot = slot
+        self.max_requests = max_requests
+        self.designated = designated
+        self.started_at = time.time()
+        self.requests = 0
+        self.active = 0
+        self.state = 1
+        self.__lock = threading.Lock()
+        self.__pool = ThreadPoolExecutor(max_workers=threads)
+        # Stop accepting while every thread is busy, so idle workers take the next connections
+        self.__threads = threading.BoundedSemaphore(threads)
+        self.__stopping = threading.Event()
+
+    def publish(self):
+        with self.__lock:
+            self.board.write(self.slot, os.getpid(), self.started_at, time.time(),
+                             self.requests, self.active, self.state, int(self.designated))
+
+    def request_started(self):
+        with self.__lock:
+            self.active += 1
+
+    def request_finished(self):
+        """
+        :return: True if the worker is stopping
+        """
+        with self.__lock:
+            self.active -= 1
+            self.requests += 1
+            recycle = self.max_requests and self.requests >= self.max_requests
+        if (recycle):
+            self.stop()
+        return self.__stopping.is_set()
+
+    def process_request(self, request, client_address):
+        self.__threads.acquire()
+        request.setblocking(True)
+        self.__pool.submit(self.__process, request, client_address)
+
+    def __process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.__threads.release()
+
+    def stop(self):
+        """
+        Stops accepting connections, the requests being served are finished
+        """
+        if (self.__stopping.is_set()):
+            return
+        self.__stopping.set()
+        self.state = 2
+        self.publish()
+        # shutdown() waits for serve_forever(), which may be running on the calling thread
+        threading.Thread(target=self.shutdown).start()
+
+    def serve(self):
+        def heartbeat():
+            while (not self.__stopping.wait(HEARTBEAT)):
+                self.publish()
+        self.publish()
+        beat = threading.Thread(target=heartbeat, name='ghdata-heartbeat')
+        beat.daemon = True
+        beat.start()
+        self.serve_forever(poll_interval=TICK)
+        self.__pool.shutdown(wait=True)
+
+
+class PreforkServer(object):
+    """
+    Master process of the preforking server. It binds the port once and forks the workers,
+    which create their own database connections on their first request. Workers are replaced when
+    they exit, after max_requests requests or when they miss their heartbeats for timeout seconds.
+    SIGHUP creates the app again from the config and replaces every worker without dropping
+    requests, SIGTERM and SIGINT stop the server once the requests being served are finished.
+    One serving worker at a time is designated to run the background work passed as designate.
+    """
+
+    def __init__(self, create_app, host='0.0.0.0', port=5000, workers=2, threads=4, max_requests=0,
+                 graceful_timeout=30, timeout=60, designate=None):
+        """
+        :param create_app: Function without arguments that returns the WSGI app, called again on SIGHUP
+        :param workers: Number of worker processes
+        :param threads: Number of requests each worker serves at the same time
+        :param max_requests: Requests after which a worker is replaced, 0 for never. Each worker adds up
+                             to a tenth more, so they aren't all replaced at once.
+        :param graceful_timeout: Seconds a stopping worker has to finish its requests before it is killed
+        :param timeout: Seconds without a heartbeat after which a worker is killed
+        :param designate: Function called with the app in the designated worker before it serves, for work
+                          that must run once and not in every worker, like the cache warmer. When the
+                          designated worker stops, the next worker started takes over.
+        """
+        self.create_app = create_app
+        self.host = host
+        self.port = int(port)
+        self.workers = workers
+        self.threads = threads
+        self.max_requests = max_requests
+        self.graceful_timeout = graceful_timeout
+        self.timeout = timeout
+        self.designate = designate
+        # Room for a whole new generation of workers next to the one it replaces
+        self.board = WorkerBoard(2 * workers)
+        self.app = None
+        self.socket = None
+        # pid: [slot, time it was told to stop or noticed stopping, None while serving]
+        self.__children = {}
+        # pid of the designated worker
+        self.__designated = None
+        self.__signals = []
+
+    def bind(self):
+        """
+        Opens the listening socket the workers share, the port is chosen by the OS if it is 0
+        :return: (host, port) it is bound to
+        """
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(128)
+        self.socket.setblocking(False)
+        self.port = self.socket.getsockname()[1]
+        return self.host, self.port
+
+    def load(self):
+        """
+        Creates the app the next workers serve
+        """
+        self.app = self.create_app()
+        if (hasattr(self.app, 'extensions')):
+            self.app.extensions['ghdata.workers'] = self.board
+
+    def run(self):
+        """
+        Serves until SIGTERM or SIGINT
+        """
+        if (not hasattr(os, 'fork')):
+            raise RuntimeError('The preforking server needs os.fork, run the development server on this platform')
+        if (self.socket is None):
+            self.bind()
+        self.load()
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda signum, frame: self.__signals.append(signum))
+        print(' * Serving on http://{}:{}/ with {} workers of {} threads (pid {})'.format(
+            self.host, self.port, self.workers, self.threads, os.getpid()))
+        sys.stdout.flush()
+        try:
+            while (True):
+                self.__reap()
+                if (signal.SIGTERM in self.__signals or signal.SIGINT in self.__signals):
+                    break
+                if (signal.SIGHUP in self.__signals):
+                    self.__signals.remove(signal.SIGHUP)
+                    self.__reload()
+                self.__check()
+                self.__spawn_missing()
+                time.sleep(TICK)
+        finally:
+            self.__stop_all()
+            self.socket.close()
+
+    def __reload(self):
+        try:
+            self.load()
+        except Exception:
+            # Keep serving the app that works
+            traceback.print_exc()
+            return
+        print(' * Reloading, replacing {} workers'.format(len(self.__serving())))
+        sys.stdout.flush()
+        for pid in self.__serving():
+            self.__stop(pid)
+
+    def __serving(self):
+        return [pid for pid, child in self.__children.items() if child[1] is None]
+
+    def __spawn_missing(self):
+        while (len(self.__serving()) < self.workers):
+            slot = self.board.free()
+            if (slot is None):
+                # Stopping workers still hold every slot, try again once they are gone
+                return
+            # A stopping designated worker finishes its requests, its replacement takes over its work
+            designated = self.designate is not None and self.__designated not in self.__serving()
+            self.__spawn(slot, designated)
+
+    def __spawn(self, slot, designated=False):
+        pid = os.fork()
+        if (pid):
+            self.__children[pid] = [slot, None]
+            if (designated):
+                self.__designated = pid
+            self.board.write(slot, pid, time.time(), time.time(), 0, 0, 1, int(designated))
+            return
+        code = 0
+        try:
+            self.__work(slot, designated)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def __work(self, slot, designated):
+        # Forked workers inherit the master's random state, their jitter would be the same
+        random.seed()
+        max_requests = self.max_requests
+        if (max_requests):
+            max_requests += random.randint(0, max_requests // 10)
+        server = _WorkerServer(self.host, self.port, self.app, self.socket.fileno(), self.board, slot,
+                               self.threads, max_requests, designated)
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda signum, frame: server.stop())
+        # The master reloads, a worker has nothing to reload
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        if (designated):
+            self.designate(self.app)
+        server.serve()
+
+    def __stop(self, pid):
+        self.__children[pid][1] = time.time()
+        self.__kill(pid, signal.SIGTERM)
+
+    def __kill(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except OSError as e:
+            if (e.errno != errno.ESRCH):
+                raise
+
+    def __check(self):
+        now = time.time()
+        for pid, child in list(self.__children.items()):
+            _, _, heartbeat_at, _, _, state, _ = self.board.read(child[0])
+            if (child[1] is None and state == 2):
+                # Stopping by itself after max_requests, a replacement starts right away
+                child[1] = now
+            if (child[1] is not None and now - child[1] > self.graceful_timeout):
+                self.__kill(pid, signal.SIGKILL)
+            elif (child[1] is None and now - heartbeat_at > self.timeout):
+                print(' * Worker {} missed its heartbeats for {} seconds, killing it'.format(pid, self.timeout))
+                sys.stdout.flush()
+                child[1] = now
+                self.__kill(pid, signal.SIGKILL)
+
+    def __reap(self):
+        while (self.__children):
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if (e.errno == errno.ECHILD):
+                    return
+                raise
+            if (pid == 0):
+                return
+            child = self.__children.pop(pid, None)
+            if (child is None):
+                continue
+            stopped_itself = self.board.read(child[0])[5] == 2
+            self.board.write(child[0])
+            if (child[1] is None and not stopped_itself):
+                print(' * Worker {} exited unexpectedly with status {}'.format(pid, status))
+                sys.stdout.flush()
+
+    def __stop_all(self):
+        for pid, child in list(self.__children.items()):
+            if (child[1] is None):
+                self.__stop(pid)
+        deadline = time.time() + self.graceful_timeout
+        while (self.__children and time.time() < deadline):
+            self.__reap()
+            time.sleep(TICK / 5)
+        for pid in list(self.__children):
+            self.__kill(pid, signal.SIGKILL)
+        while (self.__children):
+            pid, status = os.waitpid(-1, 0)
+            child = self.__children.pop(pid, None)
+            if (child is not None):
+                self.board.write(child[0])
@@ -0,0 +1,271 @@
+#SPDX-License-Identifier: MIT
+import sys
+import time
+import datetime
+import pandas as pd
+import sqlalchemy as s
+
+
+# Tables counted by GHTorrent.__single_table_count_by_date:
+# table: (column with the project ids, column used as the high-water mark)
+ROLLUP_TABLES = {
+    'commits': ('project_id', 'id'),
+    'issues': ('repo_id', 'id'),
+    'projects': ('forked_from', 'id'),
+    # watchers has no id column, and a star may be loaded after stars with a later created_at.
+    # Its rollup is counted again from scratch for the days since Rollups.overlap before its mark.
+    'watchers': ('repo_id', 'created_at'),
+}
+
+
+class Rollups(object):
+    """
+    Maintains daily (repo_id, day, count) tables for the single-table counts,
+    refreshed incrementally from the high-water mark stored for every table
+    """
+
+    PREFIX = 'ghdata_daily_'
+
+    # Days of rows with a created_at mark counted in one transaction
+    DAYS_PER_WINDOW = 31
+
+    def __init__(self, db, max_age=2 * 86400, state_ttl=60, overlap=7):
+        """
+        :param db: SQLAlchemy engine for the GHTorrent database
+        :param max_age: Seconds after a refresh until a rollup is considered stale
+        :param state_ttl: Seconds the refresh times read from the database are trusted
+        :param overlap: Days before the mark of a table without ids that every refresh counts again,
+                        rows loaded later than that with an older created_at are missed
+        """
+        self.db = db
+        self.max_age = max_age
+        self.state_ttl = state_ttl
+        self.overlap = overlap
+        self.__state = None
+        self.__state_read = 0
+        self.metadata = s.MetaData()
+        self.state_table = s.Table(self.PREFIX + 'state', self.metadata,
+                                   s.Column('table_name', s.String(64), primary_key=True),
+                                   s.Column('high_water_id', s.BigInteger),
+                                   s.Column('high_water_at', s.DateTime),
+                                   s.Column('refreshed_at', s.DateTime))
+        self.tables = {}
+        for table in ROLLUP_TABLES:
+            self.tables[table] = s.Table(self.PREFIX + table, self.metadata,
+                                         s.Column('repo_id', s.BigInteger, primary_key=True),
+                                         s.Column('day', s.Date, primary_key=True),
+                                         s.Column('count', s.BigInteger, nullable=False))
+
+    def create(self):
+        """
+        Creates the rollup tables if they don't exist yet
+        """
+        self.metadata.create_all(self.db)
+
+    def state(self):
+        """
+        Returns when each rollup was last refreshed, re-reading it at most every state_ttl seconds
+        :return: Dict of table to refreshed_at, empty when the rollups don't exist
+        """
+        if self.__state is None or self.__state_read + self.state_ttl < time.time():
+            try:
+                with self.db.connect() as conn:
+                    rows = conn.execute(s.select(self.state_table.c.table_name, self.state_table.c.refreshed_at))
+                    self.__state = dict((table, refreshed_at) for table, refreshed_at in rows)
+            except s.exc.SQLAlchemyError:
+                self.__state = {}
+            self.__state_read = time.time()
+        return self.__state
+
+    def is_fresh(self, table):
+        """
+        Whether a rollup exists and was refreshed in the last max_age seconds
+        """
+        refreshed_at = self.state().get(table)
+        if refreshed_at is None:
+            return False
+        return refreshed_at + datetime.timedelta(seconds=self.max_age) > datetime.datetime.utcnow()
+
+    def counts(self, table, repoid, start=None, end=None):
+        """
+        Daily counts for a project read from a rollup
+        :param table: The GHTorrent table that was counted
+        :param repoid: The id of the project in the projects table
+        :param start: Only include days that end on or after this date
+        :param end: Only include days that start before this date
+        :return: DataFrame with date and count columns like GHTorrent's own query, or None if the rollup isn't fresh
+        """
+        if table not in self.tables or not self.is_fresh(table):
+            return None
+        rollup = self.tables[table]
+        countSQL = s.select(rollup.c.day.label('date'), rollup.c.count.label(table)) \
+                    .where(rollup.c.repo_id == int(repoid), *self.__days(rollup, start, end)) \
+                    .order_by(rollup.c.day)
+        counts = pd.read_sql(countSQL, self.db)
+        counts['date'] = pd.to_datetime(counts['date'])
+        return counts
+
+    def select(self, table, start=None, end=None):
+        """
+        Query reading the daily counts of many projects from a rollup, to combine with other queries
+        :param table: The GHTorrent table that was counted
+        :param start: Only include days that end on or after this date
+        :param end: Only include days that start before this date
+        :return: Select with repoid, date and count columns using the expanding :repoids parameter,
+                 or None if the rollup isn't fresh
+        """
+        if table not in self.tables or not self.is_fresh(table):
+            return None
+        rollup = self.tables[table]
+        return s.select(rollup.c.repo_id.label('repoid'), rollup.c.day.label('date'), rollup.c.count.label('count')) \
+                .where(rollup.c.repo_id.in_(s.bindparam('repoids', expanding=True)), *self.__days(rollup, start, end))
+
+    def __days(self, rollup, start, end):
+        # Rollups only know whole days, keep the days the range overlaps
+        conditions = []
+        if start is not None:
+            conditions.append(rollup.c.day > (pd.Timestamp(start) - pd.Timedelta(days=1)).date())
+        if end is not None:
+            conditions.append(rollup.c.day < pd.Timestamp(end).date())
+        return conditions
+
+    def refresh(self, tables=None, chunksize=1000000):
+        """
+        Adds the rows created since the last refresh to the rollups. The rows are counted by the database,
+        a window at a time, each in its own transaction holding the lock on the table's state row,
+        so refreshes running at the same time never count a row twice.
+        :param tables: Tables to refresh, all of ROLLUP_TABLES by default
+        :param chunksize: Ids of a table counted per transaction
+        :return: Dict of table to the number of rows that were counted
+        """
+        self.create()
+        counted = {}
+        for table in (tables or sorted(ROLLUP_TABLES)):
+            if ROLLUP_TABLES[table][1] == 'id':
+                counted[table] = self.__refresh_by_id(table, chunksize)
+            else:
+                counted[table] = self.__refresh_by_day(table)
+        self.__state = None
+        return counted
+
+    def __refresh_by_id(self, table, chunksize):
+        # Ids only grow, the rows above the mark are new and their counts are added
+        repo_col, mark_col = ROLLUP_TABLES[table]
+        source = s.table(table, s.column('id'), s.column(repo_col), s.column('created_at'))
+        with self.db.connect() as conn:
+            first, high = conn.execute(s.select(s.func.min(source.c.id), s.func.max(source.c.id))).one()
+        rollup = self.tables[table]
+        day = s.func.date(source.c.created_at)
+        counted = 0
+        while True:
+            with self.db.begin() as conn:
+                low = self.__claim(conn, table, 'high_water_id')
+                if low is None:
+                    low = first - 1 if first is not None else None
+                if high is None or low >= high:
+                    self.__mark_refreshed(conn, table, 'high_water_id', low)
+                    return counted
+                upper = min(low + chunksize, high)
+                deltas = conn.execute(s.select(source.c[repo_col], day, s.func.count())
+                                      .where(source.c[repo_col].isnot(None), source.c.id > low, source.c.id <= upper)
+                                      .group_by(source.c[repo_col], day)).fetchall()
+                if deltas:
+                    self.__add_counts(conn, rollup, [{'repo_id': int(repo_id), 'day': pd.Timestamp(date).date(), 'count': int(count)}
+                                                     for repo_id, date, count in deltas])
+                counted += sum(int(count) for repo_id, date, count in deltas)
+                self.__mark_refreshed(conn, table, 'high_water_id', upper)
+
+    def __refresh_by_day(self, table):
+        # created_at doesn't only grow, the days since the overlap before the mark are counted from scratch
+        repo_col, mark_col = ROLLUP_TABLES[table]
+        source = s.table(table, s.column(repo_col), s.column('created_at'))
+        with self.db.connect() as conn:
+            first, high = conn.execute(s.select(s.func.min(source.c.created_at), s.func.max(source.c.created_at))).one()
+        if high is None:
+            with self.db.begin() as conn:
+                self.__mark_refreshed(conn, table, 'high_water_at', self.__claim(conn, table, 'high_water_at'))
+            return 0
+        rollup = self.tables[table]
+        day = s.func.date(source.c.created_at)
+        last = pd.Timestamp(high).normalize()
+        counted = 0
+        window = None
+        while True:
+            with self.db.begin() as conn:
+                mark = self.__claim(conn, table, 'high_water_at')
+                if window is None:
+                    # The first window of this refresh starts the overlap before the mark
+                    window = pd.Timestamp(first).normalize() if mark is None else pd.Timestamp(mark) - pd.Timedelta(days=self.overlap)
+                begin, stop = window, window + pd.Timedelta(days=self.DAYS_PER_WINDOW)
+                # Bounds as text compare correctly with the DATETIME columns of MySQL and the text of SQLite
+                where = [source.c[repo_col].isnot(None),
+                         source.c.created_at >= s.literal(begin.strftime('%Y-%m-%d %H:%M:%S')),
+                         source.c.created_at < s.literal(stop.strftime('%Y-%m-%d %H:%M:%S'))]
+                conn.execute(rollup.delete().where(rollup.c.day >= begin.date(), rollup.c.day < stop.date()))
+                conn.execute(rollup.insert().from_select(['repo_id', 'day', 'count'],
+                             s.select(source.c[repo_col], day, s.func.count()).where(*where).group_by(source.c[repo_col], day)))
+                counted += conn.execute(s.select(s.func.count()).select_from(source).where(*where)).scalar()
+                self.__mark_refreshed(conn, table, 'high_water_at', min(stop, last + pd.Timedelta(days=1)).to_pydatetime())
+                if stop > last:
+                    return counted
+                window = stop
+
+    def __claim(self, conn, table, mark_field):
+        """
+        Locks the state row of a table until the transaction ends, refreshes running at the same time
+        wait for each other. It is locked with an UPDATE because SQLite has no SELECT ... FOR UPDATE.
+        :return: The stored high-water mark, None before the first refresh
+        """
+        state = self.state_table
+        claimed = conn.execute(state.update().where(state.c.table_name == table).values(table_name=table))
+        if claimed.rowcount == 0:
+            conn.execute(state.insert().values(table_name=table))
+        return conn.execute(s.select(state.c[mark_field]).where(state.c.table_name == table)).scalar()
+
+    def __add_counts(self, conn, rollup, rows):
+        """
+        Adds counts to the rollup with one bulk upsert
+        :param rows: List of dicts with repo_id, day and count
+        """
+        dialect = conn.dialect.name
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+            upsert = insert(rollup)
+            upsert = upsert.on_duplicate_key_update(count=rollup.c.count + upsert.inserted['count'])
+        elif dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            upsert = insert(rollup)
+            upsert = upsert.on_conflict_do_update(index_elements=[rollup.c.repo_id, rollup.c.day],
+                                                  set_={'count': rollup.c.count + upsert.excluded['count']})
+        else:
+            for row in rows:
+                where = (rollup.c.repo_id == row['repo_id']) & (rollup.c.day == row['day'])
+                updated = conn.execute(rollup.update().where(where).values(count=rollup.c.count + row['count']))
+                if updated.rowcount == 0:
+                    conn.execute(rollup.insert().values(**row))
+            return
+        conn.execute(upsert, rows)
+
+    def __mark_refreshed(self, conn, table, mark_field, mark):
+        state = self.state_table
+        conn.execute(state.update().where(state.c.table_name == table)
+                     .values(**{mark_field: mark, 'refreshed_at': datetime.datetime.utcnow()}))
+
+
+def main():
+    """
+    Creates or refreshes the rollups, meant to be run from cron:
+        python -m ghdata.rollup mysql+pymysql://<user>:<pass>@<host>:<port>/<database>
+    """
+    if len(sys.argv) < 2:
+        print('Usage: python -m ghdata.rollup <database string> [table ...]')
+        sys.exit(1)
+    rollups = Rollups(s.create_engine(sys.argv[1]))
+    for table, rows in sorted(rollups.refresh(sys.argv[2:] or None).items()):
+        print('{}: counted {} new rows'.format(table, rows))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#SPDX-License-Identifier: MIT
+"""
+The part of the GHTorrent schema GHData reads, as SQLAlchemy tables.
+Only primary keys are declared, see ghdata.indexes for the indexes the metrics need.
+"""
+import sqlalchemy as s
+
+
+metadata = s.MetaData()
+
+users = s.Table('users', metadata,
+    s.Column('id', s.Integer, primary_key=True),
+    s.Column('login', s.String(255), nullable=False),
+    s.Column('company', s.String(255)),
+    s.Column('location', s.String(255)),
+    s.Column('created_at', s.DateTime, nullable=False),
+    s.Column('type', s.String(255), nullable=False, default='USR'),
+    s.Column('fake', s.Boolean, nullable=False, default=False),
+    s.Column('deleted', s.Boolean, nullable=False, default=False))
+
+projects = s.Table('projects', metadata,
+    s.Column('id', s.Integer, primary_key=True),
+    s.Column('url', s.String(255)),
+    s.Column('owner_id', s.Integer),
+    s.Column('name', s.String(255), nullable=False),
+    s.Column('description', s.String(255)),
+    s.Column('language', s.String(255)),
+    s.Column('created_at', s.DateTime, nullable=False),
+    s.Column('forked_from', s.Integer),
+    s.Column('deleted', s.Boolean, nullable=False, default=False))
+
+commits = s.Table('commits', metadata,
+    s.Column('id', s.Integer, primary_key=True),
+    s.Column('sha', s.String(40)),
+    s.Column('author_id', s.Integer),
+    s.Column('committer_id', s.Integer),
+    s.Column('project_id', s.Integer),
+    s.Column('created_at', s.DateTime, nullable=False))
+
+project_commits = s.Table('project_commits', metadata,
+    s.Column('project_id', s.Integer, primary_key=True, autoincrement=False),
+    s.Column('commit_id', s.Integer, primary_key=True, autoincrement=False))
+
+commit_comments = s.Table('commit_comments', metadata,
+    s.Column('id', s.Integer, primary_key=True),
+    s.Column('commit_id', s.Integer, nullable=False),
+    s.Column('user_id', s.Integer, nullable=False),
+    s.Column('body', s.String(256)),
+    s.Column('comment_id', s.Integer, nullable=False),
+    s.Column('created_at', s.DateTime, nullable=False))
+
+watchers = s.Table('watchers', metadata,
+    s.Column('repo_id', s.Integer, primary_key=True, autoincrement=False),
+    s.Column('user_id', s.Integer, primary_key=True, autoincrement=False),
+    s.Column('created_at', s.DateTime, nullable=False))
+
+issues = s.Table('issues', metadata,
+    s.Column('id', s.Integer, primary_key=True),
+    s.Column('repo_id', s.Integer),
+    s.Column('reporter_id', s.Integer),
+    s.Column('assignee_id', s.Integer),
+    s.Column('pull_request', s.Boolean, nullable=False, default=False),
+    s.Column('pull_request_id', s.Integer),
+    s.Column('created_at', s.DateTime, nullable=False),
+    s.Column('issue_id', s.Integer, nullable=False))
+
+issue_events = s.Table('issue_events', metadata,
+    s.Column('event_id', s.Integer, primary_key=True),
+    s.Column('issue_id', s.Integer, nullable=False),
+    s.Column('actor_id', s.Integer, nullable=False),
+    s.Column('action', s.String(255), nullable=False),
+    s.Column('action_specific', s.String(50)),
+    s.Column('created_at', s.DateTime, nullable=False))
+
+issue_comments = s.Table('issue_comments', metadata,
+    s.Column('issue_id', s.Integer, nullable=False),
+    s.Column('user_id', s.Integer, nullable=False),
+    s.Column('comment_id', s.Integer, primary_key=True),
+    s.Column('created_at', s.DateTime, nullable=False))
+
+pull_requests = s.Table('pull_requests', metadata,
+    s.Column('id', s.Integer, primary_key=True),
+    s.Column('head_repo_id', s.Integer),
+    s.Column('base_repo_id', s.Integer, nullable=False),
+    s.Column('head_commit_id', s.Integer),
+    s.Column('base_commit_id', s.Integer),
+    s.Column('pullreq_id', s.Integer, nullable=False),
+    s.Column('intra_branch', s.Boolean, nullable=False, default=False))
+
+pull_request_history = s.Table('pull_request_history', metadata,
+    s.Column('id', s.Integer, primary_key=True),
+    s.Column('pull_request_id', s.Integer, nullable=False),
+    s.Column('created_at', s.DateTime, nullable=False),
+    s.Column('action', s.String(255), nullable=False),
+    s.Column('actor_id', s.Integer))
+
+pull_request_comments = s.Table('pull_request_comments', metadata,
+    s.Column('pull_request_id', s.Integer, nullable=False),
+    s.Column('user_id', s.Integer, nullable=False),
+    s.Column('comment_id', s.Integer, primary_key=True),
+    s.Column('position', s.Integer),
+    s.Column('body', s.String(256)),
+    s.Column('commit_id', s.Integer, nullable=False),
+    s.Column('created_at', s.DateTime, nullable=False))
+
+project_members = s.Table('project_members', metadata,
+    s.Column('repo_id', s.Integer, primary_key=True, autoincrement=False),
+    s.Column('user_id', s.Integer, primary_key=True, autoincrement=False),
+    s.Column('created_at', s.DateTime, nullable=False))
+
+organization_members = s.Table('organization_members', metadata,
+    s.Column('org_id', s.Integer, primary_key=True, autoincrement=False),
+    s.Column('user_id', s.Integer, primary_key=True, autoincrement=False),
+    s.Column('created_at', s.DateTime, nullable=False))
@@ -0,0 +1,176 @@
+#SPDX-License-Identifier: MIT
+"""
+Formats metric results can be sent in, and the negotiation of the format
+and compression of a response
+"""
+import io
+import json
+import zlib
+from collections import namedtuple, OrderedDict
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    # pyarrow takes longer to import than the rest of the server, it is imported by the first response that needs it
+    from importlib.util import find_spec
+    HAVE_PYARROW = find_spec('pyarrow') is not None
+except ImportError:
+    import imp
+    try:
+        imp.find_module('pyarrow')
+        HAVE_PYARROW = True
+    except ImportError:
+        HAVE_PYARROW = False
+
+
+# Responses smaller than this aren't worth compressing
+MIN_COMPRESSED_SIZE = 1024
+# zlib level, the higher ones cost a lot more time for a few percent
+COMPRESSION_LEVEL = 6
+# Content encodings in order of preference
+ENCODINGS = ('gzip', 'deflate')
+
+
+class Format(namedtuple('Format', ['name', 'mimetype', 'encode'])):
+    """
+    A format results can be sent in: its name for ?format=, its media type for the
+    Accept header and the function encoding a DataFrame, None if its library isn't installed
+    """
+
+    @property
+    def available(self):
+        return self.encode is not None
+
+
+def _pyarrow():
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.ipc
+    return pyarrow
+
+
+def to_json(frame):
+    """
+    JSON array with an object for every row, the default format
+    """
+    return frame.to_json(orient='records', date_format='iso', date_unit='ms')
+
+
+def _json_values(series):
+    if orjson is not None and series.dtype.kind in 'iuf':
+        return orjson.dumps(series.to_numpy(), option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+    return series.to_json(orient='values', date_format='iso', date_unit='ms')
+
+
+def to_split(frame):
+    """
+    JSON object with the column names once and the values column by column:
+    {"columns": ["date", "commits"], "data": {"date": [...], "commits": [...]}}
+    pd.DataFrame(body['data'], columns=body['columns']) reads it back.
+    """
+    names = [json.dumps(str(column)) for column in frame.columns]
+    data = ','.join('{}:{}'.format(name, _json_values(frame[column])) for name, column in zip(names, frame.columns))
+    return '{{"columns":[{}],"data":{{{}}}}}'.format(','.join(names), data)
+
+
+def to_csv(frame):
+    """
+    CSV with a header row
+    """
+    if HAVE_PYARROW:
+        pyarrow = _pyarrow()
+        sink = io.BytesIO()
+        pyarrow.csv.write_csv(pyarrow.Table.from_pandas(frame, preserve_index=False), sink)
+        return sink.getvalue()
+    return frame.to_csv(index=False)
+
+
+def _msgpack_values(series):
+    if series.dtype.kind == 'M':
+        series = series.dt.strftime('%Y-%m-%dT%H:%M:%S.%f').str[:-3]
+    elif series.dtype.kind in 'iufb':
+        return series.tolist()
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def to_msgpack(frame):
+    """
+    MessagePack map with the same layout as to_split(), dates as ISO 8601 strings
+    """
+    columns = [str(column) for column in frame.columns]
+    data = dict((str(column), _msgpack_values(frame[column])) for column in frame.columns)
+    return msgpack.packb({'columns': columns, 'data': data}, use_bin_type=True)
+
+
+def to_arrow(frame):
+    """
+    Arrow IPC stream with a single record batch, readable with pyarrow.ipc.open_stream
+    """
+    pyarrow = _pyarrow()
+    table = pyarrow.Table.from_pandas(frame, preserve_index=False)
+    sink = pyarrow.BufferOutputStream()
+    writer = pyarrow.ipc.new_stream(sink, table.schema)
+    writer.write_table(table)
+    writer.close()
+    return sink.getvalue().to_pybytes()
+
+
+FORMATS = OrderedDict((format.name, format) for format in [
+    Format('json', 'application/json', to_json),
+    Format('split', 'application/vnd.ghdata.split+json', to_split),
+    Format('csv', 'text/csv', to_csv),
+    Format('msgpack', 'application/msgpack', to_msgpack if msgpack is not None else None),
+    Format('arrow', 'application/vnd.apache.arrow.stream', to_arrow if HAVE_PYARROW else None),
+])
+
+
+def negotiate(name=None, accept=None):
+    """
+    Picks the format of a response. A format asked for by name wins over the Accept
+    header, and JSON is sent when the Accept header matches none of the formats.
+    :param name: Value of ?format=, or None
+    :param accept: werkzeug MIMEAccept of the request, or None
+    :return: Format, None if the format asked for by name isn't available
+    :raises ValueError: if there is no format with that name
+    """
+    if name is not None:
+        if name not in FORMATS:
+            raise ValueError('format must be one of: ' + ', '.join(FORMATS))
+        return FORMATS[name] if FORMATS[name].available else None
+    if accept:
+        mimetype = accept.best_match([format.mimetype for format in FORMATS.values() if format.available])
+        for format in FORMATS.values():
+            if format.mimetype == mimetype:
+                return format
+    return FORMATS['json']
+
+
+def content_encoding(accept_encodings):
+    """
+    Picks the compression of a response
+    :param accept_encodings: werkzeug Accept of the request's Accept-Encoding header
+    :return: 'gzip', 'deflate' or None
+    """
+    return accept_encodings.best_match(ENCODINGS)
+
+
+def compress(body, encoding):
+    """
+    Compresses the body of a response
+    :param body: Text or bytes
+    :param encoding: Result of content_encoding()
+    :return: (bytes, the encoding used or None if the body was too small to bother)
+    """
+    if not isinstance(body, bytes):
+        body = body.encode('utf-8')
+    if encoding is None or len(body) < MIN_COMPRESSED_SIZE:
+        return body, None
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(body) + compressor.flush(), encoding
+    return zlib.compress(body, COMPRESSION_LEVEL), encoding
@@ -1,103 +1,572 @@
 #SPDX-License-Identifier: MIT
 
-from flask import Flask, request, Response, json, send_from_directory
-from flask_cors import CORS, cross_origin
+from flask import Blueprint, Flask, current_app, request, Response, json, send_from_directory
+from flask_cors import CORS
 import os
 import sys
+import time
+import hashlib
+import inspect
 import datetime
-if (sys.version_info > (3, 0)):
-    import configparser as configparser
-else:
-    import ConfigParser as configparser
-from dateutil import parser, tz
+import itertools
+import threading
+import dateutil.parser
 import ghdata
+import ghdata.config
+import ghdata.executor
+import ghdata.cache
+import ghdata.serializers
 
 
 GHDATA_API_VERSION = 'unstable'
+# Rows read from the database at a time when streaming a response
+STREAM_CHUNK_SIZE = 5000
 
 
-def serialize(func, **args):
+def to_json(data):
     """
-    Serailizes a function that returns a dataframe
+    Serializes a dataframe as a JSON array of records, anything else is returned as is
     """
-    data = func(**args)
     if (hasattr(data, 'to_json')):
-        return data.to_json(orient='records', date_format='iso', date_unit='ms')
+        return ghdata.serializers.to_json(data)
     else:
         return data
 
 
-def flaskify_ghtorrent(flaskapp, func):
+def stream_ndjson(chunks):
     """
-    Simplifies API endpoints that just accept owner and repo,
-    serializes them and spits them out
+    Serializes an iterator of dataframes as newline delimited JSON, one chunk at a time
     """
-    def generated_function(owner, repo):
-        repoid = ghtorrent.repoid(owner=owner, repo=repo)
-        return Response(response=serialize(func, repoid=repoid),
-                status=200,
-                mimetype="application/json")
-    generated_function.__name__ = func.__name__
-    return generated_function
+    for chunk in chunks:
+        if (len(chunk)):
+            yield chunk.to_json(orient='records', lines=True, date_format='iso', date_unit='ms').rstrip('\n') + '\n'
+
+
+def stream_json(chunks):
+    """
+    Serializes an iterator of dataframes as a JSON array, one chunk at a time
+    """
+    yield '['
+    first = True
+    for chunk in chunks:
+        if (len(chunk)):
+            records = chunk.to_json(orient='records', date_format='iso', date_unit='ms')
+            yield ('' if first else ',') + records[1:-1]
+            first = False
+    yield ']'
+
+
+# Values of ?stream= and how they are sent
+STREAM_FORMATS = {
+    'ndjson': (stream_ndjson, 'application/x-ndjson'),
+    'json': (stream_json, 'application/json')
+}
+
+
+def parse_date(value):
+    """
+    Parses a date from the query string
+    """
+    return dateutil.parser.parse(value)
+
+
+def parse_summary(value):
+    """
+    Checks the kind of summary requested from the query string
+    """
+    from . import timeseries
+    if (value not in timeseries.SUMMARIES):
+        raise ValueError(value)
+    return value
+
+
+def parse_interval(value):
+    """
+    Checks the interval requested from the query string
+    """
+    from . import timeseries
+    if (value not in timeseries.INTERVALS):
+        raise ValueError(value)
+    return value
+
+
+def parse_window(value):
+    """
+    Parses a number of months from the query string
+    """
+    window = int(value)
+    if (window < 1):
+        raise ValueError(value)
+    return window
+
+
+def parse_thresholds(value):
+    """
+    Parses a comma separated list of shares between 0 and 1 from the query string
+    """
+    thresholds = tuple(float(threshold) for threshold in value.split(','))
+    if (not all(0 <= threshold < 1 for threshold in thresholds)):
+        raise ValueError(value)
+    return thresholds
+
+
+# Query string parameters passed on to the metrics that accept them,
+# and the functions used to convert them
+QUERY_PARAMETERS = {
+    'start': parse_date,
+    'end': parse_date,
+    'summary': parse_summary,
+    'interval': parse_interval,
+    'window': parse_window,
+    'thresholds': parse_thresholds
+}
+
+
+def parse_transform(value):
+    """
+    Checks the transform requested from the query string
+    """
+    from . import timeseries
+    if (value not in timeseries.TRANSFORMS):
+        raise ValueError(value)
+    return value
+
+
+def transform_args():
+    """
+    Reads the transform applied to a timeseries from the current request
+    :return: Dict of arguments to ghdata.timeseries.transform, None if no transform was requested
+    :raises ValueError: if the transform or its periods are invalid
+    """
+    from . import timeseries
+    name = request.args.get('transform')
+    periods = request.args.get('periods')
+    if (name is None):
+        return None
+    try:
+        name = parse_transform(name)
+    except ValueError:
+        raise ValueError('transform must be one of: ' + ', '.join(sorted(timeseries.TRANSFORMS)))
+    if (periods is None):
+        return {'name': name}
+    try:
+        return {'name': name, 'periods': parse_window(periods)}
+    except ValueError:
+        raise ValueError('Invalid value for periods: {}'.format(periods))
+
+
+def accepts(func, arg):
+    """
+    Checks if a function, or the function a decorator wrapped, has an argument
+    """
+    func = getattr(func, '__wrapped__', func)
+    if (sys.version_info > (3, 0)):
+        return arg in inspect.getfullargspec(func).args
+    else:
+        return arg in inspect.getargspec(func).args
+
+
+def query_args(func):
+    """
+    Reads the query string parameters a function accepts from the current request
+    :raises ValueError: if a parameter can't be converted
+    """
+    args = {}
+    for name, convert in QUERY_PARAMETERS.items():
+        value = request.args.get(name)
+        if (value is not None and accepts(func, name)):
+            try:
+                args[name] = convert(value)
+            except (ValueError, OverflowError) as e:
+                raise ValueError('Invalid value for {}: {}'.format(name, value))
+    return args
+
+
+def error_response(message, status=400):
+    """
+    Response describing an error
+    """
+    return Response(response=json.dumps({'error': message}),
+                    status=status,
+                    mimetype="application/json")
+
+
+def bad_request(message):
+    """
+    Response for requests with invalid parameters
+    """
+    return error_response(message, 400)
+
+
+def run_metric(metric, **args):
+    """
+    Runs a metric on the executor, so it can't hold on to the request past its deadline.
+    Identical requests that arrive while it runs wait for it and share its result.
+    :raises ghdata.executor.ExecutorBusy: if too many metrics are running
+    :raises ghdata.executor.QueryTimeout: if the metric didn't finish in time
+    """
+    key = ghdata.cache.make_key(metric.__name__, args.get('repoid'), args)
+    flights, executor = backends().flights, backends().executor
+    if (executor is None):
+        return flights.do(key, metric, **args)
+    return flights.do(key, executor.run, metric.__name__, metric, **args)
+
+
+def stream_metric(metric, **args):
+    """
+    Streams the chunks of a metric from the executor, under the metric's deadline. Streams aren't
+    shared between identical requests, each reads its own rows, but each holds a worker of the
+    executor until it is sent, which caps how many run at the same time. The first chunk is
+    waited for, so a metric turned away or timed out before its first rows gets an error response.
+    :return: Iterator of DataFrames
+    :raises ghdata.executor.ExecutorBusy: if too many metrics are running
+    :raises ghdata.executor.QueryTimeout: if the metric didn't produce its first chunk in time
+    """
+    executor = backends().executor
+    if (executor is None):
+        return metric(**args)
+    chunks = executor.stream(metric.__name__, metric, **args)
+    try:
+        first = next(chunks)
+    except StopIteration:
+        return iter([])
+    return itertools.chain([first], chunks)
+
+
+def timed(metric, **args):
+    """
+    Runs a metric and measures it
+    :return: (result, seconds it took)
+    """
+    started = time.time()
+    result = metric(**args)
+    return result, time.time() - started
+
+
+def start_metric(metric, **args):
+    """
+    Starts a metric on the executor without waiting for it. Identical calls in flight are joined on the
+    request thread and only the first is submitted, so the calls waiting for it don't hold workers.
+    :return: Function without arguments that waits for the metric and returns (result, seconds it took)
+    :raises ghdata.executor.ExecutorBusy: if too many metrics are running
+    """
+    key = ghdata.cache.make_key(metric.__name__, args.get('repoid'), args)
+    flights, executor = backends().flights, backends().executor
+    if (executor is None):
+        return lambda: flights.do(key, timed, metric, **args)
+    call, leader = flights.join(key)
+    timeout = executor.timeout_for(metric.__name__)
+    if (not leader):
+        def follow():
+            result = flights.wait(call, timeout)
+            if (result is ghdata.cache.MISSING):
+                raise ghdata.executor.QueryTimeout(metric.__name__, timeout)
+            return result
+        return follow
+    try:
+        pending = executor.submit(metric.__name__, flights.run, key, call, timed, metric, **args)
+    except ghdata.executor.ExecutorBusy as e:
+        flights.finish(key, call, error=e)
+        raise
+
+    def lead():
+        try:
+            return pending.result()
+        except ghdata.executor.QueryTimeout as e:
+            # A metric cancelled before it started never ends its call
+            flights.finish(key, call, error=e)
+            raise
+    return lead
+
+
+def fused_part(wait, name):
+    """
+    Waits for GHTorrent.single_table_counts of a single project and picks one metric from it
+    :return: Function without arguments that returns (the metric's result, seconds the query took)
+    """
+    def result():
+        counts, seconds = wait()
+        return counts[name].drop(columns='repoid'), seconds
+    return result
+
+
+def validators(metrics, variant=None):
+    """
+    ETag and Last-Modified of a response made from GHTorrent metrics. They only change when
+    the tables the metrics read get new rows, so they are known without running the metrics.
+    :param metrics: Names of the GHTorrent metrics in the response
+    :param variant: Format and content encoding negotiated for the response
+    :return: (etag, last modified datetime or None), None if GHTorrent can't tell when the metrics change
+    """
+    watermark = backends().ghtorrent.watermark(metrics)
+    if (watermark is None):
+        return None
+    marks, modified = watermark
+    etag = hashlib.sha1(json.dumps([request.full_path, variant, marks]).encode('utf-8')).hexdigest()
+    return etag, modified
+
+
+def not_modified(checks):
+    """
+    Answers conditional requests whose copy of the response is still current
+    :param checks: Result of validators()
+    :return: 304 response, or None if the response has to be sent
+    """
+    if (checks is None):
+        return None
+    etag, modified = checks
+    if (request.if_none_match):
+        current = request.if_none_match.contains_weak(etag)
+    elif (request.if_modified_since is not None and modified is not None):
+        since = request.if_modified_since
+        if (since.tzinfo is None):
+            since = since.replace(tzinfo=datetime.timezone.utc)
+        current = modified <= since
+    else:
+        current = False
+    if (current):
+        return cacheable(Response(status=304), checks)
+    return None
+
+
+def cacheable(response, checks):
+    """
+    Adds the ETag, Last-Modified, Cache-Control and Vary headers to a response
+    :param checks: Result of validators()
+    """
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    if (checks is not None):
+        etag, modified = checks
+        response.set_etag(etag)
+        if (modified is not None):
+            response.last_modified = modified
+        response.headers['Cache-Control'] = current_app.config['GHDATA_CACHE_CONTROL']
+    return response
+
+
+def response_format():
+    """
+    Negotiates the format of the current request's response from ?format= and the Accept header
+    :return: ghdata.serializers.Format, None if the format asked for isn't installed
+    :raises ValueError: if the format is unknown
+    """
+    return ghdata.serializers.negotiate(request.args.get('format'), request.accept_mimetypes)
+
+
+def encoded_response(body, mimetype, encoding, checks=None):
+    """
+    Response with a body compressed with the negotiated content encoding
+    :param encoding: Result of ghdata.serializers.content_encoding()
+    :param checks: Result of validators()
+    """
+    body, encoding = ghdata.serializers.compress(body, encoding)
+    response = Response(response=body,
+                        status=200,
+                        mimetype=mimetype)
+    if (encoding is not None):
+        response.headers['Content-Encoding'] = encoding
+    return cacheable(response, checks)
+
+
+def respond(data, format, encoding, checks=None):
+    """
+    Sends a metric's result in the negotiated format, results that aren't DataFrames as JSON
+    :param format: Result of response_format()
+    """
+    if (hasattr(data, 'to_json')):
+        return encoded_response(format.encode(data), format.mimetype, encoding, checks)
+    return encoded_response(data, 'application/json', encoding, checks)
+
+
+def not_acceptable():
+    """
+    Response for a format whose library isn't installed
+    """
+    available = [name for name, format in ghdata.serializers.FORMATS.items() if format.available]
+    return error_response('format must be one of: ' + ', '.join(available), 406)
+
+
+def unavailable(error):
+    """
+    Response for metrics that were turned away or timed out on the executor
+    """
+    if (isinstance(error, ghdata.executor.QueryTimeout)):
+        return error_response(str(error), 504)
+    response = error_response(str(error), 503)
+    response.headers['Retry-After'] = '5'
+    return response
 
-def flaskify(flaskapp, func):
+
+def flaskify_metric(metric, source='ghtorrent'):
     """
     Simplifies API endpoints that just accept owner and repo,
     serializes them and spits them out
+    :param metric: Name of the method to run
+    :param source: Name of the data source it belongs to, an attribute of Backends
     """
     def generated_function(owner, repo):
-        return Response(response=serialize(func, owner=owner, repo=repo),
-                status=200,
-                mimetype="application/json")
-    generated_function.__name__ = func.__name__
+        sources = backends()
+        func = getattr(getattr(sources, source), metric)
+        try:
+            args = query_args(func)
+            transform = transform_args()
+            format = response_format()
+        except ValueError as e:
+            return bad_request(str(e))
+        if (format is None):
+            return not_acceptable()
+        if (sources.warmer is not None):
+            sources.warmer.record(owner, repo, metric)
+        encoding = ghdata.serializers.content_encoding(request.accept_encodings)
+        checks = validators([metric], (format.name, encoding))
+        unchanged = not_modified(checks)
+        if (unchanged is not None):
+            return unchanged
+        if (accepts(func, 'repoid')):
+            target = {'repoid': sources.ghtorrent.repoid(owner=owner, repo=repo)}
+        else:
+            # Sources outside of GHTorrent, like PublicWWW, look the repository up by its name
+            target = {'owner': owner, 'repo': repo}
+        stream = request.args.get('stream')
+        # Summaries are a few rows per week, they aren't worth streaming, and transforms need the whole series.
+        # The other formats are sent whole.
+        if (stream is not None and 'summary' not in args and transform is None and format.name == 'json' and accepts(func, 'chunksize')):
+            if (stream not in STREAM_FORMATS):
+                return bad_request('stream must be one of: ' + ', '.join(sorted(STREAM_FORMATS)))
+            encode, mimetype = STREAM_FORMATS[stream]
+            try:
+                chunks = stream_metric(func, chunksize=STREAM_CHUNK_SIZE, **dict(target, **args))
+            except (ghdata.executor.ExecutorBusy, ghdata.executor.QueryTimeout) as e:
+                return unavailable(e)
+            return cacheable(Response(response=encode(chunks),
+                    status=200,
+                    mimetype=mimetype), checks)
+        try:
+            data = run_metric(func, **dict(target, **args))
+        except (ghdata.executor.ExecutorBusy, ghdata.executor.QueryTimeout) as e:
+            return unavailable(e)
+        if (transform is not None):
+            if ('date' not in getattr(data, 'columns', ())):
+                return bad_request('transforms only apply to timeseries')
+            from . import timeseries
+            data = timeseries.transform(data, **transform)
+        return respond(data, format, encoding, checks)
+    generated_function.__name__ = metric
     return generated_function
 
 
-app = Flask(__name__, static_url_path=os.path.abspath('static/'))
-CORS(app)
-# Flags and Initialization
+# Cache-Control header of metric responses by default, set in the HTTP section of the config
+CACHE_CONTROL = 'public, max-age=300'
 
-"""Reads the config file"""
-try:
-    # Try to open the config file and parse it
-    parser = configparser.RawConfigParser()
-    parser.read('ghdata.cfg')
-    host = parser.get('Server', 'host')
-    port = parser.get('Server', 'port')
-    try:
-        dbstr = 'mysql+pymysql://{}:{}@{}:{}/{}'.format(parser.get('Database', 'user'), parser.get('Database', 'pass'), parser.get('Database', 'host'), parser.get('Database', 'port'), parser.get('Database', 'name'))
-        ghtorrent = ghdata.GHTorrent(dbstr=dbstr)
-    except Exception as e:
-        print("Failed to connect to database (" + str(e) + ")");
-    publicwww = ghdata.PublicWWW(public_www_api_key=parser.get('PublicWWW', 'APIKey'))
-    if (parser.get('Development', 'developer') == '1' or os.getenv('FLASK_DEBUG') == '1'):
-        DEBUG = True
-    else:
-        DEBUG = False
-
-except Exception as e:
-    # Uh-oh. Save a new config file.
-    print('Failed to open config file.')
-    print('Error: ' + str(e))
-    config = configparser.RawConfigParser()
-    config.add_section('Server')
-    config.set('Server', 'host', '0.0.0.0')
-    config.set('Server', 'port', '5000')
-    config.add_section('Database')
-    config.set('Database', 'host', '127.0.0.1')
-    config.set('Database', 'port', '3306')
-    config.set('Database', 'user', 'root')
-    config.set('Database', 'pass', 'root')
-    config.set('Database', 'name', 'ghtorrent')
-    config.add_section('PublicWWW')
-    config.set('PublicWWW', 'APIKey', '0')
-    config.add_section('Development')
-    config.set('Development', 'developer', '0')
-    # Writing our configuration file to 'example.cfg'
-    with open('ghdata.cfg', 'w') as configfile:
-        config.write(configfile)
-    print('Default config saved to ghdata.cfg')
-    sys.exit()
+
+class Backends(object):
+    """
+    The data sources, cache and executor of a server process. Each is created on first use
+    from the config, so nothing connects before a preforking server has forked its workers,
+    and a process forked after they were created makes its own instead of sharing connections.
+    """
+
+    def __init__(self, parser):
+        """
+        :param parser: RawConfigParser with the config
+        """
+        self.parser = parser
+        self.__lock = threading.RLock()
+        self.__pid = os.getpid()
+        self.__created = {}
+        # pid of the process start_warmer was called in
+        self.__warming = None
+
+    def __getattr__(self, name):
+        make = getattr(type(self), 'make_' + name, None)
+        if (make is None):
+            raise AttributeError(name)
+        if (self.__pid != os.getpid()):
+            # Forked: the parent's connections, threads and locks are no use here
+            self.__lock = threading.RLock()
+            self.__created = {}
+            self.__pid = os.getpid()
+        with self.__lock:
+            if (name not in self.__created):
+                self.__created[name] = make(self)
+            return self.__created[name]
+
+    def make_cache(self):
+        parser = self.parser
+        if (not parser.has_section('Cache') or parser.get('Cache', 'enabled') != '1'):
+            return None
+        ttls = {}
+        if (parser.has_section('CacheTTL')):
+            ttls = {metric: int(ttl) for metric, ttl in parser.items('CacheTTL')}
+        return ghdata.MetricCache(max_bytes=int(parser.get('Cache', 'memory_mb')) * 1024 * 1024,
+                                  default_ttl=int(parser.get('Cache', 'ttl')),
+                                  ttls=ttls)
+
+    def make_executor(self):
+        return ghdata.MetricExecutor(**ghdata.config.executor_options(self.parser))
+
+    def make_flights(self):
+        # Metric calls in flight, identical requests share them
+        return ghdata.cache.SingleFlight()
+
+    def make_ghtorrent(self):
+        parser = self.parser
+        dbstr = ghdata.config.database_string(parser)
+        ghtorrent = ghdata.GHTorrent(dbstr=dbstr, cache=self.cache, **ghdata.config.database_options(parser))
+        if (parser.has_section('Rollups')):
+            ghtorrent.rollups.max_age = int(parser.get('Rollups', 'max_age'))
+        return ghtorrent
+
+    def make_publicwww(self):
+        return ghdata.PublicWWW(public_www_api_key=self.parser.get('PublicWWW', 'APIKey'))
+
+    def make_warmer(self):
+        # Keeps the metrics of the repositories on the watchlist cached, see the Warmer section of the config.
+        # Only the process that called start_warmer has one, the others don't create it on their requests.
+        parser = self.parser
+        if (self.__warming != os.getpid() or self.cache is None or not parser.has_section('Warmer')
+                or parser.get('Warmer', 'enabled') != '1'):
+            return None
+        return ghdata.CacheWarmer(self.ghtorrent, **ghdata.config.warmer_options(parser))
+
+    def start_warmer(self):
+        """
+        Starts the cache warmer in this process, if the config enables it. The server calls it in a
+        single process: the development server, or the designated worker of the preforking server.
+        :return: The CacheWarmer, None if it isn't enabled
+        """
+        with self.__lock:
+            self.__warming = os.getpid()
+            self.__created.pop('warmer', None)
+        warmer = self.warmer
+        if (warmer is not None):
+            warmer.start()
+        return warmer
+
+
+def backends():
+    """
+    Backends of the app handling the current request
+    """
+    return current_app.extensions['ghdata']
+
+
+# Endpoints that run a metric on the repository in their URL, create_app() adds them to the app
+METRIC_ROUTES = []
+
+
+def metric_route(rule, metric, source='ghtorrent'):
+    """
+    Registers an endpoint that runs a metric
+    :param rule: URL rule after the API version, with <owner> and <repo>
+    :param metric: Name of the method to run
+    :param source: Name of the data source it belongs to, an attribute of Backends
+    """
+    METRIC_ROUTES.append((rule, metric, source))
+
+
+# Endpoints that do more than run a metric
+api = Blueprint('api', __name__)
 
 
 
@@ -106,12 +575,189 @@ except Exception as e:
 @apiName Status
 @apiGroup Misc
 """
-@app.route('/{}/'.format(GHDATA_API_VERSION))
+@api.route('/')
 def api_root():
     """API status"""
     # @todo: When we support multiple data sources this should keep track of their status
     return """{"status": "healthy", "ghtorrent": "online"}"""
 
+"""
+@api {get} /cache Cache Statistics
+@apiName CacheStats
+@apiGroup Misc
+
+@apiSuccessExample {json} Success-Response:
+                    {
+                        "entries": 12,
+                        "bytes": 48213,
+                        "max_bytes": 268435456,
+                        "hits": 40,
+                        "misses": 12,
+                        "hit_rate": 0.77,
+                        "evictions": 0,
+                        "expirations": 3,
+                        "coalesced": 27
+                    }
+"""
+@api.route('/cache')
+def cache_stats():
+    sources = backends()
+    stats = dict(sources.cache.stats()) if sources.cache is not None else {}
+    # Requests that shared the result of an identical request in flight
+    stats['coalesced'] = sources.flights.coalesced
+    return Response(response=json.dumps(stats),
+                    status=200,
+                    mimetype="application/json")
+
+"""
+@api {get} /warmer Cache Warmer Statistics
+@apiDescription How each metric of the repositories on the watchlist was last recomputed.
+                Empty when the warmer isn't enabled, or when a preforking server's worker
+                other than the designated one answered.
+@apiName WarmerStats
+@apiGroup Misc
+
+@apiSuccessExample {json} Success-Response:
+                    [
+                        {
+                            "repo": "OSSHealth/ghdata",
+                            "metric": "commits",
+                            "requests": 31,
+                            "refreshes": 12,
+                            "refreshed_at": 1500000000.0,
+                            "seconds": 0.21,
+                            "error": null
+                        }
+                    ]
+"""
+@api.route('/warmer')
+def warmer_stats():
+    warmer = backends().warmer
+    stats = warmer.stats() if warmer is not None else []
+    return Response(response=json.dumps(stats),
+                    status=200,
+                    mimetype="application/json")
+
+"""
+@api {get} /workers Worker Health
+@apiDescription The worker processes of the preforking server: when each last sent a heartbeat, how many
+                requests it served and is serving, and whether it is stopping to be replaced. designated is
+                true for the worker running the cache warmer, current for the worker that answered. Empty when the development server is running.
+@apiName WorkerHealth
+@apiGroup Misc
+
+@apiSuccessExample {json} Success-Response:
+                    [
+                        {
+                            "pid": 4242,
+                            "started_at": 1500000000.0,
+                            "heartbeat_at": 1500000360.5,
+                            "requests": 1711,
+                            "active": 3,
+                            "state": "serving",
+                            "designated": true,
+                            "current": true
+                        }
+                    ]
+"""
+@api.route('/workers')
+def worker_stats():
+    board = current_app.extensions.get('ghdata.workers')
+    stats = board.stats() if board is not None else []
+    return Response(response=json.dumps(stats),
+                    status=200,
+                    mimetype="application/json")
+
+# Metrics the report can include, all of them GHTorrent methods that take a repoid
+REPORT_METRICS = ['commits', 'forks', 'issues', 'issues_with_close', 'issue_response_time', 'pulls', 'stargazers',
+                  'pull_acceptance_rate', 'contributors', 'contributions', 'committer_locations', 'dist_work',
+                  'reopened_issues', 'community_activity', 'contr_bre', 'contributor_diversity', 'transparency',
+                  'bus_factor']
+
+"""
+@api {get} /:owner/:repo/report Report
+@apiDescription Runs many metrics of a repository at once. The query string parameters of the
+                other endpoints, like start, end and interval, apply to the metrics that accept them.
+                A metric that fails or times out has an error instead of data, the others are still returned.
+@apiName Report
+@apiGroup Misc
+
+@apiParam {String} owner Username of the owner of the GitHub repository
+@apiParam {String} repo Name of the GitHub repository
+@apiParam {String} [metrics] Comma separated names of the metrics, e.g. commits,stargazers,contributors. All of them by default
+
+@apiSuccessExample {json} Success-Response:
+                    {
+                        "commits": {
+                            "data": [{"date": "2015-01-05T00:00:00.000Z", "commits": 153}],
+                            "seconds": 0.042,
+                            "error": null
+                        },
+                        "contributors": {
+                            "data": null,
+                            "seconds": null,
+                            "error": "contributors took longer than 30 seconds"
+                        }
+                    }
+"""
+@api.route('/<owner>/<repo>/report')
+def report(owner, repo):
+    ghtorrent, warmer = backends().ghtorrent, backends().warmer
+    names = [name.strip() for name in request.args.get('metrics', '').split(',') if name.strip()] or REPORT_METRICS
+    unknown = [name for name in names if name not in REPORT_METRICS]
+    if (unknown):
+        return bad_request('Unknown metrics: ' + ', '.join(unknown))
+    # The single-table counts are fetched together with one query
+    fused = [name for name in names if name in ghtorrent.SINGLE_TABLE_COUNTS]
+    if (len(fused) < 2):
+        fused = []
+    try:
+        args = dict((name, query_args(getattr(ghtorrent, name))) for name in names)
+        fused_args = query_args(ghtorrent.single_table_counts)
+    except ValueError as e:
+        return bad_request(str(e))
+    if (warmer is not None):
+        for name in names:
+            warmer.record(owner, repo, name)
+    encoding = ghdata.serializers.content_encoding(request.accept_encodings)
+    checks = validators(names, ('json', encoding))
+    unchanged = not_modified(checks)
+    if (unchanged is not None):
+        return unchanged
+    repoid = ghtorrent.repoid(owner=owner, repo=repo)
+    # Start every metric before waiting for any, so they run side by side
+    waits = {}
+    if (fused):
+        try:
+            shared = start_metric(ghtorrent.single_table_counts, repoids=[repoid], metrics=fused, **fused_args)
+        except ghdata.executor.ExecutorBusy as e:
+            shared = e
+        for name in fused:
+            waits[name] = shared if isinstance(shared, Exception) else fused_part(shared, name)
+    for name in names:
+        if (name in fused):
+            continue
+        try:
+            waits[name] = start_metric(getattr(ghtorrent, name), repoid=repoid, **args[name])
+        except ghdata.executor.ExecutorBusy as e:
+            waits[name] = e
+    entries = []
+    for name in names:
+        data, seconds, error = 'null', None, None
+        try:
+            if (isinstance(waits[name], Exception)):
+                raise waits[name]
+            result, seconds = waits[name]()
+            data = to_json(result)
+        except (ghdata.executor.ExecutorBusy, ghdata.executor.QueryTimeout) as e:
+            error = str(e)
+        except Exception as e:
+            current_app.logger.exception('%s failed in the report of %s/%s', name, owner, repo)
+            error = str(e)
+        entries.append('{}: {{"data": {}, "seconds": {}, "error": {}}}'.format(
+            json.dumps(name), data, json.dumps(seconds), json.dumps(error)))
+    return encoded_response('{' + ', '.join(entries) + '}', 'application/json', encoding, checks)
+
 #######################
 #     Timeseries      #
 #######################
@@ -125,6 +771,12 @@ def api_root():
 
 @apiParam {String} owner Username of the owner of the GitHub repository
 @apiParam {String} repo Name of the GitHub repository
+@apiParam {String} [start] Only include activity on or after this date, e.g. 2015-01-01
+@apiParam {String} [end] Only include activity before this date
+@apiParam {String="day","week","month","quarter","year"} [interval] Length of the periods counted, defaults to week
+@apiParam {String="moving_average","ewm","cumsum","growth"} [transform] Smooth or accumulate the series: the mean or exponentially weighted mean of the last periods rows, the running total, or the relative change from periods rows before
+@apiParam {Number} [periods] Number of rows the transform uses, defaults to 4 for the means and 1 for growth
+@apiParam {String="json","split","csv","msgpack","arrow"} [format] Format of the response, also negotiated with the Accept header: JSON records, JSON with the values column by column, CSV, MessagePack or an Arrow IPC stream
 
 @apiSuccessExample {json} Success-Response:
                     [
@@ -138,7 +790,7 @@ def api_root():
                         }
                     ]
 """
-app.route('/{}/<owner>/<repo>/timeseries/commits'.format(GHDATA_API_VERSION))(flaskify_ghtorrent(app, ghtorrent.commits))
+metric_route('/<owner>/<repo>/timeseries/commits', 'commits')
 
 """
 @api {get} /:owner/:repo/forks Forks by Week
@@ -147,6 +799,12 @@ app.route('/{}/<owner>/<repo>/timeseries/commits'.format(GHDATA_API_VERSION))(fl
 
 @apiParam {String} owner Username of the owner of the GitHub repository
 @apiParam {String} repo Name of the GitHub repository
+@apiParam {String} [start] Only include activity on or after this date, e.g. 2015-01-01
+@apiParam {String} [end] Only include activity before this date
+@apiParam {String="day","week","month","quarter","year"} [interval] Length of the periods counted, defaults to week
+@apiParam {String="moving_average","ewm","cumsum","growth"} [transform] Smooth or accumulate the series: the mean or exponentially weighted mean of the last periods rows, the running total, or the relative change from periods rows before
+@apiParam {Number} [periods] Number of rows the transform uses, defaults to 4 for the means and 1 for growth
+@apiParam {String="json","split","csv","msgpack","arrow"} [format] Format of the response, also negotiated with the Accept header: JSON records, JSON with the values column by column, CSV, MessagePack or an Arrow IPC stream
 
 @apiSuccessExample {json} Success-Response:
                     [
@@ -160,7 +818,7 @@ app.route('/{}/<owner>/<repo>/timeseries/commits'.format(GHDATA_API_VERSION))(fl
                         }
                     ]
 """
-app.route('/{}/<owner>/<repo>/timeseries/forks'.format(GHDATA_API_VERSION))(flaskify_ghtorrent(app, ghtorrent.forks))
+metric_route('/<owner>/<repo>/timeseries/forks', 'forks')
 
 """
 @api {get} /:owner/:repo/issues Issues by Week
@@ -169,6 +827,12 @@ app.route('/{}/<owner>/<repo>/timeseries/forks'.format(GHDATA_API_VERSION))(flas
 
 @apiParam {String} owner Username of the owner of the GitHub repository
 @apiParam {String} repo Name of the GitHub repository
+@apiParam {String} [start] Only include activity on or after this date, e.g. 2015-01-01
+@apiParam {String} [end] Only include activity before this date
+@apiParam {String="day","week","month","quarter","year"} [interval] Length of the periods counted, defaults to week
+@apiParam {String="moving_average","ewm","cumsum","growth"} [transform] Smooth or accumulate the series: the mean or exponentially weighted mean of the last periods rows, the running total, or the relative change from periods rows before
+@apiParam {Number} [periods] Number of rows the transform uses, defaults to 4 for the means and 1 for growth
+@apiParam {String="json","split","csv","msgpack","arrow"} [format] Format of the response, also negotiated with the Accept header: JSON records, JSON with the values column by column, CSV, MessagePack or an Arrow IPC stream
 
 @apiSuccessExample {json} Success-Response:
                     [
@@ -182,7 +846,7 @@ app.route('/{}/<owner>/<repo>/timeseries/forks'.format(GHDATA_API_VERSION))(flas
                         }
                     ]
 """
-app.route('/{}/<owner>/<repo>/timeseries/issues'.format(GHDATA_API_VERSION))(flaskify_ghtorrent(app, ghtorrent.issues))
+metric_route('/<owner>/<repo>/timeseries/issues', 'issues')
 
 """
 @api {get} /:owner/:repo/issues/response_time Issue Response Time
@@ -191,6 +855,11 @@ app.route('/{}/<owner>/<repo>/timeseries/issues'.format(GHDATA_API_VERSION))(fla
 
 @apiParam {String} owner Username of the owner of the GitHub repository
 @apiParam {String} repo Name of the GitHub repository
+@apiParam {String} [start] Only include activity on or after this date, e.g. 2015-01-01
+@apiParam {String} [end] Only include activity before this date
+@apiParam {String="ndjson","json"} [stream] Stream the rows as newline delimited JSON or as a JSON array sent in chunks
+@apiParam {String="weekly"} [summary] Return the count, mean, median, p75, p90 and max of the days to the first response per week instead of one row per issue
+@apiParam {String="json","split","csv","msgpack","arrow"} [format] Format of the response, also negotiated with the Accept header: JSON records, JSON with the values column by column, CSV, MessagePack or an Arrow IPC stream
 
 @apiSuccessExample {json} Success-Response:
                     [
@@ -204,7 +873,36 @@ app.route('/{}/<owner>/<repo>/timeseries/issues'.format(GHDATA_API_VERSION))(fla
                         }
                     ]
 """
-app.route('/{}/<owner>/<repo>/timeseries/issues/response_time'.format(GHDATA_API_VERSION))(flaskify_ghtorrent(app, ghtorrent.issue_response_time))
+metric_route('/<owner>/<repo>/timeseries/issues/response_time', 'issue_response_time')
+
+"""
+@api {get} /:owner/:repo/issues/closed Time to Close Issues
+@apiName IssuesWithClose
+@apiGroup Timeseries
+
+@apiParam {String} owner Username of the owner of the GitHub repository
+@apiParam {String} repo Name of the GitHub repository
+@apiParam {String} [start] Only include activity on or after this date, e.g. 2015-01-01
+@apiParam {String} [end] Only include activity before this date
+@apiParam {String="ndjson","json"} [stream] Stream the rows as newline delimited JSON or as a JSON array sent in chunks
+@apiParam {String="weekly"} [summary] Return the count, mean, median, p75, p90 and max of the days to close per week instead of one row per issue
+@apiParam {String="json","split","csv","msgpack","arrow"} [format] Format of the response, also negotiated with the Accept header: JSON records, JSON with the values column by column, CSV, MessagePack or an Arrow IPC stream
+
+@apiSuccessExample {json} Success-Response:
+                    [
+                        {
+                            "id": 2207340,
+                            "date": "2012-01-08T14:03:51.000Z",
+                            "days_to_close": 3
+                        },
+                        {
+                            "id": 2207524,
+                            "date": "2012-01-08T19:28:09.000Z",
+                            "days_to_close": 0
+                        }
+                    ]
+"""
+metric_route('/<owner>/<repo>/timeseries/issues/closed', 'issues_with_close')
 
 """
 @api {get} /:owner/:repo/pulls Pull Requests by Week
@@ -213,6 +911,12 @@ app.route('/{}/<owner>/<repo>/timeseries/issues/response_time'.format(GHDATA_API
 
 @apiParam {String} owner Username of the owner of the GitHub repository
 @apiParam {String} repo Name of the GitHub repository
+@apiParam {String} [start] Only include activity on or after this date, e.g. 2015-01-01
+@apiParam {String} [end] Only include activity before this date
+@apiParam {String="day","week","month","quarter","year"} [interval] Length of the periods counted, defaults to week
+@apiParam {String="moving_average","ewm","cumsum","growth"} [transform] Smooth or accumulate the series: the mean or exponentially weighted mean of the last periods rows, the running total, or the relative change from periods rows before
+@apiParam {Number} [periods] Number of rows the transform uses, defaults to 4 for the means and 1 for growth
+@apiParam {String="json","split","csv","msgpack","arrow"} [format] Format of the response, also negotiated with the Accept header: JSON records, JSON with the values column by column, CSV, MessagePack or an Arrow IPC stream
 
 @apiSuccessExample {json} Success-Response:
                     [
@@ -228,7 +932,7 @@ app.route('/{}/<owner>/<repo>/timeseries/issues/response_time'.format(GHDATA_API
                         }
                     ]
 """
-app.route('/{}/<owner>/<repo>/timeseries/pulls'.format(GHDATA_API_VERSION))(flaskify_ghtorrent(app, ghtorrent.pulls))
+metric_route('/<owner>/<repo>/timeseries/pulls', 'pulls')
 
 """
 @api {get} /:owner/:repo/stargazers Stargazers by Week
@@ -237,6 +941,12 @@ app.route('/{}/<owner>/<repo>/timeseries/pulls'.format(GHDATA_API_VERSION))(flas
 
 @apiParam {String} owner Username of the owner of the GitHub repository
 @apiParam {String} repo Name of the GitHub repository
+@apiParam {String} [start] Only include activity on or after this date, e.g. 2015-01-01
+@apiParam {String} [end] Only include activity before this date
+@apiParam {String="day","week","month","quarter","year"} [interval] Length of the periods counted, defaults to week
+@apiParam {String="moving_average","ewm","cumsum","growth"} [transform] Smooth or accumulate the series: the mean or exponentially weighted mean of the last periods rows, the running total, or the relative change from periods rows before
+@apiParam {Number} [periods] Number of rows the transform uses, defaults to 4 for the means and 1 for growth
+@apiParam {String="json","split","csv","msgpack","arrow"} [format] Format of the response, also negotiated with the Accept header: JSON records, JSON with the values column by column, CSV, MessagePack or an Arrow IPC stream
 
 @apiSuccessExample {json} Success-Response:
                     [
@@ -250,7 +960,7 @@ app.route('/{}/<owner>/<repo>/timeseries/pulls'.format(GHDATA_API_VERSION))(flas
                         }
                     ]
 """
-app.route('/{}/<owner>/<repo>/timeseries/stargazers'.format(GHDATA_API_VERSION))(flaskify_ghtorrent(app, ghtorrent.stargazers))
+metric_route('/<owner>/<repo>/timeseries/stargazers', 'stargazers')
 
 """
 @api {get} /:owner/:repo/pulls/acceptance_rate Pull Request Acceptance Rate by Week
@@ -260,6 +970,12 @@ app.route('/{}/<owner>/<repo>/timeseries/stargazers'.format(GHDATA_API_VERSION))
 
 @apiParam {String} owner Username of the owner of the GitHub repository
 @apiParam {String} repo Name of the GitHub repository
+@apiParam {String} [start] Only include activity on or after this date, e.g. 2015-01-01
+@apiParam {String} [end] Only include activity before this date
+@apiParam {String="day","week","month","quarter","year"} [interval] Length of the periods counted, defaults to day
+@apiParam {String="moving_average","ewm","cumsum","growth"} [transform] Smooth or accumulate the series: the mean or exponentially weighted mean of the last periods rows, the running total, or the relative change from periods rows before
+@apiParam {Number} [periods] Number of rows the transform uses, defaults to 4 for the means and 1 for growth
+@apiParam {String="json","split","csv","msgpack","arrow"} [format] Format of the response, also negotiated with the Accept header: JSON records, JSON with the values column by column, CSV, MessagePack or an Arrow IPC stream
 
 @apiSuccessExample {json} Success-Response:
                     [
@@ -273,7 +989,7 @@ app.route('/{}/<owner>/<repo>/timeseries/stargazers'.format(GHDATA_API_VERSION))
                         }
                     ]
 """
-app.route('/{}/<owner>/<repo>/pulls/acceptance_rate'.format(GHDATA_API_VERSION))(flaskify_ghtorrent(app, ghtorrent.pull_acceptance_rate))
+metric_route('/<owner>/<repo>/pulls/acceptance_rate', 'pull_acceptance_rate')
 
 # Contribution Trends
 """
@@ -283,6 +999,8 @@ app.route('/{}/<owner>/<repo>/pulls/acceptance_rate'.format(GHDATA_API_VERSION))
 
 @apiParam {String} owner Username of the owner of the GitHub repository
 @apiParam {String} repo Name of the GitHub repository
+@apiParam {String="ndjson","json"} [stream] Stream the rows as newline delimited JSON or as a JSON array sent in chunks
+@apiParam {String="json","split","csv","msgpack","arrow"} [format] Format of the response, also negotiated with the Accept header: JSON records, JSON with the values column by column, CSV, MessagePack or an Arrow IPC stream
 
 @apiSuccessExample {json} Success-Response:
                    [
@@ -308,7 +1026,7 @@ app.route('/{}/<owner>/<repo>/pulls/acceptance_rate'.format(GHDATA_API_VERSION))
                         }
                     ]
 """
-app.route('/{}/<owner>/<repo>/contributors'.format(GHDATA_API_VERSION))(flaskify_ghtorrent(app, ghtorrent.contributors))
+metric_route('/<owner>/<repo>/contributors', 'contributors')
 
 #######################
 # Contribution Trends #
@@ -321,7 +1039,13 @@ app.route('/{}/<owner>/<repo>/contributors'.format(GHDATA_API_VERSION))(flaskify
 
 @apiParam {String} owner Username of the owner of the GitHub repository
 @apiParam {String} repo Name of the GitHub repository
+@apiParam {String} [start] Only include activity on or after this date, e.g. 2015-01-01
+@apiParam {String} [end] Only include activity before this date
+@apiParam {String="day","week","month","quarter","year"} [interval] Length of the periods counted, defaults to day
+@apiParam {String="moving_average","ewm","cumsum","growth"} [transform] Smooth or accumulate the series: the mean or exponentially weighted mean of the last periods rows, the running total, or the relative change from periods rows before
+@apiParam {Number} [periods] Number of rows the transform uses, defaults to 4 for the means and 1 for growth
 @apiParam (String) user Limit results to the given user's contributions
+@apiParam {String="json","split","csv","msgpack","arrow"} [format] Format of the response, also negotiated with the Accept header: JSON records, JSON with the values column by column, CSV, MessagePack or an Arrow IPC stream
 
 @apiSuccessExample {json} Success-Response:
                    [
@@ -345,18 +1069,34 @@ app.route('/{}/<owner>/<repo>/contributors'.format(GHDATA_API_VERSION))(flaskify
                         }
                     ]
 """
-@app.route('/{}/<owner>/<repo>/contributions'.format(GHDATA_API_VERSION))
+@api.route('/<owner>/<repo>/contributions')
 def contributions(owner, repo):
+    ghtorrent, warmer = backends().ghtorrent, backends().warmer
+    try:
+        args = query_args(ghtorrent.contributions)
+        format = response_format()
+    except ValueError as e:
+        return bad_request(str(e))
+    if (format is None):
+        return not_acceptable()
+    if (warmer is not None):
+        warmer.record(owner, repo, 'contributions')
+    encoding = ghdata.serializers.content_encoding(request.accept_encodings)
+    checks = validators(['contributions'], (format.name, encoding))
+    unchanged = not_modified(checks)
+    if (unchanged is not None):
+        return unchanged
     repoid = ghtorrent.repoid(owner=owner, repo=repo)
     user = request.args.get('user')
-    if (user):
-        userid = ghtorrent.userid(username=user)
-        contribs = ghtorrent.contributions(repoid=repoid, userid=userid)
-    else:
-        contribs = ghtorrent.contributions(repoid=repoid)
-    return Response(response=contribs,
-                    status=200,
-                    mimetype="application/json")
+    try:
+        if (user):
+            userid = ghtorrent.userid(username=user)
+            contribs = run_metric(ghtorrent.contributions, repoid=repoid, userid=userid, **args)
+        else:
+            contribs = run_metric(ghtorrent.contributions, repoid=repoid, **args)
+    except (ghdata.executor.ExecutorBusy, ghdata.executor.QueryTimeout) as e:
+        return unavailable(e)
+    return respond(contribs, format, encoding, checks)
 
 # Diversity
 
@@ -367,6 +1107,8 @@ def contributions(owner, repo):
 
 @apiParam {String} owner Username of the owner of the GitHub repository
 @apiParam {String} repo Name of the GitHub repository
+@apiParam {String="ndjson","json"} [stream] Stream the rows as newline delimited JSON or as a JSON array sent in chunks
+@apiParam {String="json","split","csv","msgpack","arrow"} [format] Format of the response, also negotiated with the Accept header: JSON records, JSON with the values column by column, CSV, MessagePack or an Arrow IPC stream
 
 @apiSuccessExample {json} Success-Response:
                     [
@@ -382,7 +1124,7 @@ def contributions(owner, repo):
                         }
                     ]
 """
-app.route('/{}/<owner>/<repo>/commits/locations'.format(GHDATA_API_VERSION))(flaskify_ghtorrent(app, ghtorrent.committer_locations))
+metric_route('/<owner>/<repo>/commits/locations', 'committer_locations')
 
 # Popularity
 """
@@ -406,44 +1148,130 @@ app.route('/{}/<owner>/<repo>/commits/locations'.format(GHDATA_API_VERSION))(fla
                         }
                     ]
 """
-app.route('/{}/<owner>/<repo>/timeseries/bus_factor'.format(GHDATA_API_VERSION))(flaskify_ghtorrent(ghtorrent, ghtorrent.bus_factor))
-app.route('/{}/<owner>/<repo>/linking_websites'.format(GHDATA_API_VERSION))(flaskify_ghtorrent(app, publicwww.linking_websites))
+metric_route('/<owner>/<repo>/linking_websites', 'linking_websites', source='publicwww')
+
+"""
+@api {get} /:owner/:repo/timeseries/bus_factor Bus Factor by Month
+@apiDescription For each month, the number of committers who made more than a threshold share of the commits in the trailing window of months ending with it
+@apiName BusFactor
+@apiGroup Timeseries
+
+@apiParam {String} owner Username of the owner of the GitHub repository
+@apiParam {String} repo Name of the GitHub repository
+@apiParam {String} [start] Only include months on or after this date, e.g. 2015-01-01
+@apiParam {String} [end] Only include commits before this date
+@apiParam {Number} [window=12] Number of months in the trailing window
+@apiParam {String} [thresholds=0.2] Comma separated shares of the window's commits a committer needs to count, e.g. 0.2,0.5
+@apiParam {String="moving_average","ewm","cumsum","growth"} [transform] Smooth or accumulate the series: the mean or exponentially weighted mean of the last periods rows, the running total, or the relative change from periods rows before
+@apiParam {Number} [periods] Number of rows the transform uses, defaults to 4 for the means and 1 for growth
+@apiParam {String="json","split","csv","msgpack","arrow"} [format] Format of the response, also negotiated with the Accept header: JSON records, JSON with the values column by column, CSV, MessagePack or an Arrow IPC stream
+
+@apiSuccessExample {json} Success-Response:
+                    [
+                        {
+                            "date": "2015-01-01T00:00:00.000Z",
+                            "threshold": 0.2,
+                            "bus_factor": 2
+                        },
+                        {
+                            "date": "2015-02-01T00:00:00.000Z",
+                            "threshold": 0.2,
+                            "bus_factor": 1
+                        }
+                    ]
+"""
+metric_route('/<owner>/<repo>/timeseries/bus_factor', 'bus_factor')
 #Jordan's Endpoint
-app.route('/{}/<owner>/<repo>/timeseries/community_activity'.format(GHDATA_API_VERSION))(flaskify_ghtorrent(ghtorrent, ghtorrent.community_activity))
+metric_route('/<owner>/<repo>/timeseries/community_activity', 'community_activity')
 #Adam
-app.route('/{}/<owner>/<repo>/timeseries/contr_bre'.format(GHDATA_API_VERSION))(flaskify_ghtorrent(ghtorrent, ghtorrent.contr_bre))
-app.route('/{}/<owner>/<repo>/timeseries/contributor_diversity'.format(GHDATA_API_VERSION))(flaskify_ghtorrent(ghtorrent, ghtorrent.contributor_diversity))
+metric_route('/<owner>/<repo>/timeseries/contr_bre', 'contr_bre')
+metric_route('/<owner>/<repo>/timeseries/contributor_diversity', 'contributor_diversity')
 #Zandria's Endpoint
-app.route('/{}/<owner>/<repo>/timeseries/reopened_issues'.format(GHDATA_API_VERSION))(flaskify_ghtorrent(ghtorrent, ghtorrent.reopened_issues))
-app.route('/{}/<owner>/<repo>/timeseries/dist_work'.format(GHDATA_API_VERSION))(flaskify_ghtorrent(ghtorrent, ghtorrent.dist_work))
-app.route('/{}/<owner>/<repo>/timeseries/transparency'.format(GHDATA_API_VERSION))(flaskify_ghtorrent(ghtorrent, ghtorrent.transparency))
+metric_route('/<owner>/<repo>/timeseries/reopened_issues', 'reopened_issues')
+metric_route('/<owner>/<repo>/timeseries/dist_work', 'dist_work')
+metric_route('/<owner>/<repo>/timeseries/transparency', 'transparency')
 
 
 
-if (DEBUG):
-    print(" * Serving static routes")
-    # Serve the front-end files in debug mode to make it easier for developers to work on the interface
-    # @todo: Figure out why this isn't working.
-    @app.route('/')
-    def index():
-        root_dir = os.path.dirname(os.getcwd())
-        print(root_dir + '/ghdata/static')
-        return send_from_directory(root_dir + '/ghdata/ghdata/static', 'index.html')
+# Serve the front-end files in debug mode to make it easier for developers to work on the interface
+# @todo: Figure out why this isn't working.
+def index():
+    root_dir = os.path.dirname(os.getcwd())
+    print(root_dir + '/ghdata/static')
+    return send_from_directory(root_dir + '/ghdata/ghdata/static', 'index.html')
 
-    @app.route('/scripts/<path>')
-    def send_scripts(path):
-        root_dir = os.path.dirname(os.getcwd())
-        return send_from_directory(root_dir + '/ghdata/ghdata/static/scripts', path)
+def send_scripts(path):
+    root_dir = os.path.dirname(os.getcwd())
+    return send_from_directory(root_dir + '/ghdata/ghdata/static/scripts', path)
 
-    @app.route('/styles/<path>')
-    def send_styles(path):
-        root_dir = os.path.dirname(os.getcwd())
-        return send_from_directory(root_dir+ '/ghdata/ghdata/static/styles', path)
+def send_styles(path):
+    root_dir = os.path.dirname(os.getcwd())
+    return send_from_directory(root_dir+ '/ghdata/ghdata/static/styles', path)
 
-    app.debug = True
 
-def run():
-    app.run(host=host, port=int(port), debug=DEBUG)
+def create_app(config=None):
+    """
+    Creates the Flask app serving the API. Only the config is read: the database engines, cache
+    and executor are created by each process when it first needs them, so the app can be created
+    before a preforking server forks its workers. `flask run` finds it with FLASK_APP=ghdata.server.
+    :param config: Path of the config file or a RawConfigParser, ghdata.cfg by default
+    :return: Flask app
+    """
+    if (config is None or not hasattr(config, 'has_option')):
+        parser = ghdata.config.read_config(config or 'ghdata.cfg')
+    else:
+        parser = config
+    app = Flask(__name__, static_url_path=os.path.abspath('static/'))
+    CORS(app)
+    app.config['GHDATA_CACHE_CONTROL'] = CACHE_CONTROL
+    if (parser.has_option('HTTP', 'cache_control')):
+        app.config['GHDATA_CACHE_CONTROL'] = parser.get('HTTP', 'cache_control')
+    app.extensions['ghdata'] = Backends(parser)
+    app.register_blueprint(api, url_prefix='/' + GHDATA_API_VERSION)
+    for rule, metric, source in METRIC_ROUTES:
+        app.add_url_rule('/' + GHDATA_API_VERSION + rule, metric, flaskify_metric(metric, source))
+    developer = parser.has_option('Development', 'developer') and parser.get('Development', 'developer') == '1'
+    if (developer or os.getenv('FLASK_DEBUG') == '1'):
+        print(" * Serving static routes")
+        app.add_url_rule('/', 'index', index)
+        app.add_url_rule('/scripts/<path>', 'send_scripts', send_scripts)
+        app.add_url_rule('/styles/<path>', 'send_styles', send_styles)
+        app.debug = True
+    return app
+
+
+def run(config='ghdata.cfg', host=None, port=None, **options):
+    """
+    Runs the server: the preforking server if the Server section of the config or options set
+    workers, Flask's development server otherwise
+    :param config: Path of the config file, a default one is written if it has no Server section
+    :param host: Address to listen on, overrides the config
+    :param port: Port to listen on, overrides the config
+    :param options: Keyword arguments for ghdata.prefork.PreforkServer, override the config
+    """
+    parser = ghdata.config.read_config(config)
+    if (not parser.has_section('Server')):
+        # Uh-oh. Save a new config file.
+        print('Failed to open config file.')
+        ghdata.config.write_default(config)
+        print('Default config saved to ' + config)
+        sys.exit()
+    host = host or parser.get('Server', 'host')
+    port = int(port or parser.get('Server', 'port'))
+    options = dict(ghdata.config.server_options(parser), **dict((option, value) for option, value in options.items() if value is not None))
+    if (options.get('workers')):
+        from .prefork import PreforkServer
+        # Imported once by the master, so the workers share it instead of each importing it on its first request
+        from . import ghtorrent, timeseries
+        # A single worker warms its cache, instead of every worker recomputing the same metrics
+        PreforkServer(lambda: create_app(config), host=host, port=port,
+                      designate=lambda app: app.extensions['ghdata'].start_warmer(), **options).run()
+        return
+    app = create_app(parser)
+    if (not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        # With the reloader, the process serving requests is the one it starts
+        app.extensions['ghdata'].start_warmer()
+    app.run(host=host, port=port, debug=app.debug)
 
 if __name__ == '__main__':
     run()
@@ -0,0 +1,135 @@
+#SPDX-License-Identifier: MIT
+import os
+import json
+import shutil
+import datetime
+import pandas as pd
+import sqlalchemy as s
+
+from . import schema
+
+
+# Number of user ids sent to the database in a single query
+USER_CHUNK_SIZE = 1000
+
+# Columns of the extracted tables that refer to users
+USER_COLUMNS = {
+    'projects': ['owner_id'],
+    'forks': ['owner_id'],
+    'commits': ['author_id', 'committer_id'],
+    'commit_comments': ['user_id'],
+    'watchers': ['user_id'],
+    'issues': ['reporter_id'],
+    'issue_events': ['actor_id'],
+    'issue_comments': ['user_id'],
+    'pull_request_history': ['actor_id'],
+    'pull_request_comments': ['user_id'],
+    'project_members': ['user_id'],
+}
+
+
+def snapshot_path(directory, owner, repo):
+    """
+    Directory a repository's snapshot is stored in
+    """
+    return os.path.join(directory, owner.lower(), repo.lower())
+
+
+def queries(repoid):
+    """
+    Queries selecting every GHTorrent row a project's metrics read, except users
+    :param repoid: The id of the project in the projects table
+    :return: Dict of snapshot table name to select
+    """
+    repoid = int(repoid)
+    projects, project_commits, commits = schema.projects, schema.project_commits, schema.commits
+    issues, pull_requests = schema.issues, schema.pull_requests
+    commit_ids = s.select(project_commits.c.commit_id).where(project_commits.c.project_id == repoid)
+    issue_ids = s.select(issues.c.id).where(issues.c.repo_id == repoid)
+    pull_ids = s.select(pull_requests.c.id).where(s.or_(pull_requests.c.base_repo_id == repoid,
+                                                        pull_requests.c.head_repo_id == repoid))
+    return {
+        'projects': s.select(projects).where(projects.c.id == repoid),
+        'forks': s.select(projects).where(projects.c.forked_from == repoid),
+        'project_commits': s.select(project_commits).where(project_commits.c.project_id == repoid),
+        'commits': s.select(commits).where(s.or_(commits.c.id.in_(commit_ids), commits.c.project_id == repoid)),
+        'commit_comments': s.select(schema.commit_comments).where(schema.commit_comments.c.commit_id.in_(commit_ids)),
+        'watchers': s.select(schema.watchers).where(schema.watchers.c.repo_id == repoid),
+        'issues': s.select(issues).where(issues.c.repo_id == repoid),
+        'issue_events': s.select(schema.issue_events).where(schema.issue_events.c.issue_id.in_(issue_ids)),
+        'issue_comments': s.select(schema.issue_comments).where(schema.issue_comments.c.issue_id.in_(issue_ids)),
+        'pull_requests': s.select(pull_requests).where(pull_requests.c.id.in_(pull_ids)),
+        'pull_request_history': s.select(schema.pull_request_history).where(schema.pull_request_history.c.pull_request_id.in_(pull_ids)),
+        'pull_request_comments': s.select(schema.pull_request_comments).where(schema.pull_request_comments.c.pull_request_id.in_(pull_ids)),
+        'project_members': s.select(schema.project_members).where(schema.project_members.c.repo_id == repoid),
+    }
+
+
+def extract(engine, repoid):
+    """
+    Reads every GHTorrent row a project's metrics need
+    :param engine: SQLAlchemy engine for the GHTorrent database
+    :param repoid: The id of the project in the projects table
+    :return: Dict of snapshot table name to DataFrame
+    """
+    tables = {}
+    with engine.connect() as conn:
+        for name, query in queries(repoid).items():
+            tables[name] = pd.read_sql(query, conn)
+        userids = set()
+        for name, columns in USER_COLUMNS.items():
+            for column in columns:
+                userids.update(int(userid) for userid in tables[name][column].dropna())
+        userids = sorted(userids)
+        users, members = [], []
+        for i in range(0, len(userids), USER_CHUNK_SIZE):
+            chunk = userids[i:i + USER_CHUNK_SIZE]
+            users.append(pd.read_sql(s.select(schema.users).where(schema.users.c.id.in_(chunk)), conn))
+            members.append(pd.read_sql(s.select(schema.organization_members)
+                                        .where(schema.organization_members.c.user_id.in_(chunk)), conn))
+    tables['users'] = pd.concat(users, ignore_index=True) if users else pd.DataFrame(columns=[c.name for c in schema.users.c])
+    tables['organization_members'] = pd.concat(members, ignore_index=True) if members else \
+        pd.DataFrame(columns=[c.name for c in schema.organization_members.c])
+    return tables
+
+
+def snapshot(ghtorrent, owner, repo, directory, compression='zstd'):
+    """
+    Writes a repository's GHTorrent rows to Parquet files that OfflineGHTorrent reads.
+    Needs pyarrow. An existing snapshot of the repository is replaced once the new one is complete.
+    :param ghtorrent: GHTorrent instance to read from
+    :param owner: The username of the project's owner
+    :param repo: The name of the repository
+    :param directory: Directory holding the snapshots, one subdirectory per repository
+    :param compression: Parquet compression codec
+    :return: The snapshot's manifest
+    """
+    repoid = ghtorrent.repoid(owner, repo)
+    if not repoid:
+        raise ValueError('{}/{} is not in GHTorrent'.format(owner, repo))
+    path = snapshot_path(directory, owner, repo)
+    building = path + '.building'
+    if os.path.exists(building):
+        shutil.rmtree(building)
+    os.makedirs(building)
+    manifest = {
+        'owner': owner,
+        'repo': repo,
+        'repoid': int(repoid),
+        'created_at': datetime.datetime.utcnow().isoformat(),
+        'rows': {}
+    }
+    for name, frame in extract(ghtorrent.router.engine(), repoid).items():
+        frame.to_parquet(os.path.join(building, name + '.parquet'), compression=compression, index=False)
+        manifest['rows'][name] = len(frame)
+    with open(os.path.join(building, 'snapshot.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    # Swap the new snapshot in, readers notice the new manifest and reload
+    if os.path.exists(path):
+        old = path + '.old'
+        os.rename(path, old)
+        os.rename(building, path)
+        shutil.rmtree(old)
+    else:
+        os.rename(building, path)
+    return manifest
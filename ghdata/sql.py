@@ -0,0 +1,52 @@
+#SPDX-License-Identifier: MIT
+import sqlalchemy as s
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+
+# Date functions the metric queries use, compiled to each database's dialect.
+# Unknown dialects get the standard SQL form, which PostgreSQL and DuckDB share.
+
+class date_of(FunctionElement):
+    """
+    The date part of a datetime
+    """
+    type = s.Date()
+    name = 'date_of'
+    inherit_cache = True
+
+
+class days_between(FunctionElement):
+    """
+    Whole days from the date of the second datetime to the date of the first, like MySQL's DATEDIFF
+    """
+    type = s.Integer()
+    name = 'days_between'
+    inherit_cache = True
+
+
+def _arguments(element, compiler, **kw):
+    return [compiler.process(argument, **kw) for argument in element.clauses]
+
+
+@compiles(date_of)
+def _date_of(element, compiler, **kw):
+    return 'CAST({} AS DATE)'.format(*_arguments(element, compiler, **kw))
+
+@compiles(date_of, 'mysql')
+@compiles(date_of, 'sqlite')
+def _date_of_function(element, compiler, **kw):
+    return 'DATE({})'.format(*_arguments(element, compiler, **kw))
+
+
+@compiles(days_between)
+def _days_between(element, compiler, **kw):
+    return '(CAST({} AS DATE) - CAST({} AS DATE))'.format(*_arguments(element, compiler, **kw))
+
+@compiles(days_between, 'mysql')
+def _days_between_mysql(element, compiler, **kw):
+    return 'DATEDIFF({}, {})'.format(*_arguments(element, compiler, **kw))
+
+@compiles(days_between, 'sqlite')
+def _days_between_sqlite(element, compiler, **kw):
+    return 'CAST(JULIANDAY(DATE({})) - JULIANDAY(DATE({})) AS INTEGER)'.format(*_arguments(element, compiler, **kw))
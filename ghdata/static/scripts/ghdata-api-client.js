@@ -91,6 +91,15 @@ GHDataAPIClient.prototype.get = function (endpoint, params) {
  * Wrap all the API endpoints to make it as simple as possible
 --------------------------------------------------------------*/
 
+/**
+ * Many metrics in one request
+ * @param {Array} metrics - Names of the metrics, e.g. ['commits', 'stargazers']
+ * @returns {Promise} Resolves with an object of metric name to {data, seconds, error}
+ */
+GHDataAPIClient.prototype.report = function (metrics) {
+  return this.get('report?metrics=' + metrics.map(encodeURIComponent).join(','));
+};
+
 /**
  * Commits timeseries
  * @param {Object} params - Query string params to pass to the API
@@ -24,8 +24,19 @@ GHDataReport.prototype.getParameterByName = function(name, url) {
 GHDataReport.prototype.buildReport = function () {
   if (this.api.owner && this.api.repo) {
     document.getElementById('repo-label').innerHTML = this.api.owner + ' / ' + this.api.repo;
+    // Fetch every chart's metric in one request
+    var report = this.api.report(['commits', 'stargazers', 'forks', 'issues', 'pulls', 'dist_work', 'reopened_issues',
+                                  'community_activity', 'contr_bre', 'contributor_diversity', 'transparency', 'bus_factor']);
+    var metric = function (name) {
+      return report.then(function (metrics) {
+        if (metrics[name].error) {
+          throw new Error(name + ': ' + metrics[name].error);
+        }
+        return metrics[name].data;
+      });
+    };
     // Commits
-    this.api.commitsByWeek().then(function (commits) {
+    metric('commits').then(function (commits) {
       MG.data_graphic({
         title: "Commits/Week",
         data: MG.convert.date(commits, 'date', '%Y-%m-%dT%H:%M:%S.%LZ'),
@@ -41,7 +52,7 @@ GHDataReport.prototype.buildReport = function () {
     });
 
     // Stargazers
-    this.api.stargazersByWeek().then(function (stargazers) {
+    metric('stargazers').then(function (stargazers) {
       MG.data_graphic({
         title: "Stars/Week",
         data: MG.convert.date(stargazers, 'date', '%Y-%m-%dT%H:%M:%S.%LZ'),
@@ -57,7 +68,7 @@ GHDataReport.prototype.buildReport = function () {
     });
 
     // Forks
-    this.api.forksByWeek().then(function (forks) {
+    metric('forks').then(function (forks) {
       MG.data_graphic({
         title: "Forks/Week",
         data: MG.convert.date(forks, 'date', '%Y-%m-%dT%H:%M:%S.%LZ'),
@@ -73,7 +84,7 @@ GHDataReport.prototype.buildReport = function () {
     });
 
     // Issues
-    this.api.issuesByWeek().then(function (issues) {
+    metric('issues').then(function (issues) {
       MG.data_graphic({
         title: "Issues/Week",
         data: MG.convert.date(issues, 'date', '%Y-%m-%dT%H:%M:%S.%LZ'),
@@ -89,7 +100,7 @@ GHDataReport.prototype.buildReport = function () {
     });
 
     // Pull Requests
-    this.api.pullRequestsByWeek().then(function (pulls) {
+    metric('pulls').then(function (pulls) {
       MG.data_graphic({
         title: "Pull Requests/Week",
         data: MG.convert.date(pulls, 'date', '%Y-%m-%dT%H:%M:%S.%LZ'),
@@ -106,7 +117,7 @@ GHDataReport.prototype.buildReport = function () {
 	
 	//Our code begins here!!! 
 
-	this.api.dist_work().then(function (dist_work) {
+	metric('dist_work').then(function (dist_work) {
 	   MG.data_graphic({
     	  title: "Distribution Of Work/Year",
     	  data: MG.convert.date(dist_work, 'date', '%Y-%m-%dT%H:%M:%S.%LZ'),
@@ -121,7 +132,7 @@ GHDataReport.prototype.buildReport = function () {
      });
    });
     
-   this.api.reopened_issues().then(function (reopened_issues) {
+   metric('reopened_issues').then(function (reopened_issues) {
      MG.data_graphic({
       title: "Reopened Issues/Month",
       data: MG.convert.date(reopened_issues, 'date', '%Y-%m-%dT%H:%M:%S.%LZ'),
@@ -136,7 +147,7 @@ GHDataReport.prototype.buildReport = function () {
   });
        
 	//Community Activity
-	this.api.community_activity().then(function (community_activity) {
+	metric('community_activity').then(function (community_activity) {
 	  MG.data_graphic({
         title: "Community Activity/Month",
         data: MG.convert.date(community_activity, 'date', '%Y-%m-%dT%H:%M:%S.%LZ'),
@@ -151,7 +162,7 @@ GHDataReport.prototype.buildReport = function () {
     });
 	
 	// Contributor Breadth
-	this.api.contr_bre().then(function (contr_bre) {
+	metric('contr_bre').then(function (contr_bre) {
 	MG.data_graphic({
         	title: "Non-Core Contributors/Project",
 		data: contr_bre,
@@ -167,7 +178,7 @@ GHDataReport.prototype.buildReport = function () {
     });
 
 	//Contributor Diversity
-	this.api.contributor_diversity().then(function (contributor_diversity) {
+	metric('contributor_diversity').then(function (contributor_diversity) {
 		MG.data_graphic({
               title: "Contributor Diversity/Project",
               data: contributor_diversity,
@@ -183,7 +194,7 @@ GHDataReport.prototype.buildReport = function () {
     });
 
 	  	//transparency
-	this.api.transparency().then(function (transparency) {
+	metric('transparency').then(function (transparency) {
 	console.log(transparency);
 	MG.data_graphic({
         title: "Transparency",
@@ -199,15 +210,15 @@ GHDataReport.prototype.buildReport = function () {
     });
 
 	  	//bus_factor
-	this.api.bus_factor().then(function (bus_factor) {
+	metric('bus_factor').then(function (bus_factor) {
 	  MG.data_graphic({
         title: "Bus Factor",
-        data: [{'date': new Date(), 'value': bus_factor[0].bus_factor}],
-        least_squares: true,
+        data: MG.convert.date(bus_factor, 'date', '%Y-%m-%dT%H:%M:%S.%LZ'),
         full_width: true,
         height: 200,
 	width: 400,
-	point_size: 5,
+        x_accessor: 'date',
+        y_accessor: 'bus_factor',
         target: '#bus_factor'
       });
 	
@@ -0,0 +1,284 @@
+#SPDX-License-Identifier: MIT
+import numpy as np
+import pandas as pd
+
+
+# Values of the summary argument of the per-issue metrics
+SUMMARIES = ('weekly',)
+
+# Defaults of the bus factor's trailing window in months and the shares of its commits a committer needs
+BUS_FACTOR_WINDOW = 12
+BUS_FACTOR_THRESHOLDS = (0.2,)
+
+# Values of the interval argument of the timeseries metrics, and the pandas period each stands for.
+# Weeks start on Monday, like the rollups.
+INTERVALS = {
+    'day': 'D',
+    'week': 'W-SUN',
+    'month': 'M',
+    'quarter': 'Q',
+    'year': 'Y'
+}
+
+# Transforms that can be applied to any timeseries, and the number of periods each uses by default
+TRANSFORMS = {
+    'moving_average': 4,
+    'ewm': 4,
+    'cumsum': None,
+    'growth': 1
+}
+
+# Columns that identify a separate series within a timeseries, like the repoid of the *_many metrics
+SERIES_COLUMNS = ('repoid', 'issue_id', 'threshold')
+
+# Numeric columns that are ids rather than values, transforms leave them as they are
+ID_COLUMNS = ('project_id', 'user_id', 'id')
+
+
+def interval_start(dates, interval):
+    """
+    Returns the start of the interval each date falls in
+    :param dates: Series of datetimes
+    :param interval: One of INTERVALS
+    :return: Series of datetimes at midnight
+    """
+    if interval not in INTERVALS:
+        raise ValueError('interval must be one of {}'.format(', '.join(sorted(INTERVALS))))
+    return pd.to_datetime(pd.Series(dates)).dt.to_period(INTERVALS[interval]).dt.start_time
+
+
+def drop_first_interval(frame, interval='week', by=(), column='date', firsts=None):
+    """
+    Leaves out the rows dated in the first interval of a daily timeseries, or of every series in it
+    :param frame: DataFrame with one row per day, or per day and by columns
+    :param interval: One of INTERVALS
+    :param by: Column identifying separate series in the frame, e.g. repoid
+    :param column: The date column
+    :param firsts: When the frame holds only part of the series, e.g. from a start date on, the date the whole
+                   series starts on: a datetime, or with by a dict of the by column's values to datetimes.
+                   Nothing is left out of a series whose first interval isn't in the frame.
+    :return: DataFrame without those rows
+    """
+    if frame.empty:
+        return frame.reset_index(drop=True)
+    starts = interval_start(frame[column], interval)
+    starts.index = frame.index
+    by = list(by)
+    if firsts is None:
+        first = starts.groupby([frame[name] for name in by]).transform('min') if by else starts.min()
+    elif by:
+        first = interval_start(frame[by[0]].map(firsts), interval)
+        first.index = frame.index
+    else:
+        first = interval_start([firsts], interval).iloc[0]
+    return frame[starts > first].reset_index(drop=True)
+
+
+def resample(frame, interval, by=(), aggregations=None, ratios=None, total=None, column='date'):
+    """
+    Resamples a daily timeseries to a coarser interval. Counts are summed, an interval
+    with nothing but missing values for a count stays missing.
+    :param frame: DataFrame with one row per day, or per day and by columns
+    :param interval: One of INTERVALS
+    :param by: Columns identifying separate series in the frame, e.g. repoid
+    :param aggregations: Dict of column to the pandas aggregation used instead of a sum, e.g. 'first'
+    :param ratios: Dict of column to (numerator, denominator), recomputed from the summed columns, which are then dropped
+    :param total: Column recomputed as the sum of the counts, missing when any of them is
+    :param column: The date column
+    :return: DataFrame with the same columns, one row per interval with data, sorted by date
+    """
+    by = list(by)
+    aggregations = aggregations or {}
+    ratios = ratios or {}
+    buckets = frame.assign(**{column: interval_start(frame[column], interval).values})
+    grouped = buckets.groupby(by + [column], sort=True)
+    ignored = set(by + [column] + list(aggregations) + list(ratios))
+    sums = [name for name in frame.columns if name not in ignored]
+    parts = [grouped[sums].sum(min_count=1)]
+    if aggregations:
+        parts.append(grouped.agg(aggregations))
+    result = pd.concat(parts, axis=1).reset_index()
+    for name, (numerator, denominator) in ratios.items():
+        result[name] = result[numerator] / result[denominator]
+    if total is not None:
+        counts = [name for name in sums if name != total]
+        result[total] = result[counts].sum(axis=1, min_count=len(counts))
+    dropped = set(numerator for numerator, denominator in ratios.values()) | \
+              set(denominator for numerator, denominator in ratios.values())
+    return result[[name for name in frame.columns if name not in dropped]]
+
+
+def transform(frame, name, periods=None, column='date'):
+    """
+    Applies a transform to every numeric column of a timeseries. Periods are rows of the
+    series, so a period without activity, which has no row, is skipped rather than counted as 0.
+    :param frame: DataFrame with a date column, e.g. a cached metric result, which is left unchanged
+    :param name: One of TRANSFORMS. moving_average and ewm are the mean of, or exponentially weighted
+                 mean with a span of, the last periods rows, cumsum is the running total and growth
+                 is the relative change from periods rows before
+    :param periods: Number of rows the transform uses, the default in TRANSFORMS if not given
+    :param column: The date column
+    :return: DataFrame with the same columns, sorted by date within every series
+    """
+    if name not in TRANSFORMS:
+        raise ValueError('transform must be one of {}'.format(', '.join(sorted(TRANSFORMS))))
+    if column not in frame.columns:
+        raise ValueError('transforms only apply to timeseries')
+    periods = periods or TRANSFORMS[name]
+    by = [key for key in SERIES_COLUMNS if key in frame.columns]
+    values = [key for key in frame.columns
+              if key != column and key not in by and key not in ID_COLUMNS and frame[key].dtype.kind in 'fiu']
+    frame = frame.sort_values(by + [column], kind='mergesort').reset_index(drop=True)
+    series = frame.groupby(by, sort=False)[values] if by else frame[values]
+    if name == 'cumsum':
+        transformed = series.cumsum()
+    elif name == 'growth':
+        previous = series.shift(periods)
+        transformed = frame[values] / previous.where(previous != 0) - 1
+    else:
+        if name == 'moving_average':
+            transformed = series.rolling(periods, min_periods=1).mean()
+        else:
+            transformed = series.ewm(span=periods).mean()
+        if by:
+            # Grouped windows are indexed by the series keys, then the row
+            transformed = transformed.reset_index(level=list(range(len(by))), drop=True)
+    result = frame.copy()
+    result[values] = transformed.sort_index()[values]
+    return result
+
+
+def chunked(frame, chunksize):
+    """
+    Splits a DataFrame into an iterator of DataFrames with at most chunksize rows, like streamed reads
+    """
+    for i in range(0, max(len(frame), 1), chunksize):
+        yield frame.iloc[i:i + chunksize]
+
+
+def first_responses(issues, comments, responders):
+    """
+    Finds the first comment on every issue by one of the responders in a single sorted pass
+    :param issues: DataFrame with the id and created_at of the issues
+    :param comments: DataFrame with the issue_id, user_id and created_at of the comments on them
+    :param responders: User ids whose comments count as a response, e.g. the project's committers
+    :return: DataFrame with created_at and responded_at of every issue that got a response, by issue id
+    """
+    comments = comments[comments['user_id'].isin(set(responders))]
+    # After sorting by time the first comment of every issue is its first response
+    first = comments.sort_values(['created_at', 'issue_id'], kind='mergesort') \
+                    .drop_duplicates('issue_id')[['issue_id', 'created_at']] \
+                    .rename(columns={'created_at': 'responded_at'})
+    responses = issues[['id', 'created_at']].merge(first, left_on='id', right_on='issue_id')
+    return responses.sort_values('id')[['created_at', 'responded_at']].reset_index(drop=True)
+
+
+def stream_first_responses(comments, responders):
+    """
+    first_responses() over comments streamed in issue order, holding one chunk at a time
+    :param comments: Iterator of DataFrames with the issue_id, user_id and created_at of the comments
+                     and the issue_created_at of their issue, sorted by issue_id
+    :param responders: User ids whose comments count as a response, e.g. the project's committers
+    :return: Iterator of DataFrames with created_at and responded_at of the issues that got a response, by issue id
+    """
+    responders = set(responders)
+    pending = None
+    for chunk in comments:
+        chunk = chunk[chunk['user_id'].isin(responders)]
+        if pending is not None:
+            chunk = pd.concat([pending, chunk])
+        if not len(chunk):
+            continue
+        # The last issue of the chunk may have more comments in the next one
+        last = chunk['issue_id'].iloc[-1]
+        pending = chunk[chunk['issue_id'] == last]
+        done = chunk[chunk['issue_id'] != last]
+        if len(done):
+            yield _first_per_issue(done)
+    if pending is not None and len(pending):
+        yield _first_per_issue(pending)
+
+
+def _first_per_issue(comments):
+    first = comments.groupby('issue_id', sort=True).agg(created_at=('issue_created_at', 'first'),
+                                                        responded_at=('created_at', 'min'))
+    return first.reset_index(drop=True)
+
+
+def days_between(later, earlier):
+    """
+    Fractional days from one Series of datetimes to another
+    """
+    return (pd.to_datetime(later) - pd.to_datetime(earlier)).dt.total_seconds() / 86400
+
+
+def summarize(dates, values, summary='weekly'):
+    """
+    Summarizes the distribution of a per-issue latency for every week
+    :param dates: Series of datetimes that place each value in a week, e.g. when the issue was opened
+    :param values: Series of latencies
+    :param summary: Kind of summary, one of SUMMARIES
+    :return: DataFrame with date and the count, mean, median, p75, p90 and max of the values in that week
+    """
+    if summary not in SUMMARIES:
+        raise ValueError('summary must be one of {}'.format(', '.join(SUMMARIES)))
+    frame = pd.DataFrame({'date': interval_start(dates, 'week').values, 'value': pd.Series(values).values})
+    weeks = frame.groupby('date')['value']
+    return pd.DataFrame({
+        'count': weeks.count(),
+        'mean': weeks.mean(),
+        'median': weeks.median(),
+        'p75': weeks.quantile(.75),
+        'p90': weeks.quantile(.9),
+        'max': weeks.max()
+    }).reset_index()
+
+
+def window_start(start, window):
+    """
+    Start of the trailing window of the month start falls in
+    :param start: First date of the timeseries, or None
+    :param window: Number of months in the window, ending with the month itself
+    :return: Timestamp of the first day of the window, None without a start
+    """
+    if start is None:
+        return None
+    return (pd.Timestamp(start).to_period('M') - (window - 1)).start_time
+
+
+def bus_factor(commits, window=BUS_FACTOR_WINDOW, thresholds=BUS_FACTOR_THRESHOLDS, start=None):
+    """
+    Bus factor of every month, the number of committers who made more than a threshold share
+    of the commits in the trailing window ending with that month. All months and thresholds
+    are computed in one pass over the commits from running totals of every committer's commits.
+    :param commits: DataFrame with the committer_id and created_at of a project's commits
+    :param window: Number of months in the window, ending with the month itself
+    :param thresholds: Shares of the window's commits, a committer counts when their share is above one
+    :param start: Leave out months before the one this date falls in, their windows are still read from commits
+    :return: DataFrame with date, threshold and bus_factor, one row per month and threshold
+    """
+    if window < 1:
+        raise ValueError('window must be at least 1')
+    commits = commits.dropna(subset=['committer_id'])
+    if commits.empty:
+        return pd.DataFrame({'date': pd.Series([], dtype='datetime64[ns]'),
+                             'threshold': pd.Series([], dtype=float),
+                             'bus_factor': pd.Series([], dtype=int)})
+    months = pd.to_datetime(commits['created_at']).dt.to_period('M')
+    monthly = commits.groupby([months.values, commits['committer_id'].values]).size().unstack(fill_value=0)
+    monthly = monthly.reindex(pd.period_range(monthly.index.min(), monthly.index.max(), freq='M'), fill_value=0)
+    # Commits of every committer in the trailing window, as the difference of running totals
+    running = np.cumsum(monthly.values, axis=0)
+    windowed = running.copy()
+    windowed[window:] -= running[:-window]
+    totals = windowed.sum(axis=1, keepdims=True)
+    shares = windowed / np.maximum(totals, 1)
+    dates = monthly.index.start_time
+    result = pd.DataFrame({
+        'date': np.repeat(dates.values, len(thresholds)),
+        'threshold': np.tile(np.asarray(thresholds, dtype=float), len(dates)),
+        'bus_factor': np.stack([(shares > threshold).sum(axis=1) for threshold in thresholds], axis=1).ravel()
+    })
+    if start is not None:
+        result = result[result['date'] >= pd.Timestamp(start).to_period('M').start_time]
+    return result.reset_index(drop=True)
@@ -0,0 +1,219 @@
+#SPDX-License-Identifier: MIT
+import time
+import threading
+
+from .executor import MetricExecutor, ExecutorBusy, QueryTimeout
+from .cache import prime, method_key
+
+
+# Metrics recomputed for every repository on the watchlist by default, all GHTorrent methods that take a repoid
+WARM_METRICS = ['commits', 'forks', 'issues', 'stargazers', 'issues_with_close', 'issue_response_time', 'pulls',
+                'pull_acceptance_rate', 'contributors', 'contributions', 'committer_locations', 'dist_work',
+                'reopened_issues', 'community_activity', 'contr_bre', 'contributor_diversity', 'transparency',
+                'bus_factor']
+
+
+def read_watchlist(path):
+    """
+    Reads a watchlist file: one owner/repo per line, blank lines and lines starting with # are skipped
+    :return: List of (owner, repo) pairs
+    """
+    repos = []
+    with open(path) as watchlist:
+        for line in watchlist:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                repos.append(parse_repo(line))
+    return repos
+
+
+def parse_repo(name):
+    """
+    Splits owner/repo into an (owner, repo) pair
+    :raises ValueError: if there is no slash
+    """
+    if '/' not in name:
+        raise ValueError('Expected owner/repo, got {}'.format(name))
+    owner, repo = name.split('/', 1)
+    return owner, repo
+
+
+class _Entry(object):
+    """
+    What the warmer knows about a metric of a repository
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.refreshes = 0
+        self.refreshed_at = None
+        self.seconds = None
+        self.error = None
+
+
+class CacheWarmer(object):
+    """
+    Keeps the cached metrics of a watchlist of repositories fresh by recomputing them in the
+    background shortly before they expire, so no visitor has to wait for the database
+    """
+
+    def __init__(self, ghtorrent, repos, metrics=None, workers=2, refresh=0.8, interval=30, timeout=300):
+        """
+        :param ghtorrent: GHTorrent instance with a cache
+        :param repos: List of (owner, repo) pairs to keep warm
+        :param metrics: Names of the metrics to keep warm, WARM_METRICS by default
+        :param workers: Number of metrics recomputed at the same time
+        :param refresh: Share of a metric's cache TTL after which it is recomputed
+        :param interval: Seconds between checks for metrics that are due
+        :param timeout: Seconds a metric may take before its query is cancelled
+        """
+        self.ghtorrent = ghtorrent
+        # The same repository may be listed in the config and the watchlist file
+        self.repos = sorted(set(repos))
+        self.metrics = list(metrics or WARM_METRICS)
+        self.workers = workers
+        self.refresh = refresh
+        self.interval = interval
+        # Why the last pass failed, None if it didn't
+        self.error = None
+        self.__executor = MetricExecutor(workers=workers, queue=0, timeout=timeout)
+        self.__entries = dict(((repo, metric), _Entry()) for repo in self.repos for metric in self.metrics)
+        # GitHub names aren't case sensitive, requests may spell them differently than the watchlist
+        self.__names = dict(((owner.lower(), repo.lower()), (owner, repo)) for owner, repo in self.repos)
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def record(self, owner, repo, metric):
+        """
+        Counts a request for a metric, the most requested entries are recomputed first
+        """
+        repo = self.__names.get((owner.lower(), repo.lower()))
+        with self.__lock:
+            entry = self.__entries.get((repo, metric))
+            if entry is not None:
+                entry.requests += 1
+
+    def due(self, now=None):
+        """
+        Entries whose cached result is missing or close to expiring, in the order they are recomputed:
+        never computed or since evicted or invalidated first, then the most requested, then the stalest
+        :return: List of ((owner, repo), metric) pairs
+        """
+        now = time.time() if now is None else now
+        cache = self.ghtorrent.cache
+        # Resolved names are cached, this only queries the database for repositories it hasn't seen
+        repoids = self.ghtorrent.repoids(self.repos)
+        due = []
+        with self.__lock:
+            for key, entry in self.__entries.items():
+                method = getattr(type(self.ghtorrent), key[1])
+                ttl = cache.ttl_for(key[1], getattr(method, 'ttl', None))
+                # The cache may have dropped the result long before it would expire, e.g. to make room.
+                # Failed entries aren't cached either, they wait for their next refresh.
+                cold = (entry.refreshed_at is None or
+                        (entry.error is None and repoids.get(key[0]) and
+                         not cache.contains(method_key(self.ghtorrent, key[1], repoids[key[0]]))))
+                if cold or ttl is None or now - entry.refreshed_at >= self.refresh * ttl:
+                    due.append((not cold, -entry.requests, entry.refreshed_at or 0, key))
+        return [key for warm, requests, refreshed_at, key in sorted(due)]
+
+    def run_once(self):
+        """
+        Recomputes the entries that are due, workers at a time
+        :return: Number of entries recomputed
+        """
+        due = self.due()
+        if not due:
+            return 0
+        repoids = self.ghtorrent.repoids(sorted(set(repo for repo, metric in due)))
+        due = [(repo, metric) for repo, metric in due if repoids.get(repo)]
+        tasks = []
+        # The single-table counts of every repository are fetched with one query
+        counts = getattr(self.ghtorrent, 'SINGLE_TABLE_COUNTS', {})
+        fused = [(repo, metric) for repo, metric in due if metric in counts]
+        if len(fused) > 1:
+            repos = sorted(set(repo for repo, metric in fused))
+            names = set(metric for repo, metric in fused)
+            metrics = [metric for metric in counts if metric in names]
+            tasks.append(('single_table_counts', fused, self.ghtorrent.single_table_counts,
+                          ([repoids[repo] for repo in repos],), {'metrics': metrics}))
+            due = [key for key in due if key not in fused]
+        for repo, metric in due:
+            tasks.append((metric, [(repo, metric)], self.__compute, (metric, repoids[repo]), {}))
+        for first in range(0, len(tasks), self.workers):
+            wave = []
+            for name, keys, func, args, kwargs in tasks[first:first + self.workers]:
+                try:
+                    wave.append((keys, time.time(), self.__executor.submit(name, func, *args, **kwargs)))
+                except ExecutorBusy as e:
+                    # A metric that timed out still holds its worker until its query stops
+                    self.__finish(keys, None, str(e))
+            for keys, started, pending in wave:
+                error = None
+                try:
+                    pending.result()
+                except QueryTimeout as e:
+                    error = str(e)
+                except Exception as e:
+                    error = '{}: {}'.format(type(e).__name__, e)
+                self.__finish(keys, time.time() - started, error)
+        return sum(len(task[1]) for task in tasks)
+
+    def __compute(self, metric, repoid):
+        # The cached result may not have expired yet, compute a new one and replace it
+        method = getattr(type(self.ghtorrent), metric)
+        prime(self.ghtorrent, metric, method.__wrapped__(self.ghtorrent, repoid), repoid)
+
+    def __finish(self, keys, seconds, error):
+        now = time.time()
+        with self.__lock:
+            for key in keys:
+                entry = self.__entries[key]
+                entry.seconds = seconds
+                entry.error = error
+                # Failed entries are tried again once a refresh is due, not on every pass
+                entry.refreshed_at = now
+                if error is None:
+                    entry.refreshes += 1
+
+    def stats(self):
+        """
+        Returns how every entry was last refreshed
+        :return: List of dicts with repo, metric, requests, refreshes, refreshed_at, seconds and error
+        """
+        with self.__lock:
+            return [{'repo': '{}/{}'.format(*repo), 'metric': metric, 'requests': entry.requests,
+                     'refreshes': entry.refreshes, 'refreshed_at': entry.refreshed_at,
+                     'seconds': entry.seconds, 'error': entry.error}
+                    for (repo, metric), entry in sorted(self.__entries.items())]
+
+    def start(self):
+        """
+        Starts recomputing due entries every interval seconds on a background thread
+        """
+        if self.__thread is not None:
+            return
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.__run, name='ghdata-warmer')
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        """
+        Stops the background thread once the entries being recomputed are done
+        """
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __run(self):
+        while not self.__stop.is_set():
+            try:
+                self.run_once()
+                self.error = None
+            except Exception as e:
+                # e.g. the database is down, the next pass tries again
+                self.error = '{}: {}'.format(type(e).__name__, e)
+            self.__stop.wait(self.interval)
@@ -39,14 +39,16 @@ setup(
         'Programming Language :: Python :: 3.5',
     ],
     keywords='ghtorrent github api data science',
-    install_requires=['flask', 'flask-cors', 'PyMySQL', 'requests', 'python-dateutil', 'sqlalchemy', 'pandas', 'pytest', 'PyGithub', 'pyevent'],
+    install_requires=['flask', 'flask-cors', 'PyMySQL', 'requests', 'python-dateutil', 'sqlalchemy', 'pandas', 'pytest', 'PyGithub', 'pyevent', 'futures; python_version < "3.0"'],
     extras_require={
         'dev': ['check-manifest'],
         'test': ['coverage'],
+        'snapshot': ['pyarrow'],
+        'formats': ['orjson', 'msgpack', 'pyarrow'],
     },
     entry_points={
         'console_scripts': [
-            'ghdata=ghdata.server:run',
+            'ghdata=ghdata.cli:main',
         ],
     },
 )
@@ -0,0 +1,51 @@
+import os
+import json
+import pytest
+
+@pytest.fixture
+def dbstr(tmpdir):
+    import ghdata.benchmark
+    dbstr = 'sqlite:///' + str(tmpdir.join('benchmark.db'))
+    ghdata.benchmark.generate(dbstr, commits=2000, repos=8, indexes=True)
+    return dbstr
+
+def test_generate(dbstr):
+    import sqlalchemy as s
+    engine = s.create_engine(dbstr)
+    with engine.connect() as conn:
+        sizes = [row[0] for row in conn.execute(s.text('SELECT COUNT(*) FROM commits GROUP BY project_id ORDER BY COUNT(*) DESC'))]
+        assert sum(sizes) == 2000
+        # Skewed, the largest repository has much more activity than the smallest
+        assert sizes[0] > 4 * sizes[-1]
+        assert conn.execute(s.text('SELECT COUNT(*) FROM watchers')).scalar() > 0
+        assert conn.execute(s.text("SELECT COUNT(*) FROM issue_events WHERE action = 'closed'")).scalar() > 0
+    engine.dispose()
+
+def test_run(dbstr):
+    import ghdata
+    import ghdata.benchmark
+    results = ghdata.benchmark.run(ghdata.GHTorrent(dbstr), metrics=['committer_locations'], repeat=2)
+    assert set(results['meta']['repos']) == set(['largest', 'median', 'smallest'])
+    largest = results['metrics']['committer_locations']['largest']
+    assert largest['error'] is None
+    assert largest['rows'] > 0
+    assert largest['p95_ms'] >= largest['p50_ms']
+    assert largest['peak_memory_bytes'] > 0
+    json.dumps(results)
+
+def test_compare():
+    import ghdata.benchmark
+    baseline = {'metrics': {'commits': {'largest': {'p50_ms': 10.0}}}}
+    current = {'metrics': {'commits': {'largest': {'p50_ms': 5.0}}}}
+    comparison = ghdata.benchmark.compare(baseline, current)
+    assert comparison['ratio'].tolist() == [0.5]
+
+def test_measure_times_without_tracing():
+    import tracemalloc
+    import ghdata.benchmark
+    tracing = []
+    result = ghdata.benchmark.measure(lambda: tracing.append(tracemalloc.is_tracing()) or [0] * 1000, repeat=3)
+    # The timed calls, then the one measuring memory
+    assert tracing == [False, False, False, True]
+    assert result['rows'] == 1000
+    assert result['peak_memory_bytes'] >= 8000
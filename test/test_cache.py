@@ -0,0 +1,152 @@
+import time
+import datetime
+import pytest
+import pandas
+
+from ghdata.cache import MetricCache, MISSING, make_key, cached
+
+
+class Counter(object):
+    def __init__(self, cache):
+        self.cache = cache
+        self.calls = 0
+
+    @cached()
+    def commits(self, repoid, start=None):
+        self.calls += 1
+        return pandas.DataFrame({'date': ['2017-01-01'], 'commits': [repoid]})
+
+@pytest.fixture
+def cache():
+    return MetricCache(max_bytes=1024 * 1024, default_ttl=60)
+
+def test_hit_and_miss(cache):
+    key = make_key('commits', 1)
+    assert cache.get(key) is MISSING
+    cache.set(key, 'value')
+    assert cache.get(key) == 'value'
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+def test_contains(cache):
+    cache.ttls['commits'] = 0.01
+    key = make_key('commits', 1)
+    assert not cache.contains(key)
+    cache.set(key, 'value')
+    assert cache.contains(key)
+    time.sleep(0.02)
+    assert not cache.contains(key)
+    assert cache.stats()['hits'] == 0
+    assert cache.stats()['misses'] == 0
+
+def test_ttl_expiry(cache):
+    cache.ttls['commits'] = 0.01
+    key = make_key('commits', 1)
+    cache.set(key, 'value')
+    time.sleep(0.02)
+    assert cache.get(key) is MISSING
+    assert cache.stats()['expirations'] == 1
+
+def test_lru_eviction():
+    frame = pandas.DataFrame({'x': range(100)})
+    cache = MetricCache(max_bytes=int(frame.memory_usage(deep=True).sum() * 2.5))
+    cache.set(make_key('a', 1), frame)
+    cache.set(make_key('b', 1), frame)
+    cache.get(make_key('a', 1))
+    cache.set(make_key('c', 1), frame)
+    assert cache.get(make_key('b', 1)) is MISSING
+    assert cache.get(make_key('a', 1)) is not MISSING
+    assert cache.stats()['evictions'] == 1
+
+def test_decorator_keys_on_arguments(cache):
+    counter = Counter(cache)
+    counter.commits(1)
+    counter.commits(repoid=1)
+    counter.commits(2)
+    counter.commits(1, start='2017-01-01')
+    assert counter.calls == 3
+    cache.invalidate(repoid=1)
+    counter.commits(1)
+    assert counter.calls == 4
+
+def test_decorator_returns_copies(cache):
+    counter = Counter(cache)
+    missed = counter.commits(1)
+    missed['commits'] = 99
+    missed['extra'] = 1
+    hit = counter.commits(1)
+    assert counter.calls == 1
+    assert list(hit.columns) == ['date', 'commits']
+    assert hit['commits'].tolist() == [1]
+
+def test_decorator_without_cache():
+    counter = Counter(None)
+    counter.commits(1)
+    counter.commits(1)
+    assert counter.calls == 2
+
+def test_single_flight():
+    import threading
+    from ghdata.cache import SingleFlight
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return 'result'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do('key', compute)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(flights.do('key', compute))) for i in range(3)]
+    for follower in followers:
+        follower.start()
+    while flights.coalesced < 3:
+        release.wait(.01)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+    assert results == ['result'] * 4
+    assert len(calls) == 1
+    assert flights.in_flight() == 0
+    # Once it has returned the next call runs again
+    assert flights.do('key', lambda: 'again') == 'again'
+
+def test_single_flight_shares_errors():
+    from ghdata.cache import SingleFlight
+    flights = SingleFlight()
+    with pytest.raises(ZeroDivisionError):
+        flights.do('key', lambda: 1 / 0)
+    assert flights.in_flight() == 0
+
+def test_watermark_drops_stale_results(tmpdir):
+    import ghdata
+    import ghdata.benchmark
+    import sqlalchemy as s
+    dbstr = 'sqlite:///' + str(tmpdir.join('ghtorrent.db'))
+    ghdata.benchmark.generate(dbstr, commits=300, repos=2)
+    ghtorrent = ghdata.GHTorrent(dbstr, cache=MetricCache())
+    ghtorrent.WATERMARK_TTL = 0
+    assert ghtorrent.watermark(['unknown']) is None
+    marks, modified = ghtorrent.watermark(['commits', 'stargazers'])
+    assert [table for table, mark in marks] == ['commits', 'watchers']
+    assert ghtorrent.watermark(['commits', 'stargazers'])[0] == marks
+    before = ghtorrent.commits(1, interval='day')
+    ghtorrent.stargazers(1)
+    with ghtorrent.db.begin() as conn:
+        conn.execute(s.text("INSERT INTO commits (sha, author_id, committer_id, project_id, created_at) "
+                            "VALUES ('abc', 1, 1, 1, '2030-01-01 00:00:00')"))
+    assert ghtorrent.watermark(['commits'])[0] != marks[:1]
+    # Last-Modified comes from the newest row, so every process gives the same date
+    modified = ghtorrent.watermark(['commits'])[1]
+    assert modified == datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc)
+    assert ghdata.GHTorrent(dbstr).watermark(['commits'])[1] == modified
+    # The new commit shows up right away, the stargazers are still cached
+    assert ghtorrent.commits(1, interval='day')['commits'].sum() == before['commits'].sum() + 1
+    hits = ghtorrent.cache.stats()['hits']
+    ghtorrent.stargazers(1)
+    assert ghtorrent.cache.stats()['hits'] == hits + 1
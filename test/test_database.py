@@ -0,0 +1,38 @@
+import pytest
+import sqlalchemy as s
+
+from ghdata.database import EngineRouter
+
+@pytest.fixture
+def router(tmpdir):
+    dsns = ['sqlite:///' + str(tmpdir.join(name + '.db')) for name in ('primary', 'replica1', 'replica2', 'analytics')]
+    for dsn in dsns:
+        with s.create_engine(dsn).begin() as conn:
+            conn.execute(s.text('CREATE TABLE users (id INTEGER PRIMARY KEY, login VARCHAR(255))'))
+            conn.execute(s.text("INSERT INTO users VALUES (1, '{}')".format(dsn.rsplit('/', 1)[1][:-3])))
+    return EngineRouter(dsns[0], replicas=dsns[1:3], analytics=dsns[3], analytics_metrics=['contributors'],
+                        pool={'pool_size': 2, 'max_overflow': 0, 'pool_pre_ping': True, 'pool_recycle': 60})
+
+def served_by(engine):
+    with engine.connect() as conn:
+        return conn.execute(s.text('SELECT login FROM users')).scalar()
+
+def test_replicas_take_turns(router):
+    assert sorted(served_by(router.engine('commits')) for i in range(4)) == ['replica1', 'replica1', 'replica2', 'replica2']
+
+def test_least_loaded_replica_is_picked(router):
+    busy = router.replicas[0].connect()
+    try:
+        assert set(served_by(router.engine('commits')) for i in range(4)) == set(['replica2'])
+    finally:
+        busy.close()
+
+def test_pinned_metrics_use_analytics(router):
+    assert served_by(router.engine('contributors')) == 'analytics'
+    assert served_by(router.engine('commits')) != 'analytics'
+
+def test_ghtorrent_reads_from_replicas(tmpdir, router):
+    import ghdata
+    ghtorrent = ghdata.GHTorrent(str(router.primary.url), replicas=[str(engine.url) for engine in router.replicas])
+    assert ghtorrent.userids(['replica1', 'replica2', 'primary']) in ({'replica1': 1, 'replica2': 0, 'primary': 0},
+                                                                      {'replica1': 0, 'replica2': 1, 'primary': 0})
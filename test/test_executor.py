@@ -0,0 +1,87 @@
+import time
+import threading
+import pytest
+import sqlalchemy as s
+
+from ghdata.executor import MetricExecutor, ExecutorBusy, QueryTimeout
+
+def test_run():
+    executor = MetricExecutor(workers=2, timeout=5)
+    assert executor.run('add', lambda a, b: a + b, 1, b=2) == 3
+    with pytest.raises(ZeroDivisionError):
+        executor.run('fails', lambda: 1 / 0)
+
+def test_submit_runs_side_by_side():
+    executor = MetricExecutor(workers=3, timeout=5)
+    started = time.time()
+    pending = [executor.submit('sleep', time.sleep, .3) for i in range(3)]
+    for call in pending:
+        call.result()
+    assert time.time() - started < .8
+
+def test_timeout_and_busy():
+    executor = MetricExecutor(workers=1, queue=0, timeout=5, timeouts={'slow': 0.1})
+    release = threading.Event()
+    with pytest.raises(QueryTimeout):
+        executor.run('slow', release.wait)
+    # The timed out metric still holds the only worker until it returns
+    with pytest.raises(ExecutorBusy):
+        executor.run('fast', lambda: 1)
+    release.set()
+    executor.shutdown()
+
+def test_timed_out_query_is_interrupted(tmpdir):
+    import ghdata
+    dbstr = 'sqlite:///' + str(tmpdir.join('ghtorrent.db'))
+    ghtorrent = ghdata.GHTorrent(dbstr)
+    executor = MetricExecutor(workers=1, queue=0, timeout=0.2)
+    endless = s.text('WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT COUNT(*) FROM c')
+    with pytest.raises(QueryTimeout):
+        executor.run('endless', ghtorrent._GHTorrent__read_sql, 'endless', endless)
+    # Once SQLite is interrupted the worker is free again
+    for attempt in range(50):
+        try:
+            assert executor.run('fast', lambda: 1) == 1
+            break
+        except ExecutorBusy:
+            time.sleep(.1)
+    else:
+        pytest.fail('the query was not interrupted')
+
+def test_stream():
+    executor = MetricExecutor(workers=1, queue=0, timeout=5, timeouts={'slow': 0.2})
+    assert list(executor.stream('count', lambda n: iter(range(n)), 5)) == [0, 1, 2, 3, 4]
+    with pytest.raises(ZeroDivisionError):
+        list(executor.stream('fails', lambda: (1 / x for x in [1, 0])))
+    # The deadline covers the whole iteration
+    release = threading.Event()
+    def slow():
+        yield 1
+        release.wait()
+        yield 2
+    chunks = executor.stream('slow', slow)
+    assert next(chunks) == 1
+    with pytest.raises(QueryTimeout):
+        next(chunks)
+    release.set()
+
+def test_stream_stops_when_the_caller_does():
+    executor = MetricExecutor(workers=1, queue=0, timeout=5)
+    produced = []
+    def endless():
+        while True:
+            produced.append(1)
+            yield len(produced)
+    chunks = executor.stream('endless', endless)
+    assert next(chunks) == 1
+    chunks.close()
+    # The worker is free once it notices
+    for attempt in range(50):
+        try:
+            assert executor.run('fast', lambda: 1) == 1
+            break
+        except ExecutorBusy:
+            time.sleep(.1)
+    else:
+        pytest.fail('the stream was not stopped')
+    assert len(produced) <= 2 + MetricExecutor.STREAM_AHEAD
@@ -0,0 +1,49 @@
+import pytest
+import sqlalchemy as s
+
+from ghdata.indexes import IndexAdvisor, Index
+
+@pytest.fixture
+def advisor(tmpdir):
+    import ghdata
+    dbstr = 'sqlite:///' + str(tmpdir.join('ghtorrent.db'))
+    with s.create_engine(dbstr).begin() as conn:
+        conn.execute(s.text('CREATE TABLE commits (id INTEGER PRIMARY KEY, project_id INTEGER, committer_id INTEGER, author_id INTEGER, created_at TIMESTAMP)'))
+        conn.execute(s.text('CREATE TABLE watchers (repo_id INTEGER, user_id INTEGER, created_at TIMESTAMP)'))
+        conn.execute(s.text('CREATE INDEX commits_project ON commits (project_id, created_at)'))
+    return IndexAdvisor(ghdata.GHTorrent(dbstr))
+
+def test_missing(advisor):
+    assert advisor.missing(['commits', 'stargazers', 'bus_factor']) == {
+        'stargazers': [Index('watchers', ('repo_id', 'created_at'))],
+        'bus_factor': [Index('commits', ('project_id', 'created_at', 'committer_id'))]
+    }
+
+def test_create(advisor):
+    advisor.create(advisor.missing(['stargazers'])['stargazers'])
+    assert advisor.missing(['stargazers']) == {}
+
+def test_explain(advisor):
+    plan, = advisor.explain('stargazers', 1)
+    assert any('SCAN' in str(row.get('detail')) for row in plan)
+    advisor.create(advisor.missing(['stargazers'])['stargazers'])
+    plan, = advisor.explain('stargazers', 1)
+    assert any('ghdata_watchers_repo_id_created_at' in str(row.get('detail')) for row in plan)
+
+def test_every_metric_has_indexes():
+    import ghdata
+    from ghdata.indexes import METRIC_INDEXES
+    # The metrics of a single repository, those for many at once use the same indexes
+    metrics = [name for name in dir(ghdata.GHTorrent) if hasattr(getattr(ghdata.GHTorrent, name), '__wrapped__')
+               and not name.endswith('_many')]
+    assert sorted(set(metrics) - set(METRIC_INDEXES)) == []
+
+def test_capture_every_query(tmpdir):
+    import ghdata
+    import ghdata.benchmark
+    dbstr = 'sqlite:///' + str(tmpdir.join('ghtorrent.db'))
+    ghdata.benchmark.generate(dbstr, commits=300, repos=2)
+    advisor = IndexAdvisor(ghdata.GHTorrent(dbstr))
+    queries = advisor.capture('issue_response_time', 1)
+    assert len(queries) == 3
+    assert len(advisor.explain('issue_response_time', 1)) == 3
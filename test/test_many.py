@@ -0,0 +1,66 @@
+import pytest
+import pandas as pd
+import sqlalchemy as s
+
+@pytest.fixture
+def ghtorrent(tmpdir):
+    import ghdata
+    dbstr = 'sqlite:///' + str(tmpdir.join('ghtorrent.db'))
+    engine = s.create_engine(dbstr)
+    with engine.begin() as conn:
+        conn.execute(s.text('CREATE TABLE commits (id INTEGER PRIMARY KEY, project_id INTEGER, created_at TIMESTAMP)'))
+        conn.execute(s.text("""INSERT INTO commits (project_id, created_at) VALUES
+                               (1, '2017-01-02 10:00:00'), (1, '2017-01-03 10:00:00'), (1, '2017-01-10 10:00:00'),
+                               (2, '2017-01-02 10:00:00'), (3, '2017-01-02 10:00:00')"""))
+    ghtorrent = ghdata.GHTorrent(dbstr)
+    ghtorrent.MANY_CHUNK_SIZE = 2
+    return ghtorrent
+
+def test_commits_many(ghtorrent):
+    commits = ghtorrent.commits_many([1, 2, 3, 4])
+    assert list(commits.columns) == ['repoid', 'date', 'commits']
+    assert commits.groupby('repoid')['commits'].sum().to_dict() == {1: 3, 2: 1, 3: 1}
+    assert len(commits[commits['repoid'] == 1]) == 2
+
+def test_single_table_counts(tmpdir):
+    import ghdata
+    import ghdata.benchmark
+    dbstr = 'sqlite:///' + str(tmpdir.join('ghtorrent.db'))
+    ghdata.benchmark.generate(dbstr, commits=3000, repos=4)
+    ghtorrent = ghdata.GHTorrent(dbstr, cache=ghdata.MetricCache())
+    queries = []
+    s.event.listen(ghtorrent.db, 'before_cursor_execute', lambda *args: queries.append(args[2]))
+    counts = ghtorrent.single_table_counts([1, 2], start='2015-01-01', interval='month')
+    assert len([query for query in queries if 'UNION ALL' in query]) == 1
+    expected = ghdata.GHTorrent(dbstr)
+    for name in ghtorrent.SINGLE_TABLE_COUNTS:
+        many = getattr(expected, name + '_many')([1, 2], start='2015-01-01', interval='month')
+        pd.testing.assert_frame_equal(counts[name], many, check_dtype=False)
+    # Every project's daily series was cached, the metrics don't query again
+    del queries[:]
+    hits = ghtorrent.cache.stats()['hits']
+    commits = ghtorrent.commits(2, start='2015-01-01')
+    assert commits.equals(expected.commits(2, start='2015-01-01'))
+    assert ghtorrent.cache.stats()['hits'] == hits + 1
+    assert queries == []
+
+def test_forks_after_a_start_date(tmpdir):
+    import ghdata
+    dbstr = 'sqlite:///' + str(tmpdir.join('ghtorrent.db'))
+    engine = s.create_engine(dbstr)
+    with engine.begin() as conn:
+        conn.execute(s.text('CREATE TABLE projects (id INTEGER PRIMARY KEY, name VARCHAR(255), forked_from INTEGER, '
+                            'created_at TIMESTAMP)'))
+        # Forks of project 1 in the weeks of 2015-01-05, 2015-02-02 and 2015-02-09
+        conn.execute(s.text("""INSERT INTO projects (name, forked_from, created_at) VALUES
+                               ('a', 1, '2015-01-06 10:00:00'), ('b', 1, '2015-02-05 10:00:00'),
+                               ('c', 1, '2015-02-10 10:00:00'), ('d', 2, '2015-02-05 10:00:00')"""))
+    ghtorrent = ghdata.GHTorrent(dbstr)
+    # The first week of forks is left out, not the first week after the start date
+    assert ghtorrent.forks(1, interval='day')['date'].dt.strftime('%Y-%m-%d').tolist() == ['2015-02-05', '2015-02-10']
+    assert ghtorrent.forks(1, start='2015-02-01', interval='day')['projects'].tolist() == [1, 1]
+    assert ghtorrent.forks(1, start='2015-01-06', interval='day')['projects'].tolist() == [1, 1]
+    many = ghtorrent.forks_many([1, 2], start='2015-02-01', interval='day')
+    assert many[['repoid', 'projects']].values.tolist() == [[1, 1], [1, 1]]
+    counts = ghtorrent.single_table_counts([1, 2], start='2015-02-01', interval='day', metrics=['forks'])
+    pd.testing.assert_frame_equal(counts['forks'], many, check_dtype=False)
@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip('pyarrow')
+
+@pytest.fixture
+def ghtorrents(tmpdir):
+    import ghdata
+    import ghdata.benchmark
+    from ghdata.snapshot import snapshot
+    dbstr = 'sqlite:///' + str(tmpdir.join('ghtorrent.db'))
+    ghdata.benchmark.generate(dbstr, commits=3000, repos=5)
+    ghtorrent = ghdata.GHTorrent(dbstr)
+    snapshot(ghtorrent, 'user1', 'repo1', str(tmpdir.join('snapshots')))
+    return ghtorrent, ghdata.OfflineGHTorrent(str(tmpdir.join('snapshots')))
+
+def test_snapshot_layout(ghtorrents, tmpdir):
+    ghtorrent, offline = ghtorrents
+    path = tmpdir.join('snapshots', 'user1', 'repo1')
+    assert path.join('snapshot.json').check()
+    assert path.join('commits.parquet').check()
+    assert offline.repoid('User1', 'Repo1') == ghtorrent.repoid('user1', 'repo1')
+    assert offline.repoid('user2', 'repo2') == 0
+    assert offline.userid('user1') == 1
+
+@pytest.mark.parametrize('metric', ['stargazers', 'commits', 'issues', 'pulls', 'issues_with_close', 'contributions',
+                                    'committer_locations', 'pull_acceptance_rate', 'dist_work', 'bus_factor'])
+def test_matches_ghtorrent(ghtorrents, metric):
+    ghtorrent, offline = ghtorrents
+    online = getattr(ghtorrent, metric)(1)
+    computed = getattr(offline, metric)(1)
+    assert list(computed.columns) == list(online.columns)
+    assert len(computed) == len(online)
+    for column in online.columns:
+        if online[column].dtype.kind in 'fiu':
+            assert computed[column].fillna(-1).astype(float).tolist() == online[column].fillna(-1).astype(float).tolist()
+
+def test_contributions_of_a_user(ghtorrents):
+    ghtorrent, offline = ghtorrents
+    userid = int(ghtorrent.contributors(1)['commits'].idxmax())
+    online = ghtorrent.contributions(1, userid=userid)
+    computed = offline.contributions(1, userid=userid)
+    assert computed['commits'].sum() == online['commits'].sum() > 0
+    # A user that doesn't exist made no contributions
+    assert offline.contributions(1, userid=0)['total'].fillna(0).sum() == 0
+
+def test_forks_after_a_start_date(ghtorrents, tmpdir):
+    import sqlalchemy as s
+    import ghdata
+    from ghdata.snapshot import snapshot
+    ghtorrent, offline = ghtorrents
+    assert offline.forks(1).empty
+    with ghtorrent.db.begin() as conn:
+        conn.execute(s.text("""INSERT INTO projects (name, forked_from, created_at, deleted) VALUES
+                               ('a', 1, '2015-01-06 10:00:00', 0), ('b', 1, '2015-02-05 10:00:00', 0),
+                               ('c', 1, '2015-02-10 10:00:00', 0)"""))
+    snapshot(ghtorrent, 'user1', 'repo1', str(tmpdir.join('forks')))
+    offline = ghdata.OfflineGHTorrent(str(tmpdir.join('forks')))
+    online = ghtorrent.forks(1, start='2015-02-01', interval='day')
+    # Only the week of the first fork is left out, not the first week after the start date
+    assert online['projects'].tolist() == [1, 1]
+    assert offline.forks(1, start='2015-02-01', interval='day')['projects'].tolist() == [1, 1]
+    assert offline.forks_many([1], start='2015-02-01', interval='day')['projects'].tolist() == [1, 1]
+
+def test_contributors_match(ghtorrents):
+    ghtorrent, offline = ghtorrents
+    online = ghtorrent.contributors(1).sort_index()
+    computed = offline.contributors(1).sort_index()
+    assert computed.fillna(-1).equals(online.fillna(-1))
+
+def test_snapshot_is_replaced(ghtorrents, tmpdir):
+    import sqlalchemy as s
+    from ghdata.snapshot import snapshot
+    ghtorrent, offline = ghtorrents
+    before = offline.commits(1)['commits'].sum()
+    with ghtorrent.db.begin() as conn:
+        conn.execute(s.text("INSERT INTO commits (id, project_id, created_at) VALUES (100000, 1, '2016-06-01 10:00:00')"))
+    snapshot(ghtorrent, 'user1', 'repo1', str(tmpdir.join('snapshots')))
+    assert offline.commits(1)['commits'].sum() == before + 1
@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+import time
+import signal
+import subprocess
+import pytest
+try:
+    from urllib.request import urlopen
+except ImportError:
+    from urllib2 import urlopen
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+
+def wait_for(check, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        result = check()
+        if result:
+            return result
+        time.sleep(0.2)
+    raise AssertionError('timed out')
+
+@pytest.fixture
+def server(tmpdir):
+    import ghdata.benchmark
+    dbstr = 'sqlite:///' + str(tmpdir.join('ghtorrent.db'))
+    ghdata.benchmark.generate(dbstr, commits=500, repos=2)
+    config = tmpdir.join('ghdata.cfg')
+    config.write('[Server]\nhost = 127.0.0.1\nport = 0\n[Database]\nurl = {}\n'.format(dbstr))
+    package = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = 'import ghdata.server; ghdata.server.run({!r}, workers=2, threads=2, max_requests=3)'.format(str(config))
+    master = subprocess.Popen([sys.executable, '-c', code], cwd=str(tmpdir), stdout=subprocess.PIPE,
+                              env=dict(os.environ, PYTHONPATH=package))
+    try:
+        line = master.stdout.readline().decode('utf-8')
+        url = line.split()[3]
+        yield master, url + 'unstable/'
+    finally:
+        if master.poll() is None:
+            master.kill()
+        master.wait()
+
+def get(url):
+    return json.loads(urlopen(url, timeout=10).read().decode('utf-8'))
+
+def serving(url):
+    return set(worker['pid'] for worker in get(url + 'workers') if worker['state'] == 'serving')
+
+def test_prefork(server):
+    master, url = server
+    first = wait_for(lambda: len(serving(url)) == 2 and serving(url))
+    # A single worker is designated to run the cache warmer
+    assert len([worker for worker in get(url + 'workers') if worker['designated']]) == 1
+    # The workers are replaced once they served max_requests requests
+    seen = set(first)
+    for i in range(12):
+        assert get(url + 'user1/repo1/timeseries/commits')[0]['commits'] > 0
+        seen |= serving(url)
+    assert len(seen) > 2
+    # SIGHUP replaces every worker
+    before = serving(url)
+    master.send_signal(signal.SIGHUP)
+    wait_for(lambda: len(serving(url)) == 2 and not serving(url) & before)
+    wait_for(lambda: [worker['designated'] for worker in get(url + 'workers')
+                      if worker['state'] == 'serving'].count(True) == 1)
+    master.send_signal(signal.SIGTERM)
+    assert master.wait(timeout=15) == 0
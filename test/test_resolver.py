@@ -0,0 +1,37 @@
+import pytest
+import sqlalchemy as s
+
+@pytest.fixture
+def ghtorrent(tmpdir):
+    import ghdata
+    dbstr = 'sqlite:///' + str(tmpdir.join('ghtorrent.db'))
+    engine = s.create_engine(dbstr)
+    with engine.begin() as conn:
+        conn.execute(s.text('CREATE TABLE users (id INTEGER PRIMARY KEY, login VARCHAR(255))'))
+        conn.execute(s.text('CREATE TABLE projects (id INTEGER PRIMARY KEY, owner_id INTEGER, name VARCHAR(255))'))
+        conn.execute(s.text("INSERT INTO users VALUES (1, 'rails'), (2, 'akka'), (3, 'howderek')"))
+        conn.execute(s.text("INSERT INTO projects VALUES (10, 1, 'rails'), (11, 2, 'akka'), (12, 1, 'akka')"))
+    return ghdata.GHTorrent(dbstr)
+
+def test_repoid(ghtorrent):
+    assert ghtorrent.repoid('rails', 'rails') == 10
+    assert ghtorrent.repoid('rails', 'missing') == 0
+
+def test_repoids_bulk(ghtorrent):
+    assert ghtorrent.repoids([('rails', 'rails'), ('akka', 'akka'), ('rails', 'akka'), ('akka', 'rails')]) == {
+        ('rails', 'rails'): 10,
+        ('akka', 'akka'): 11,
+        ('rails', 'akka'): 12,
+        ('akka', 'rails'): 0
+    }
+
+def test_repoid_is_cached(ghtorrent):
+    assert ghtorrent.repoid('rails', 'rails') == 10
+    ghtorrent.db.dispose()
+    with ghtorrent.db.begin() as conn:
+        conn.execute(s.text('DELETE FROM projects'))
+    assert ghtorrent.repoid('rails', 'rails') == 10
+
+def test_userids_bulk(ghtorrent):
+    assert ghtorrent.userids(['howderek', 'akka', 'nobody']) == {'howderek': 3, 'akka': 2, 'nobody': 0}
+    assert ghtorrent.userid('howderek') == 3
@@ -0,0 +1,72 @@
+import pytest
+import sqlalchemy as s
+
+@pytest.fixture
+def ghtorrent(tmpdir):
+    import ghdata
+    dbstr = 'sqlite:///' + str(tmpdir.join('ghtorrent.db'))
+    engine = s.create_engine(dbstr)
+    with engine.begin() as conn:
+        conn.execute(s.text('CREATE TABLE commits (id INTEGER PRIMARY KEY, project_id INTEGER, created_at TIMESTAMP)'))
+        conn.execute(s.text('CREATE TABLE watchers (repo_id INTEGER, user_id INTEGER, created_at TIMESTAMP)'))
+        conn.execute(s.text("""INSERT INTO commits (project_id, created_at) VALUES
+                               (1, '2017-01-02 10:00:00'), (1, '2017-01-08 10:00:00'), (1, '2017-01-10 10:00:00'),
+                               (2, '2017-01-02 10:00:00')"""))
+        conn.execute(s.text("INSERT INTO watchers VALUES (1, 5, '2017-01-03 10:00:00'), (1, 6, '2017-01-04 10:00:00')"))
+    return ghdata.GHTorrent(dbstr)
+
+def test_refresh_is_incremental(ghtorrent):
+    assert ghtorrent.rollups.refresh(['commits', 'watchers']) == {'commits': 4, 'watchers': 2}
+    with ghtorrent.db.begin() as conn:
+        conn.execute(s.text("INSERT INTO commits (project_id, created_at) VALUES (1, '2017-01-11 10:00:00')"))
+        conn.execute(s.text("INSERT INTO watchers VALUES (1, 7, '2017-01-05 10:00:00')"))
+    # The watchers of the days in the overlap are counted again
+    assert ghtorrent.rollups.refresh(['commits', 'watchers']) == {'commits': 1, 'watchers': 3}
+    assert ghtorrent.rollups.counts('commits', 1)['commits'].tolist() == [1, 1, 1, 1]
+    assert ghtorrent.rollups.counts('watchers', 1)['watchers'].tolist() == [1, 1, 1]
+    # Nothing new, nothing is counted twice
+    ghtorrent.rollups.refresh(['commits', 'watchers'])
+    assert ghtorrent.rollups.counts('commits', 1)['commits'].tolist() == [1, 1, 1, 1]
+    assert ghtorrent.rollups.counts('watchers', 1)['watchers'].tolist() == [1, 1, 1]
+
+def test_late_stars_are_counted(ghtorrent):
+    ghtorrent.rollups.refresh(['watchers'])
+    with ghtorrent.db.begin() as conn:
+        # Loaded after the refresh, older than the mark or at the same time as it
+        conn.execute(s.text("INSERT INTO watchers VALUES (1, 8, '2017-01-03 09:00:00'), (1, 9, '2017-01-04 10:00:00')"))
+    ghtorrent.rollups.refresh(['watchers'])
+    assert ghtorrent.rollups.counts('watchers', 1)['watchers'].tolist() == [2, 2]
+
+def test_refresh_in_windows(ghtorrent):
+    ghtorrent.rollups.refresh(['commits'], chunksize=1)
+    assert ghtorrent.rollups.counts('commits', 1)['commits'].tolist() == [1, 1, 1]
+    assert ghtorrent.rollups.counts('commits', 2)['commits'].tolist() == [1]
+
+def test_metrics_read_fresh_rollups(ghtorrent):
+    ghtorrent.rollups.refresh(['commits'])
+    commits = ghtorrent.commits(1)
+    assert commits['date'].dt.strftime('%Y-%m-%d').tolist() == ['2017-01-02', '2017-01-09']
+    assert commits['commits'].tolist() == [2, 1]
+
+def test_rollups_match_queries(ghtorrent):
+    queried = ghtorrent.commits.__wrapped__(ghtorrent, 1, interval='day')
+    ghtorrent.rollups.refresh(['commits'])
+    assert ghtorrent.commits.__wrapped__(ghtorrent, 1, interval='day').equals(queried)
+
+def test_stale_rollups_are_ignored(ghtorrent):
+    ghtorrent.rollups.refresh(['commits'])
+    ghtorrent.rollups.max_age = 0
+    assert ghtorrent.rollups.counts('commits', 1) is None
+
+def test_rollups_honor_date_range(ghtorrent):
+    ghtorrent.rollups.refresh(['commits'])
+    commits = ghtorrent.commits(1, start='2017-01-09')
+    assert commits['date'].dt.strftime('%Y-%m-%d').tolist() == ['2017-01-09']
+    commits = ghtorrent.commits(1, end='2017-01-09')
+    assert commits['date'].dt.strftime('%Y-%m-%d').tolist() == ['2017-01-02']
+
+def test_rollups_resample_to_any_interval(ghtorrent):
+    ghtorrent.rollups.refresh(['commits'])
+    commits = ghtorrent.commits(1, interval='month')
+    assert commits['date'].dt.strftime('%Y-%m-%d').tolist() == ['2017-01-01']
+    assert commits['commits'].tolist() == [3]
@@ -0,0 +1,64 @@
+import io
+import json
+import zlib
+import pytest
+import numpy as np
+import pandas as pd
+from werkzeug.datastructures import MIMEAccept, Accept
+
+from ghdata import serializers
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({'date': pd.to_datetime(['2015-01-01', '2015-01-08', None]),
+                         'login': ['alice', None, 'carol'],
+                         'rate': [0.5, np.nan, 1.0],
+                         'commits': [3, 0, 7]})
+
+def test_split_reads_back(frame):
+    body = json.loads(serializers.to_split(frame))
+    assert body['columns'] == ['date', 'login', 'rate', 'commits']
+    rows = zip(*[body['data'][column] for column in body['columns']])
+    assert [dict(zip(body['columns'], row)) for row in rows] == json.loads(serializers.to_json(frame))
+    assert len(pd.DataFrame(body['data'], columns=body['columns'])) == 3
+
+def test_csv(frame):
+    csv = serializers.to_csv(frame)
+    if not isinstance(csv, str):
+        csv = csv.decode('utf-8')
+    read = pd.read_csv(io.StringIO(csv))
+    assert list(read.columns) == ['date', 'login', 'rate', 'commits']
+    assert read['commits'].tolist() == [3, 0, 7]
+
+def test_msgpack(frame):
+    msgpack = pytest.importorskip('msgpack')
+    body = msgpack.unpackb(serializers.to_msgpack(frame), raw=False)
+    assert body['data']['date'] == ['2015-01-01T00:00:00.000', '2015-01-08T00:00:00.000', None]
+    assert body['data']['login'] == ['alice', None, 'carol']
+    assert body['data']['commits'] == [3, 0, 7]
+
+def test_arrow(frame):
+    pyarrow = pytest.importorskip('pyarrow')
+    read = pyarrow.ipc.open_stream(serializers.to_arrow(frame)).read_pandas()
+    pd.testing.assert_frame_equal(read, frame, check_dtype=False)
+
+def test_negotiate():
+    assert serializers.negotiate().name == 'json'
+    assert serializers.negotiate('csv').name == 'csv'
+    with pytest.raises(ValueError):
+        serializers.negotiate('xml')
+    assert serializers.negotiate(None, MIMEAccept([('text/csv', 1), ('application/json', 0.5)])).name == 'csv'
+    # Browsers and clients that ask for something else get JSON
+    assert serializers.negotiate(None, MIMEAccept([('application/xml', 1)])).name == 'json'
+    assert serializers.negotiate(None, MIMEAccept([('*/*', 1)])).name == 'json'
+
+def test_compress():
+    body = '[' + ','.join(['{"commits": 1}'] * 200) + ']'
+    assert serializers.content_encoding(Accept([('deflate', 1), ('gzip', 0.5)])) == 'deflate'
+    assert serializers.content_encoding(Accept([('br', 1)])) is None
+    compressed, encoding = serializers.compress(body, 'gzip')
+    assert encoding == 'gzip'
+    assert zlib.decompress(compressed, 16 + zlib.MAX_WBITS).decode('utf-8') == body
+    compressed, encoding = serializers.compress(body, 'deflate')
+    assert zlib.decompress(compressed).decode('utf-8') == body
+    assert serializers.compress('[]', 'gzip') == (b'[]', None)
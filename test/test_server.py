@@ -0,0 +1,153 @@
+import os
+import sys
+import subprocess
+import pytest
+if (sys.version_info > (3, 0)):
+    import configparser as configparser
+else:
+    import ConfigParser as configparser
+
+@pytest.fixture
+def config(tmpdir):
+    import ghdata.benchmark
+    dbstr = 'sqlite:///' + str(tmpdir.join('ghtorrent.db'))
+    ghdata.benchmark.generate(dbstr, commits=1000, repos=2)
+    parser = configparser.RawConfigParser()
+    parser.add_section('Database')
+    parser.set('Database', 'url', dbstr)
+    parser.add_section('Cache')
+    parser.set('Cache', 'enabled', '1')
+    parser.set('Cache', 'memory_mb', '16')
+    parser.set('Cache', 'ttl', '60')
+    return parser
+
+def test_import_has_no_side_effects(tmpdir):
+    package = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = 'import sys, ghdata.server; print(sorted(m for m in ("pandas", "sqlalchemy") if m in sys.modules))'
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=str(tmpdir),
+                                     env=dict(os.environ, PYTHONPATH=package))
+    assert output.decode('utf-8').strip() == '[]'
+    # No default config was written
+    assert tmpdir.listdir() == []
+
+def test_create_app(config):
+    import ghdata.server
+    app = ghdata.server.create_app(config)
+    client = app.test_client()
+    response = client.get('/unstable/user1/repo1/timeseries/commits')
+    assert response.status_code == 200
+    assert response.json[0]['commits'] > 0
+    assert client.get('/unstable/user1/repo1/timeseries/commits',
+                      headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    assert client.get('/unstable/user1/repo1/report?metrics=commits,contributors').status_code == 200
+    assert client.get('/unstable/cache').json['entries'] > 0
+    login = client.get('/unstable/user1/repo1/contributors').json[0]['login']
+    contributions = client.get('/unstable/user1/repo1/contributions?user=' + login)
+    assert contributions.status_code == 200
+    assert sum(row['commits'] or 0 for row in contributions.json) > 0
+    # A user that doesn't exist made no contributions
+    assert client.get('/unstable/user1/repo1/contributions?user=nobody').json == []
+    # Flask's development server has no workers to report on
+    assert client.get('/unstable/workers').json == []
+
+def test_backends_are_made_again_after_fork(config, monkeypatch):
+    import ghdata.server
+    backends = ghdata.server.Backends(config)
+    ghtorrent = backends.ghtorrent
+    assert backends.ghtorrent is ghtorrent
+    assert ghtorrent.cache is backends.cache
+    monkeypatch.setattr(os, 'getpid', lambda: -1)
+    assert backends.ghtorrent is not ghtorrent
+    with pytest.raises(AttributeError):
+        backends.parsers
+
+def test_warmer_runs_where_it_is_started(config, monkeypatch):
+    import ghdata.server
+    config.add_section('Warmer')
+    config.set('Warmer', 'enabled', '1')
+    config.set('Warmer', 'repos', 'user1/repo1')
+    config.set('Warmer', 'interval', '3600')
+    backends = ghdata.server.Backends(config)
+    # Requests don't create a warmer in every process
+    assert backends.warmer is None
+    warmer = backends.start_warmer()
+    try:
+        assert backends.warmer is warmer
+        monkeypatch.setattr(os, 'getpid', lambda: -1)
+        assert backends.warmer is None
+    finally:
+        warmer.stop()
+
+def test_stream_encoders():
+    import json
+    import pandas
+    import ghdata.server
+    chunks = [pandas.DataFrame({'a': [1, 2]}), pandas.DataFrame({'a': []}), pandas.DataFrame({'a': [3]})]
+    # A piece per chunk, empty chunks are skipped
+    pieces = list(ghdata.server.stream_ndjson(chunks))
+    assert len(pieces) == 2
+    assert [json.loads(line) for line in ''.join(pieces).splitlines()] == [{'a': 1}, {'a': 2}, {'a': 3}]
+    assert json.loads(''.join(ghdata.server.stream_json(chunks))) == [{'a': 1}, {'a': 2}, {'a': 3}]
+    assert list(ghdata.server.stream_ndjson([])) == []
+    assert json.loads(''.join(ghdata.server.stream_json([pandas.DataFrame({'a': []})]))) == []
+
+def test_stream_route(config, monkeypatch):
+    import json
+    import ghdata.server
+    # Several chunks for the synthetic repositories
+    monkeypatch.setattr(ghdata.server, 'STREAM_CHUNK_SIZE', 3)
+    client = ghdata.server.create_app(config).test_client()
+    whole = client.get('/unstable/user1/repo1/contributors').json
+    response = client.get('/unstable/user1/repo1/contributors?stream=ndjson')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert len(lines) == len(whole) > 3
+    assert [json.loads(line)['login'] for line in lines] == [row['login'] for row in whole]
+    response = client.get('/unstable/user1/repo1/contributors?stream=json')
+    assert response.is_streamed
+    assert [row['login'] for row in json.loads(response.get_data(as_text=True))] == [row['login'] for row in whole]
+    # Repositories without rows give empty documents
+    assert client.get('/unstable/nobody/nothing/contributors?stream=json').get_data(as_text=True) == '[]'
+    assert client.get('/unstable/nobody/nothing/contributors?stream=ndjson').get_data(as_text=True) == ''
+    assert client.get('/unstable/user1/repo1/contributors?stream=xml').status_code == 400
+
+def test_sources_without_repoids(config, monkeypatch):
+    import pandas
+    import ghdata.server
+
+    class PublicWWW(object):
+        def linking_websites(self, owner, repo):
+            return pandas.DataFrame({'url': ['{}.example.com/{}'.format(owner, repo)], 'rank': [1]})
+
+    monkeypatch.setattr(ghdata.server.Backends, 'make_publicwww', lambda self: PublicWWW(), raising=False)
+    client = ghdata.server.create_app(config).test_client()
+    response = client.get('/unstable/user1/repo1/linking_websites')
+    assert response.status_code == 200
+    assert response.json == [{'url': 'user1.example.com/repo1', 'rank': 1}]
+
+def test_coalesced_metrics_dont_hold_workers(config):
+    import threading
+    import ghdata.server
+    config.add_section('Executor')
+    config.set('Executor', 'workers', '1')
+    config.set('Executor', 'queue', '1')
+    config.set('Executor', 'timeout', '5')
+    app = ghdata.server.create_app(config)
+    release = threading.Event()
+
+    def slow(repoid):
+        release.wait()
+        return repoid
+
+    with app.app_context():
+        try:
+            # Reports asking for the same metric share one worker, the others only wait for its result
+            waits = [ghdata.server.start_metric(slow, repoid=1) for i in range(4)]
+            other = ghdata.server.start_metric(slow, repoid=2)
+        finally:
+            release.set()
+        assert [wait()[0] for wait in waits] == [1] * 4
+        assert other()[0] == 2
+        assert ghdata.server.backends().flights.in_flight() == 0
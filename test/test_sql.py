@@ -0,0 +1,38 @@
+import datetime
+import pytest
+import sqlalchemy as s
+from sqlalchemy.dialects import mysql, postgresql
+
+from ghdata import sql
+
+created_at = s.column('created_at', s.DateTime)
+closed_at = s.column('closed_at', s.DateTime)
+
+def test_dialects():
+    assert str(sql.date_of(created_at).compile(dialect=mysql.dialect())) == 'DATE(created_at)'
+    assert str(sql.days_between(closed_at, created_at).compile(dialect=mysql.dialect())) == 'DATEDIFF(closed_at, created_at)'
+    assert str(sql.date_of(created_at).compile(dialect=postgresql.dialect())) == 'CAST(created_at AS DATE)'
+
+@pytest.mark.parametrize('value', ['2017-01-01 10:00:00', '2017-01-02 00:00:00', '2017-01-08 23:59:59',
+                                   '2017-02-15 12:00:00'])
+def test_sqlite(value):
+    value = s.literal(value, s.String)
+    engine = s.create_engine('sqlite://')
+    with engine.connect() as conn:
+        row = conn.execute(s.select(sql.date_of(value), sql.days_between(s.literal('2017-03-01 01:00:00'), value))).one()
+    assert row[0] == datetime.date(*[int(part) for part in value.value[:10].split('-')])
+    assert row[1] == (datetime.date(2017, 3, 1) - row[0]).days
+
+def test_metrics_run_on_sqlite(tmpdir):
+    import ghdata
+    import ghdata.benchmark
+    dbstr = 'sqlite:///' + str(tmpdir.join('ghtorrent.db'))
+    ghdata.benchmark.generate(dbstr, commits=2000, repos=5)
+    ghtorrent = ghdata.GHTorrent(dbstr)
+    # Every metric's SQL has to run, not every metric has data in a small database
+    for metric in ghdata.benchmark.BENCHMARK_METRICS:
+        getattr(ghtorrent, metric)(1)
+    commits = ghtorrent.commits(1)
+    assert (commits['date'].dt.weekday == 0).all()
+    later = ghtorrent.commits(1, start='2014-01-06')
+    assert later['commits'].sum() == commits[commits['date'] >= '2014-01-06']['commits'].sum()
@@ -0,0 +1,144 @@
+import pandas as pd
+import pytest
+
+from ghdata import timeseries
+
+def test_first_responses():
+    issues = pd.DataFrame({'id': [1, 2, 3], 'created_at': pd.to_datetime(['2017-01-02', '2017-01-03', '2017-01-04'])})
+    comments = pd.DataFrame({
+        'issue_id': [1, 1, 1, 2, 3],
+        'user_id': [9, 5, 6, 9, 5],
+        'created_at': pd.to_datetime(['2017-01-02 01:00', '2017-01-03 00:00', '2017-01-02 12:00', '2017-01-04 00:00', '2017-01-05 00:00'])
+    })
+    responses = timeseries.first_responses(issues, comments, [5, 6])
+    # Issue 2 was only answered by a non-committer
+    assert responses['created_at'].tolist() == list(pd.to_datetime(['2017-01-02', '2017-01-04']))
+    assert responses['responded_at'].tolist() == list(pd.to_datetime(['2017-01-02 12:00', '2017-01-05 00:00']))
+
+def test_summarize():
+    dates = pd.Series(pd.to_datetime(['2017-01-02', '2017-01-03', '2017-01-08', '2017-01-09']))
+    summary = timeseries.summarize(dates, pd.Series([1.0, 2.0, 6.0, 4.0]))
+    assert summary['date'].dt.strftime('%Y-%m-%d').tolist() == ['2017-01-02', '2017-01-09']
+    assert summary['count'].tolist() == [3, 1]
+    assert summary['median'].tolist() == [2.0, 4.0]
+    assert summary['max'].tolist() == [6.0, 4.0]
+    with pytest.raises(ValueError):
+        timeseries.summarize(dates, dates, 'daily')
+
+def test_resample():
+    daily = pd.DataFrame({
+        'date': pd.to_datetime(['2017-01-02', '2017-01-08', '2017-01-09', '2017-02-01']),
+        'rate': [1.0, 0.5, 1.0, 0.0],
+        'num_approved': [1, 1, 2, 0],
+        'num_open': [1, 2, 2, 1]
+    })
+    weekly = timeseries.resample(daily, 'week', ratios={'rate': ('num_approved', 'num_open')})
+    assert list(weekly.columns) == ['date', 'rate']
+    assert weekly['date'].dt.strftime('%Y-%m-%d').tolist() == ['2017-01-02', '2017-01-09', '2017-01-30']
+    assert weekly['rate'].tolist() == [2 / 3.0, 1.0, 0.0]
+    monthly = timeseries.resample(daily[['date', 'num_open']], 'month')
+    assert monthly['num_open'].tolist() == [5, 1]
+    with pytest.raises(ValueError):
+        timeseries.resample(daily, 'fortnight')
+
+def test_transform():
+    frame = pd.DataFrame({
+        'repoid': [1, 2, 1, 2, 1],
+        'date': pd.to_datetime(['2017-01-02', '2017-01-02', '2017-01-09', '2017-01-09', '2017-01-16']),
+        'commits': [1, 10, 3, 0, 5]
+    })
+    assert timeseries.transform(frame, 'moving_average', 2)['commits'].tolist() == [1.0, 2.0, 4.0, 10.0, 5.0]
+    assert timeseries.transform(frame, 'cumsum')['commits'].tolist() == [1, 4, 9, 10, 10]
+    growth = timeseries.transform(frame, 'growth')
+    assert growth['repoid'].tolist() == [1, 1, 1, 2, 2]
+    assert growth['commits'].fillna(-1).round(4).tolist() == [-1, 2.0, 0.6667, -1, -1.0]
+    ewm = timeseries.transform(frame[frame['repoid'] == 1].drop(columns='repoid'), 'ewm', 3)
+    assert ewm['commits'].round(4).tolist() == [1.0, 2.3333, 3.8571]
+    assert frame['commits'].tolist() == [1, 10, 3, 0, 5]
+    with pytest.raises(ValueError):
+        timeseries.transform(frame, 'median')
+
+def test_intervals_share_cached_daily_series(tmpdir):
+    import ghdata
+    import ghdata.benchmark
+    from ghdata.cache import MetricCache
+    dbstr = 'sqlite:///' + str(tmpdir.join('ghtorrent.db'))
+    ghdata.benchmark.generate(dbstr, commits=3000, repos=4)
+    ghtorrent = ghdata.GHTorrent(dbstr, cache=MetricCache())
+    daily = ghtorrent.commits(1, interval='day')
+    monthly = ghtorrent.commits(1, interval='month')
+    yearly = ghtorrent.commits(1, interval='year')
+    assert ghtorrent.cache.stats()['hits'] == 2
+    assert monthly['commits'].sum() == yearly['commits'].sum() == daily['commits'].sum()
+    assert (monthly['date'].dt.day == 1).all()
+
+def test_issue_response_time_matches_sql(tmpdir):
+    import sqlalchemy as s
+    import ghdata
+    import ghdata.benchmark
+    dbstr = 'sqlite:///' + str(tmpdir.join('ghtorrent.db'))
+    ghdata.benchmark.generate(dbstr, commits=3000, repos=4)
+    ghtorrent = ghdata.GHTorrent(dbstr)
+    expected = pd.read_sql(s.text("""
+        SELECT issues.created_at AS created_at, MIN(issue_comments.created_at) AS responded_at
+        FROM issues JOIN issue_comments ON issue_comments.issue_id = issues.id
+        WHERE issue_comments.user_id IN (SELECT author_id FROM commits WHERE project_id = 1)
+        AND issues.repo_id = 1
+        GROUP BY issues.id ORDER BY issues.id"""), ghtorrent.db, parse_dates=['created_at', 'responded_at'])
+    responses = ghtorrent.issue_response_time(1)
+    assert len(responses) == len(expected) > 0
+    assert (responses['responded_at'].values == expected['responded_at'].values).all()
+    summary = ghtorrent.issue_response_time(1, summary='weekly')
+    assert summary['count'].sum() == len(expected)
+    assert (summary['p90'] >= summary['median']).all()
+    # Streamed a few comments at a time, the issues split across chunks still get their first response
+    streamed = pd.concat(list(ghtorrent.issue_response_time(1, chunksize=7)), ignore_index=True)
+    pd.testing.assert_frame_equal(streamed, responses, check_dtype=False)
+
+def test_issues_with_close_summary(tmpdir):
+    import ghdata
+    import ghdata.benchmark
+    dbstr = 'sqlite:///' + str(tmpdir.join('ghtorrent.db'))
+    ghdata.benchmark.generate(dbstr, commits=3000, repos=4)
+    ghtorrent = ghdata.GHTorrent(dbstr)
+    closed = ghtorrent.issues_with_close(1)
+    summary = ghtorrent.issues_with_close(1, summary='weekly')
+    assert list(summary.columns) == ['date', 'count', 'mean', 'median', 'p75', 'p90', 'max']
+    assert summary['count'].sum() == len(closed)
+    assert summary['max'].max() == closed['days_to_close'].max()
+
+def test_bus_factor():
+    commits = pd.DataFrame({
+        'committer_id': [1, 1, 2, 1, 3, 3, 3],
+        'created_at': pd.to_datetime(['2017-01-05', '2017-01-06', '2017-01-07', '2017-02-01', '2017-04-01', '2017-04-02', '2017-04-03'])
+    })
+    factor = timeseries.bus_factor(commits, window=2, thresholds=(0.2, 0.5))
+    assert factor['date'].dt.strftime('%Y-%m-%d').tolist() == ['2017-01-01'] * 2 + ['2017-02-01'] * 2 + ['2017-03-01'] * 2 + ['2017-04-01'] * 2
+    assert factor['threshold'].tolist() == [0.2, 0.5] * 4
+    assert factor['bus_factor'].tolist() == [2, 1, 2, 1, 1, 1, 1, 1]
+    assert timeseries.bus_factor(commits, window=2, start='2017-03-15')['date'].dt.month.tolist() == [3, 4]
+
+def test_bus_factor_matches_sql(tmpdir):
+    import sqlalchemy as s
+    import ghdata
+    import ghdata.benchmark
+    dbstr = 'sqlite:///' + str(tmpdir.join('ghtorrent.db'))
+    ghdata.benchmark.generate(dbstr, commits=3000, repos=4)
+    ghtorrent = ghdata.GHTorrent(dbstr)
+    # A window longer than the history makes the last month cover every commit
+    expected = pd.read_sql(s.text("""
+        SELECT COUNT(*) AS bus_factor FROM (
+            SELECT committer_id FROM commits WHERE project_id = 1 GROUP BY committer_id
+            HAVING COUNT(*) > .2 * (SELECT COUNT(*) FROM commits WHERE project_id = 1)) AS core"""), ghtorrent.db)
+    factor = ghtorrent.bus_factor(1, window=1000)
+    assert factor['bus_factor'].iloc[-1] == expected['bus_factor'][0]
+    assert len(ghtorrent.bus_factor(1, window=3, thresholds=(0.1, 0.3))) == 2 * len(factor)
+
+def test_drop_first_interval():
+    frame = pd.DataFrame({'repoid': [1, 1, 1, 2, 2],
+                          'date': pd.to_datetime(['2017-01-02', '2017-01-08', '2017-01-09', '2017-01-04', '2017-01-20']),
+                          'forks': [1, 2, 3, 4, 5]})
+    # 2017-01-02 is a Monday, the whole first week of each repository is left out
+    assert timeseries.drop_first_interval(frame, by=['repoid'])['forks'].tolist() == [3, 5]
+    assert timeseries.drop_first_interval(frame[frame['repoid'] == 1])['forks'].tolist() == [3]
+    assert timeseries.drop_first_interval(frame.iloc[:0]).empty
@@ -0,0 +1,53 @@
+import time
+import pytest
+
+from ghdata.warmer import CacheWarmer, read_watchlist
+
+@pytest.fixture
+def ghtorrent(tmpdir):
+    import ghdata
+    import ghdata.benchmark
+    dbstr = 'sqlite:///' + str(tmpdir.join('ghtorrent.db'))
+    ghdata.benchmark.generate(dbstr, commits=3000, repos=4)
+    return ghdata.GHTorrent(dbstr, cache=ghdata.MetricCache(default_ttl=60))
+
+def test_read_watchlist(tmpdir):
+    path = tmpdir.join('watchlist.txt')
+    path.write('# Dashboard repositories\nuser1/repo1\n\n  user2/repo2  # the other one\n')
+    assert read_watchlist(str(path)) == [('user1', 'repo1'), ('user2', 'repo2')]
+
+def test_warm(ghtorrent):
+    warmer = CacheWarmer(ghtorrent, [('user1', 'repo1'), ('user2', 'repo2'), ('nobody', 'nothing')],
+                         metrics=['commits', 'stargazers', 'pulls'], workers=2)
+    warmer.record('USER2', 'repo2', 'pulls')
+    # Never refreshed entries first, the most requested of them before the others
+    assert warmer.due()[0] == (('user2', 'repo2'), 'pulls')
+    assert warmer.run_once() == 6
+    stats = dict(((entry['repo'], entry['metric']), entry) for entry in warmer.stats())
+    assert stats[('user1/repo1', 'commits')]['refreshes'] == 1
+    assert stats[('user1/repo1', 'commits')]['seconds'] >= 0
+    assert stats[('user2/repo2', 'pulls')]['requests'] == 1
+    assert stats[('nobody/nothing', 'commits')]['refreshes'] == 0
+    # The dashboard's requests are cache hits now
+    hits = ghtorrent.cache.stats()['hits']
+    repoid = ghtorrent.repoid('user1', 'repo1')
+    ghtorrent.commits(repoid)
+    ghtorrent.pulls(repoid)
+    assert ghtorrent.cache.stats()['hits'] == hits + 2
+    # Nothing is due again until most of the TTL has passed
+    assert [key for key in warmer.due() if key[0] != ('nobody', 'nothing')] == []
+    assert len(warmer.due(now=time.time() + 50)) == 9
+
+def test_evicted_entries_are_due(ghtorrent):
+    warmer = CacheWarmer(ghtorrent, [('user1', 'repo1'), ('user2', 'repo2')],
+                         metrics=['commits', 'stargazers', 'pulls'], workers=2)
+    warmer.record('user1', 'repo1', 'commits')
+    assert warmer.run_once() == 6
+    assert warmer.due() == []
+    # Dropped from the cache long before its refresh, e.g. by new data for the table
+    ghtorrent.cache.invalidate(metric='pulls')
+    assert warmer.due() == [(('user1', 'repo1'), 'pulls'), (('user2', 'repo2'), 'pulls')]
+    # Missing entries come before the ones that are only getting stale
+    assert warmer.due(now=time.time() + 50)[:2] == [(('user1', 'repo1'), 'pulls'), (('user2', 'repo2'), 'pulls')]
+    assert warmer.run_once() == 2
+    assert warmer.due() == []